@@ -24,7 +24,11 @@
 # https://github.com/nakagami/minipg/
 
 import sys
+import os
+import io
 import socket
+import select
+import struct
 import string
 import decimal
 import datetime
@@ -32,12 +36,16 @@ import time
 import uuid
 import collections
 import binascii
+import codecs
 import re
 import random
 import hashlib
 import base64
 import hmac
 import enum
+import array
+import functools
+import inspect
 import json
 import asyncio
 import warnings
@@ -109,8 +117,8 @@ class DataError(DatabaseError):
 
 
 class NotSupportedError(DatabaseError):
-    def __init__(self):
-        DatabaseError.__init__(self, 'NotSupportedError')
+    def __init__(self, *args):
+        DatabaseError.__init__(self, *(args or ('NotSupportedError', )))
 
 
 def DEBUG_OUTPUT(s):
@@ -141,6 +149,7 @@ PG_TYPE_VECTOROID = 30
 PG_TYPE_JSON = 114
 PG_TYPE_XML = 142
 PG_TYPE_PGNODETREE = 194
+PG_TYPE_JSONARRAY = 199
 PG_TYPE_POINT = 600
 PG_TYPE_LSEG = 601
 PG_TYPE_PATH = 602
@@ -159,12 +168,17 @@ PG_TYPE_MACADDR = 829
 PG_TYPE_INET = 869
 PG_TYPE_CIDR = 650
 PG_TYPE_BOOLARRAY = 1000
+PG_TYPE_BYTEAARRAY = 1001
+PG_TYPE_CHARARRAY = 1002
 PG_TYPE_NAMEARRAY = 1003
 PG_TYPE_INT2ARRAY = 1005
 PG_TYPE_INT4ARRAY = 1007
 PG_TYPE_TEXTARRAY = 1009
+PG_TYPE_BPCHARARRAY = 1014
 PG_TYPE_VARCHARARRAY = 1015
+PG_TYPE_INT8ARRAY = 1016
 PG_TYPE_FLOAT4ARRAY = 1021
+PG_TYPE_FLOAT8ARRAY = 1022
 PG_TYPE_ARRAYOID = 1028
 PG_TYPE_ACLITEM = 1033
 PG_TYPE_BPCHAR = 1042
@@ -172,13 +186,20 @@ PG_TYPE_VARCHAR = 1043
 PG_TYPE_DATE = 1082
 PG_TYPE_TIME = 1083
 PG_TYPE_TIMESTAMP = 1114
+PG_TYPE_TIMESTAMPARRAY = 1115
+PG_TYPE_DATEARRAY = 1182
+PG_TYPE_TIMEARRAY = 1183
 PG_TYPE_TIMESTAMPTZ = 1184
+PG_TYPE_TIMESTAMPTZARRAY = 1185
 PG_TYPE_INTERVAL = 1186
+PG_TYPE_INTERVALARRAY = 1187
 PG_TYPE_CSTRINGARRAY = 1263
 PG_TYPE_TIMETZ = 1266
+PG_TYPE_TIMETZARRAY = 1270
 PG_TYPE_BIT = 1560
 PG_TYPE_VARBIT = 1562
 PG_TYPE_NUMERIC = 1700
+PG_TYPE_NUMERICARRAY = 1231
 PG_TYPE_REFCURSOR = 1790
 PG_TYPE_REGPROCEDURE = 2202
 PG_TYPE_REGOPER = 2203
@@ -187,6 +208,7 @@ PG_TYPE_REGCLASS = 2205
 PG_TYPE_REGTYPE = 2206
 PG_TYPE_REGTYPEARRAY = 2211
 PG_TYPE_UUID = 2950
+PG_TYPE_UUIDARRAY = 2951
 PG_TYPE_TSVECTOR = 3614
 PG_TYPE_GTSVECTOR = 3642
 PG_TYPE_TSQUERY = 3615
@@ -209,8 +231,50 @@ PG_TYPE_ANYNONARRAY = 2776
 PG_TYPE_ANYENUM = 3500
 PG_TYPE_FDW_HANDLER = 3115
 PG_TYPE_JSONBOID = 3802
+PG_TYPE_JSONBARRAY = 3807
 PG_TYPE_ANYRANGE = 3831
 
+# array type -> element type
+PG_ARRAY_ELEMENT_TYPES = {
+    PG_TYPE_BOOLARRAY: PG_TYPE_BOOL,
+    PG_TYPE_BYTEAARRAY: PG_TYPE_BYTEA,
+    PG_TYPE_CHARARRAY: PG_TYPE_CHAR,
+    PG_TYPE_NAMEARRAY: PG_TYPE_NAME,
+    PG_TYPE_INT2ARRAY: PG_TYPE_INT2,
+    PG_TYPE_INT4ARRAY: PG_TYPE_INT4,
+    PG_TYPE_TEXTARRAY: PG_TYPE_TEXT,
+    PG_TYPE_BPCHARARRAY: PG_TYPE_BPCHAR,
+    PG_TYPE_VARCHARARRAY: PG_TYPE_VARCHAR,
+    PG_TYPE_INT8ARRAY: PG_TYPE_INT8,
+    PG_TYPE_FLOAT4ARRAY: PG_TYPE_FLOAT4,
+    PG_TYPE_FLOAT8ARRAY: PG_TYPE_FLOAT8,
+    PG_TYPE_ARRAYOID: PG_TYPE_OID,
+    PG_TYPE_TIMESTAMPARRAY: PG_TYPE_TIMESTAMP,
+    PG_TYPE_DATEARRAY: PG_TYPE_DATE,
+    PG_TYPE_TIMEARRAY: PG_TYPE_TIME,
+    PG_TYPE_TIMETZARRAY: PG_TYPE_TIMETZ,
+    PG_TYPE_TIMESTAMPTZARRAY: PG_TYPE_TIMESTAMPTZ,
+    PG_TYPE_INTERVALARRAY: PG_TYPE_INTERVAL,
+    PG_TYPE_NUMERICARRAY: PG_TYPE_NUMERIC,
+    PG_TYPE_UUIDARRAY: PG_TYPE_UUID,
+    PG_TYPE_JSONARRAY: PG_TYPE_JSON,
+    PG_TYPE_JSONBARRAY: PG_TYPE_JSONBOID,
+}
+
+# element type -> typecode of array.array, for numeric arrays with flat_arrays=True
+PG_ARRAY_TYPECODES = {
+    PG_TYPE_INT2: 'h',
+    PG_TYPE_INT4: 'i',
+    PG_TYPE_INT8: 'q',
+    PG_TYPE_OID: 'I',
+    PG_TYPE_FLOAT4: 'f',
+    PG_TYPE_FLOAT8: 'd',
+}
+
+# column type -> typecode of array.array, for columns fetched by fetch_columns()
+PG_COLUMN_TYPECODES = dict(PG_ARRAY_TYPECODES)
+PG_COLUMN_TYPECODES[PG_TYPE_BOOL] = 'B'
+
 
 def _bytes_to_bint(b):     # Read as big endian
     return int.from_bytes(b, byteorder='big')
@@ -220,6 +284,82 @@ def _bint_to_bytes(val):    # Convert int value to big endian 4 bytes.
     return val.to_bytes(4, byteorder='big')
 
 
+class _ReadBuffer:
+    """Receive buffer shared by Connection and AsyncConnection.
+
+    Socket data is read into a preallocated bytearray in large chunks and
+    whole protocol messages are handed out as memoryview slices of it.
+    A returned memoryview is only valid until the next read.
+    """
+
+    DEFAULT_SIZE = 65536
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def needed(self):
+        "Return the number of buffered bytes needed for the next message"
+        if self._end - self._start < 5:
+            return 5
+        return struct.unpack_from('!i', self._buf, self._start + 1)[0] + 1
+
+    def get_buffer(self, n):
+        "Return a writable memoryview which can hold at least n buffered bytes"
+        pending = self._end - self._start
+        if pending == 0:
+            self._start = self._end = 0
+            if len(self._buf) > self.DEFAULT_SIZE and n <= self.DEFAULT_SIZE:
+                # release the memory grown for a large message
+                self._buf = bytearray(self.DEFAULT_SIZE)
+                self._view = memoryview(self._buf)
+        if self._start + n > len(self._buf):
+            if n > len(self._buf):
+                buf = bytearray(max(n, len(self._buf) * 2))
+                buf[:pending] = self._view[self._start:self._end]
+                self._buf = buf
+                self._view = memoryview(buf)
+            else:
+                self._view[:pending] = bytes(self._view[self._start:self._end])
+            self._start = 0
+            self._end = pending
+        return self._view[self._end:]
+
+    def advance(self, n):
+        "Mark n bytes written into get_buffer() as received"
+        self._end += n
+
+    def read(self, n):
+        "Return n raw bytes, or None if they are not received yet"
+        if self._end - self._start < n:
+            return None
+        r = bytes(self._view[self._start:self._start + n])
+        self._start += n
+        return r
+
+    def peek(self):
+        "Return the code of the next message, or None if nothing is buffered"
+        if self._end == self._start:
+            return None
+        return self._buf[self._start]
+
+    def message(self):
+        "Return (code, memoryview of data) of a whole message, or None"
+        start = self._start
+        if self._end - start < 5:
+            return None
+        code, ln = struct.unpack_from('!Bi', self._buf, start)
+        if self._end - start < ln + 1:
+            return None
+        self._start = start + ln + 1
+        return code, self._view[start + 5:start + ln + 1]
+
+
 Date = datetime.date
 Time = datetime.time
 TimeDelta = datetime.timedelta
@@ -257,12 +397,850 @@ Description = collections.namedtuple(
 )
 
 
+# -----------------------------------------------------------------------------
+# binary format encoders for Bind parameters
+# They raise TypeError, ValueError or struct.error for unsuitable values,
+# and then the value is sent in text format.
+
+_EPOCH_DATE = datetime.date(2000, 1, 1)
+_EPOCH = datetime.datetime(2000, 1, 1)
+_EPOCH_TZ = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _encode_bool(v):
+    if type(v) is not bool:
+        raise TypeError()
+    return b'\x01' if v else b'\x00'
+
+
+def _encode_bytea(v):
+    t = type(v)
+    if t is memoryview:
+        return v.cast('B')
+    if t not in (bytes, bytearray):
+        raise TypeError()
+    return v
+
+
+def _encode_uuid(v):
+    if type(v) is not uuid.UUID:
+        raise TypeError()
+    return v.bytes
+
+
+def _timedelta_microseconds(v):
+    return (v.days * 86400 + v.seconds) * 1000000 + v.microseconds
+
+
+def _encode_date(v):
+    if type(v) is not datetime.date:
+        raise TypeError()
+    return struct.pack('!i', (v - _EPOCH_DATE).days)
+
+
+def _encode_time(v):
+    if type(v) is not datetime.time or v.tzinfo is not None:
+        raise TypeError()
+    return struct.pack('!q', ((v.hour * 60 + v.minute) * 60 + v.second) * 1000000 + v.microsecond)
+
+
+def _encode_timestamp(v):
+    if type(v) is not datetime.datetime or v.tzinfo is not None:
+        raise TypeError()
+    return struct.pack('!q', _timedelta_microseconds(v - _EPOCH))
+
+
+def _encode_timestamptz(v):
+    if type(v) is not datetime.datetime or v.tzinfo is None:
+        raise TypeError()
+    return struct.pack('!q', _timedelta_microseconds(v - _EPOCH_TZ))
+
+
+def _encode_interval(v):
+    if type(v) is not datetime.timedelta:
+        raise TypeError()
+    return struct.pack('!qii', v.seconds * 1000000 + v.microseconds, v.days, 0)
+
+
+def _encode_numeric(v):
+    if type(v) not in (int, decimal.Decimal):
+        raise TypeError()
+    v = decimal.Decimal(v)
+    if v.is_nan():
+        return b'\x00\x00\x00\x00\xc0\x00\x00\x00'
+    if v.is_infinite():
+        raise ValueError()
+    sign, digits, exp = v.as_tuple()
+    digits = ''.join([str(d) for d in digits])
+    if exp > 0:
+        digits += '0' * exp
+        exp = 0
+    dscale = frac = -exp
+    if len(digits) < frac:
+        digits = '0' * (frac - len(digits)) + digits
+    digits += '0' * (-frac % 4)
+    frac += -frac % 4
+    int_len = len(digits) - frac
+    digits = '0' * (-int_len % 4) + digits
+    weight = (int_len + -int_len % 4) // 4 - 1
+    groups = [int(digits[i:i+4]) for i in range(0, len(digits), 4)]
+    while groups and groups[0] == 0:
+        del groups[0]
+        weight -= 1
+    while groups and groups[-1] == 0:
+        del groups[-1]
+    if not groups:
+        weight = 0
+    return struct.pack(
+        '!hhHh%dH' % (len(groups), ), len(groups), weight, 0x4000 if sign else 0, dscale, *groups
+    )
+
+
+def _encode_array(v, elem_oid):
+    if type(v) not in (list, tuple, array.array):
+        raise TypeError()
+    encoder = _BINARY_ENCODERS[elem_oid]
+    dims = []
+    e = v
+    while type(e) in (list, tuple, array.array):
+        dims.append(len(e))
+        if not e:
+            break
+        e = e[0]
+    elements = v
+    for _ in dims[1:]:
+        elements = [e for sub in elements for e in sub]
+    if 0 in dims:
+        dims = []
+    has_null = None in elements
+    header = struct.pack('!iii', len(dims), 1 if has_null else 0, elem_oid)
+    header += b''.join([struct.pack('!ii', n, 1) for n in dims])
+    if not has_null and elem_oid in (PG_TYPE_INT4, PG_TYPE_INT8, PG_TYPE_FLOAT8):
+        fmt, size = {PG_TYPE_INT4: ('i', 4), PG_TYPE_INT8: ('q', 8), PG_TYPE_FLOAT8: ('d', 8)}[elem_oid]
+        if elem_oid != PG_TYPE_FLOAT8 and not all([type(e) is int for e in elements]):
+            raise TypeError()
+        values = [size] * (len(elements) * 2)
+        values[1::2] = elements
+        return header + struct.pack('!' + ('i' + fmt) * len(elements), *values)
+    r = [header]
+    for e in elements:
+        if e is None:
+            r.append(b'\xff\xff\xff\xff')
+        else:
+            b = encoder(e)
+            r.append(struct.pack('!i', len(b)))
+            r.append(b)
+    return b''.join(r)
+
+
+_BINARY_ENCODERS = {
+    PG_TYPE_BOOL: _encode_bool,
+    PG_TYPE_BYTEA: _encode_bytea,
+    PG_TYPE_INT2: lambda v: struct.pack('!h', v),
+    PG_TYPE_INT4: lambda v: struct.pack('!i', v),
+    PG_TYPE_INT8: lambda v: struct.pack('!q', v),
+    PG_TYPE_OID: lambda v: struct.pack('!I', v),
+    PG_TYPE_FLOAT4: lambda v: struct.pack('!f', v),
+    PG_TYPE_FLOAT8: lambda v: struct.pack('!d', v),
+    PG_TYPE_NUMERIC: _encode_numeric,
+    PG_TYPE_UUID: _encode_uuid,
+    PG_TYPE_DATE: _encode_date,
+    PG_TYPE_TIME: _encode_time,
+    PG_TYPE_TIMESTAMP: _encode_timestamp,
+    PG_TYPE_TIMESTAMPTZ: _encode_timestamptz,
+    PG_TYPE_INTERVAL: _encode_interval,
+}
+_BINARY_ENCODERS.update({
+    array_oid: functools.partial(_encode_array, elem_oid=elem_oid)
+    for array_oid, elem_oid in PG_ARRAY_ELEMENT_TYPES.items() if elem_oid in _BINARY_ENCODERS
+})
+
+
+# -----------------------------------------------------------------------------
+# binary format decoders for result columns
+
+def _decode_date(data):
+    days = struct.unpack_from('!i', data)[0]
+    if days == 0x7fffffff:
+        return datetime.date.max
+    if days == -0x80000000:
+        return datetime.date.min
+    return _EPOCH_DATE + datetime.timedelta(days=days)
+
+
+def _decode_time(data):
+    us = struct.unpack_from('!q', data)[0]
+    seconds, us = divmod(us, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return datetime.time(hours, minutes, seconds, us)
+
+
+def _decode_timetz(data):
+    zone = struct.unpack_from('!i', data, 8)[0]
+    t = _decode_time(data)
+    return t.replace(tzinfo=datetime.timezone(datetime.timedelta(seconds=-zone)))
+
+
+def _decode_timestamp(data, epoch=_EPOCH):
+    us = struct.unpack_from('!q', data)[0]
+    if us == 0x7fffffffffffffff:
+        return datetime.datetime.max.replace(tzinfo=epoch.tzinfo)
+    if us == -0x8000000000000000:
+        return datetime.datetime.min.replace(tzinfo=epoch.tzinfo)
+    return epoch + datetime.timedelta(microseconds=us)
+
+
+def _decode_interval(data):
+    us, days, months = struct.unpack_from('!qii', data)
+    return datetime.timedelta(days=days + months * 30, microseconds=us)
+
+
+def _decode_numeric(data):
+    ndigits, weight, sign, dscale = struct.unpack_from('!hhHh', data)
+    if sign == 0xc000:
+        return decimal.Decimal('NaN')
+    if sign == 0xd000:
+        return decimal.Decimal('Infinity')
+    if sign == 0xf000:
+        return decimal.Decimal('-Infinity')
+    n = 0
+    for d in struct.unpack_from('!%dH' % (ndigits, ), data, 8):
+        n = n * 10000 + d
+    exp = (weight + 1 - ndigits) * 4
+    if -exp > dscale:
+        n //= 10 ** (-exp - dscale)
+    elif -exp < dscale:
+        n *= 10 ** (dscale + exp)
+    return decimal.Decimal((1 if sign else 0, tuple(map(int, str(n))), -dscale))
+
+
+def _nest_array(elements, dims, typecode=None):
+    "Make nested lists of dims from the elements, the innermost lists are array.array of typecode if given"
+    if typecode:
+        if type(elements) is not array.array:
+            elements = array.array(typecode, elements)
+        if len(dims) == 1:
+            return elements
+        size = dims[-1]
+        elements = [elements[i:i+size] for i in range(0, len(elements), size)]
+        dims = dims[:-1]
+    for size in reversed(dims[1:]):
+        elements = [elements[i:i+size] for i in range(0, len(elements), size)]
+    return elements
+
+
+def _unpack_array_values(data, n, count, size, typecode):
+    "Return array.array of count fixed size values without NULL from n, each of them follows its length"
+    values = bytearray(count * size)
+    stride = 4 + size
+    for i in range(size):
+        # network byte order to native byte order
+        j = size - 1 - i if sys.byteorder == 'little' else i
+        values[j::size] = data[n + 4 + i::stride]
+    return array.array(typecode, values)
+
+
+def _decode_array(data, flat=False):
+    ndim, _, elem_oid = struct.unpack_from('!iiI', data)
+    typecode = PG_ARRAY_TYPECODES.get(elem_oid) if flat else None
+    if ndim == 0:
+        return array.array(typecode) if typecode else []
+    dims = struct.unpack_from('!%di' % (ndim * 2, ), data, 12)[0::2]
+    count = functools.reduce(lambda a, b: a * b, dims)
+    n = 12 + ndim * 8
+    fmt = _ARRAY_ELEMENT_FORMATS.get(elem_oid)
+    if fmt and len(data) - n == count * fmt[1]:
+        # fixed size elements without NULL
+        if typecode:
+            return _nest_array(_unpack_array_values(data, n, count, fmt[1] - 4, typecode), dims, typecode)
+        # unpack the lengths and the values at once
+        elements = list(struct.unpack_from('!' + fmt[0] * count, data, n)[1::2])
+        return _nest_array(elements, dims, typecode)
+    decoder = _BINARY_DECODERS[elem_oid]
+    elements = []
+    for _ in range(count):
+        ln = struct.unpack_from('!i', data, n)[0]
+        n += 4
+        if ln == -1:
+            elements.append(None)
+        else:
+            elements.append(decoder(data[n:n+ln]))
+            n += ln
+    if None in elements:
+        typecode = None
+    return _nest_array(elements, dims, typecode)
+
+
+_BINARY_DECODERS = {
+    PG_TYPE_BOOL: lambda data: data[0] != 0,
+    PG_TYPE_BYTEA: bytes,
+    PG_TYPE_INT2: lambda data: struct.unpack_from('!h', data)[0],
+    PG_TYPE_INT4: lambda data: struct.unpack_from('!i', data)[0],
+    PG_TYPE_INT8: lambda data: struct.unpack_from('!q', data)[0],
+    PG_TYPE_OID: lambda data: struct.unpack_from('!I', data)[0],
+    PG_TYPE_FLOAT4: lambda data: struct.unpack_from('!f', data)[0],
+    PG_TYPE_FLOAT8: lambda data: struct.unpack_from('!d', data)[0],
+    PG_TYPE_NUMERIC: _decode_numeric,
+    PG_TYPE_UUID: lambda data: uuid.UUID(bytes=bytes(data)),
+    PG_TYPE_DATE: _decode_date,
+    PG_TYPE_TIME: _decode_time,
+    PG_TYPE_TIMETZ: _decode_timetz,
+    PG_TYPE_TIMESTAMP: _decode_timestamp,
+    PG_TYPE_TIMESTAMPTZ: functools.partial(_decode_timestamp, epoch=_EPOCH_TZ),
+    PG_TYPE_INTERVAL: _decode_interval,
+}
+_BINARY_DECODERS.update({
+    array_oid: _decode_array
+    for array_oid, elem_oid in PG_ARRAY_ELEMENT_TYPES.items() if elem_oid in _BINARY_DECODERS
+})
+
+# element type -> (struct format of length and value, size of them)
+_ARRAY_ELEMENT_FORMATS = {
+    elem_oid: ('i' + typecode, 4 + struct.calcsize('!' + typecode))
+    for elem_oid, typecode in PG_ARRAY_TYPECODES.items()
+}
+
+
+# -----------------------------------------------------------------------------
+# text format decoders for result columns
+
+def _parse_point(data):
+    x, y = data[1:-1].split(',')
+    return (float(x), float(y))
+
+
+# Date/time values in DateStyle ISO are parsed with fromisoformat() or by fixed positions.
+# Dates and times repeat much in a result set, so they are memoized.
+
+def _text_temporal_infinity(data, kind):
+    if data == b'infinity':
+        return kind.max
+    if data == b'-infinity':
+        return kind.min
+    raise ValueError("Can't decode %s: %s" % (kind.__name__, data.decode('ascii')))
+
+
+def _text_isoformat(data, n):
+    """Return data as str for fromisoformat(), which needs 6 digits of fraction of seconds
+    and minutes of UTC offset before Python 3.11. n is the length without them"""
+    i = data.find(b'+', n)
+    if i == -1:
+        i = data.find(b'-', n)
+    if i == -1:
+        dt, offset = data, b''
+    else:
+        dt, offset = data[:i], data[i:]
+    if n < len(dt) < n + 7:
+        dt = dt.ljust(n + 7, b'0')
+    if len(offset) == 3:
+        offset += b':00'
+    return (dt + offset).decode('ascii')
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_text_date(data):
+    if len(data) != 10:
+        return _text_temporal_infinity(data, datetime.date)
+    return datetime.date.fromisoformat(data.decode('ascii'))
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_text_time(data):
+    return datetime.time.fromisoformat(_text_isoformat(data, 8))
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_text_timetz(data):
+    return datetime.time.fromisoformat(_text_isoformat(data, 8))
+
+
+def _decode_text_timestamp(data):
+    n = len(data)
+    if n < 19:
+        return _text_temporal_infinity(data, datetime.datetime)
+    if 19 < n < 26:
+        data = data.ljust(26, b'0')
+    return datetime.datetime.fromisoformat(data.decode('ascii'))
+
+
+def _decode_text_timestamptz(data):
+    if len(data) < 19:
+        return _text_temporal_infinity(data, datetime.datetime)
+    return datetime.datetime.fromisoformat(_text_isoformat(data, 19))
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_text_interval(data):
+    "Decode interval in IntervalStyle postgres, like b'1 year 2 mons -3 days +04:05:06.789'"
+    days = seconds = microseconds = 0
+    parts = data.split(b' ')
+    t = parts[-1]
+    if b':' in t:
+        del parts[-1]
+        hours, minutes, s = t.split(b':')
+        seconds = (abs(int(hours)) * 60 + int(minutes)) * 60 + int(s[:2])
+        if len(s) > 2:
+            microseconds = int(s[3:9].ljust(6, b'0'))
+        if t[:1] == b'-':
+            seconds = -seconds
+            microseconds = -microseconds
+    for i in range(0, len(parts), 2):
+        unit = parts[i + 1]
+        if unit[:3] == b'day':
+            days += int(parts[i])
+        elif unit[:3] == b'mon':
+            days += int(parts[i]) * 30
+        elif unit[:4] == b'year':
+            days += int(parts[i]) * 360
+        else:
+            raise ValueError("Can't decode interval: %s" % (data.decode('ascii'), ))
+    return datetime.timedelta(days, seconds, microseconds)
+
+
+_BYTEA_ESCAPE_RE = re.compile(rb'\\(\\|[0-7]{3})')
+
+
+def _unescape_bytea(m):
+    e = m.group(1)
+    return b'\\' if e == b'\\' else bytes([int(e, 8)])
+
+
+def _decode_text_bytea(data):
+    if data[:2] == b'\\x':
+        return binascii.a2b_hex(memoryview(data)[2:])
+    # bytea_output = 'escape', a backslash is doubled and non printable bytes are \ooo octal
+    return _BYTEA_ESCAPE_RE.sub(_unescape_bytea, bytes(data))
+
+
+def _decode_text_circle(data):
+    data = data.decode('ascii')
+    p = data[1:data.find(')')+1]
+    r = data[len(p)+2:-1]
+    return (_parse_point(p), float(r))
+
+
+_TEXT_ARRAY_TOKEN_RE = {}
+
+
+def _text_array_token_re(delimiter):
+    r = _TEXT_ARRAY_TOKEN_RE.get(delimiter)
+    if r is None:
+        d = re.escape(delimiter)
+        r = _TEXT_ARRAY_TOKEN_RE[delimiter] = re.compile(
+            rb'(\{)|(\})|' + d + rb'|"((?:[^"\\]|\\.)*)"|([^"{}' + d + rb']+)'
+        )
+    return r
+
+
+_BACKSLASH_ESCAPE_RE = re.compile(rb'\\(.)', re.S)
+
+
+def _innermost_arrays(value, typecode):
+    if value and type(value[0]) is list:
+        return [_innermost_arrays(v, typecode) for v in value]
+    return array.array(typecode, value)
+
+
+def _decode_text_array(data, decoder, delimiter=b',', typecode=None):
+    """Decode array in text format, like b'{{1,NULL},{\"a,b\",3}}', to nested lists.
+    With typecode, the innermost lists are array.array unless the array has NULL."""
+    if data[:1] == b'[':
+        # with dimension decoration like b'[0:1]={1,2}'
+        data = data[data.index(b'=') + 1:]
+    if data[1:2] != b'{' and b'"' not in data:
+        # one dimensional array without quoted elements
+        if data == b'{}':
+            return array.array(typecode) if typecode else []
+        elements = data[1:-1].split(delimiter)
+        if b'NULL' in elements:
+            return [None if e == b'NULL' else decoder(e) for e in elements]
+        if typecode:
+            return array.array(typecode, map(decoder, elements))
+        return list(map(decoder, elements))
+
+    stack = []
+    result = []
+    has_null = False
+    for m in _text_array_token_re(delimiter).finditer(data):
+        start, end, quoted, unquoted = m.groups()
+        if start:
+            lst = []
+            if stack:
+                stack[-1].append(lst)
+            else:
+                result = lst
+            stack.append(lst)
+        elif end:
+            stack.pop()
+        elif quoted is not None:
+            if b'\\' in quoted:
+                quoted = _BACKSLASH_ESCAPE_RE.sub(rb'\1', quoted)
+            stack[-1].append(decoder(quoted))
+        elif unquoted is not None:
+            if unquoted == b'NULL':
+                has_null = True
+                stack[-1].append(None)
+            else:
+                stack[-1].append(decoder(unquoted))
+    if typecode and not has_null:
+        return _innermost_arrays(result, typecode)
+    return result
+
+
+def _split_text_record(data):
+    "Split composite b'(1,\"a b\",)' or range b'[1,10)' in text format to a list of bytes or None"
+    fields = []
+    n = len(data) - 1
+    i = 1
+    while i < n or (i == n and data[i - 1:i] == b','):
+        if data[i:i+1] == b'"':
+            value = bytearray()
+            i += 1
+            while True:
+                j = data.find(b'"', i)
+                k = data.find(b'\\', i, j)
+                if k != -1:
+                    value += data[i:k] + data[k+1:k+2]
+                    i = k + 2
+                elif data[j+1:j+2] == b'"':
+                    value += data[i:j+1]
+                    i = j + 2
+                else:
+                    value += data[i:j]
+                    i = j + 1
+                    break
+            fields.append(bytes(value))
+        else:
+            j = data.find(b',', i, n)
+            if j == -1:
+                j = n
+            fields.append(data[i:j] if j > i else None)
+            i = j
+        i += 1
+    return fields
+
+
+def _decode_text_composite(data, decoders):
+    return tuple([
+        None if v is None else decoder(v)
+        for decoder, v in zip(decoders, _split_text_record(data))
+    ])
+
+
+class Range:
+    "Value of a range type"
+    __slots__ = ('lower', 'upper', 'bounds', 'empty')
+
+    def __init__(self, lower=None, upper=None, bounds='[)', empty=False):
+        self.lower = lower
+        self.upper = upper
+        self.bounds = bounds
+        self.empty = empty
+
+    def __eq__(self, other):
+        if not isinstance(other, Range):
+            return NotImplemented
+        return (self.lower, self.upper, self.bounds, self.empty) == (other.lower, other.upper, other.bounds, other.empty)
+
+    def __hash__(self):
+        return hash((self.lower, self.upper, self.bounds, self.empty))
+
+    def __repr__(self):
+        if self.empty:
+            return 'Range(empty=True)'
+        return 'Range(%r, %r, %r)' % (self.lower, self.upper, self.bounds)
+
+    def __str__(self):
+        # range literal
+        if self.empty:
+            return 'empty'
+
+        def _bound(v):
+            if v is None:
+                return ''
+            return '"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"'
+        return self.bounds[0] + _bound(self.lower) + ',' + _bound(self.upper) + self.bounds[1]
+
+
+def _decode_text_range(data, decoder):
+    if data == b'empty':
+        return Range(empty=True)
+    lower, upper = [None if v is None else decoder(v) for v in _split_text_record(data)]
+    return Range(lower, upper, (data[:1] + data[-1:]).decode('ascii'))
+
+
+_TEXT_DECODERS = {
+    PG_TYPE_BOOL: lambda data: data == b't',
+    PG_TYPE_INT2: int,
+    PG_TYPE_INT4: int,
+    PG_TYPE_INT8: int,
+    PG_TYPE_OID: int,
+    PG_TYPE_FLOAT4: float,
+    PG_TYPE_FLOAT8: float,
+    PG_TYPE_NUMERIC: lambda data: decimal.Decimal(data.decode('ascii')),
+    PG_TYPE_DATE: _decode_text_date,
+    PG_TYPE_TIME: _decode_text_time,
+    PG_TYPE_TIMESTAMP: _decode_text_timestamp,
+    PG_TYPE_TIMETZ: _decode_text_timetz,
+    PG_TYPE_TIMESTAMPTZ: _decode_text_timestamptz,
+    PG_TYPE_INTERVAL: _decode_text_interval,
+    PG_TYPE_BYTEA: _decode_text_bytea,
+    PG_TYPE_UUID: lambda data: uuid.UUID(data.decode('ascii')),
+    PG_TYPE_INT2VECTOR: lambda data: [int(i) for i in data.split(b' ')],
+    PG_TYPE_POINT: lambda data: _parse_point(data.decode('ascii')),
+    PG_TYPE_CIRCLE: _decode_text_circle,
+    PG_TYPE_LSEG: lambda data: eval(data.decode('ascii')),
+    PG_TYPE_PATH: lambda data: eval(data.decode('ascii')),
+    PG_TYPE_BOX: lambda data: eval(data.decode('ascii')),
+    PG_TYPE_POLYGON: lambda data: eval(data.decode('ascii')),
+    PG_TYPE_LINE: lambda data: eval(data.decode('ascii')),
+    PG_TYPE_JSON: lambda data, encoding: json.loads(data.decode(encoding)),
+    PG_TYPE_VOID: lambda data: None,
+}
+
+# decoded to str
+_TEXT_TYPES = (
+    PG_TYPE_CHAR, PG_TYPE_TEXT, PG_TYPE_BPCHAR, PG_TYPE_VARCHAR, PG_TYPE_NAME, PG_TYPE_JSONBOID, PG_TYPE_XML,
+    PG_TYPE_UNKNOWN, PG_TYPE_PGNODETREE, PG_TYPE_TSVECTOR, PG_TYPE_INET,
+)
+
+_ROW_DECODERS_CACHE_SIZE = 256
+
+
+class _TypeInfo:
+    "A type in pg_type, and the codecs registered for it"
+    __slots__ = (
+        'oid', 'kind', 'elem', 'base', 'delimiter', 'subtype', 'attrs',
+        'decoder', 'binary_decoder', 'binary_encoder',
+    )
+
+    def __init__(self, oid, kind=None, elem=0, base=0, delimiter=b',', subtype=0, attrs=()):
+        self.oid = oid
+        self.kind = kind            # typtype, None if it is not in pg_type
+        self.elem = elem            # element type of array
+        self.base = base            # base type of domain
+        self.delimiter = delimiter  # delimiter of array elements
+        self.subtype = subtype      # subtype of range
+        self.attrs = attrs          # types of composite attributes
+        self.decoder = None
+        self.binary_decoder = None
+        self.binary_encoder = None
+
+
+class _TypeCache:
+    "oid: _TypeInfo of a database, shared by connections to it"
+    def __init__(self):
+        self.types = {}
+        self.generation = 0         # incremented when codecs are changed
+
+
+_TYPE_CACHES = {}       # (host, port, database): _TypeCache
+
+_TYPES_QUERY = """select t.oid, t.typtype, t.typcategory, t.typelem, t.typbasetype, r.rngsubtype,
+    (select e.typdelim from pg_type e where e.oid = t.typelem),
+    (select array_to_string(array_agg(a.atttypid order by a.attnum), ',') from pg_attribute a
+        where a.attrelid = t.typrelid and a.attnum > 0 and not a.attisdropped)
+from pg_type t left join pg_range r on r.rngtypid = t.oid
+where t.oid in (%s)"""
+
+
+class Record(object):
+    """Row which is accessed by index, by column name as a key or as an attribute.
+    The rows of a result set share one column name: index map."""
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values, index):
+        self._values = values
+        self._index = index
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def __getattr__(self, name):
+        if name in Record.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __contains__(self, value):
+        return value in self._values
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = tuple(other)
+        return self._values == other
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(' + ', '.join(['%s=%r' % (k, v) for k, v in self.items()]) + ')'
+
+    def __reduce__(self):
+        return (Record, (self._values, self._index))
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def keys(self):
+        return list(self._index)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return [(k, self._values[i]) for k, i in self._index.items()]
+
+
+_NOT_DECODED = object()
+
+
+class LazyRecord(Record):
+    """Record which keeps the DataRow message, and decodes a column when it is accessed first.
+    The columns never accessed are not decoded."""
+    __slots__ = ('_data', '_decoders', '_offsets')
+
+    def __init__(self, data, decoders, index):
+        self._data = data
+        self._decoders = decoders
+        self._index = index
+        self._values = None
+
+    def _split(self):
+        "Find the columns in the DataRow, and return the list of their values not decoded yet"
+        data = self._data
+        offsets = []
+        n = 2
+        for _ in range(len(self._decoders)):
+            ln = struct.unpack_from('!i', data, n)[0]
+            n += 4
+            offsets.append((n, ln))
+            if ln != -1:
+                n += ln
+        self._offsets = offsets
+        self._values = [_NOT_DECODED] * len(offsets)
+        return self._values
+
+    def _get(self, i):
+        values = self._values
+        if values is None:
+            values = self._split()
+        v = values[i]
+        if v is _NOT_DECODED:
+            n, ln = self._offsets[i]
+            v = values[i] = None if ln == -1 else self._decoders[i](self._data[n:n+ln])
+        return v
+
+    def _decoded(self):
+        return tuple([self._get(i) for i in range(len(self._decoders))])
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return self._get(self._index[key])
+        if type(key) is slice:
+            return self._decoded()[key]
+        return self._get(key)
+
+    def __getattr__(self, name):
+        if name in LazyRecord.__slots__ or name in Record.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._get(self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self._decoders)
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __contains__(self, value):
+        return value in self._decoded()
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = tuple(other)
+        return self._decoded() == other
+
+    def __hash__(self):
+        return hash(self._decoded())
+
+    def __reduce__(self):
+        return (Record, (self._decoded(), self._index))
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._get(i)
+
+    def values(self):
+        return list(self._decoded())
+
+    def items(self):
+        return [(k, self._get(i)) for k, i in self._index.items()]
+
+
+def _column_names(description):
+    return tuple([d[0] for d in description])
+
+
+def _record_index(description):
+    "column name: index map of the rows"
+    index = {}
+    for i, name in enumerate(_column_names(description)):
+        index.setdefault(name, i)
+    return index
+
+
+def record_row(description):
+    "Row factory which makes Record"
+    return functools.partial(Record, index=_record_index(description))
+
+
+@functools.lru_cache(256)
+def _namedtuple_class(names):
+    return collections.namedtuple('Row', names, rename=True)
+
+
+def namedtuple_row(description):
+    "Row factory which makes namedtuple, the classes are cached by the column names"
+    return _namedtuple_class(_column_names(description))._make
+
+
+def dict_row(description):
+    "Row factory which makes dict of column name: value"
+    names = _column_names(description)
+    return lambda values: dict(zip(names, values))
+
+
 class BaseCursor(object):
     def __init__(self, connection):
         self.connection = connection
         self.description = []
         self._rows = collections.deque()
         self._rowcount = 0
+        self._decoders = ()
+        self._columns = None        # DataRows are decoded into the columns instead of rows if not None
+        self._nulls = []            # indexes of NULL in each column
+        self.null_masks = []
+        self.row_factory = None     # function(description) which returns a function to make a row from a tuple
+        self._make_row = None
+        self.lazy = False           # make LazyRecord rows instead of decoding them
+        self._lazy_index = None
+        self._nextsets = collections.deque()    # result sets after the current one
+        self._completed = None      # whether the current result set is completed, while receiving a simple query
         self.arraysize = 1
         self.query = None
 
@@ -278,8 +1256,12 @@ class BaseCursor(object):
     def next(self):
         return self.__next__()
 
-    def nextset(self, procname, args=()):
-        raise NotSupportedError()
+    def nextset(self):
+        "Skip to the next result set of a query with several statements. Return True, or None if no more sets"
+        if not self._nextsets:
+            return None
+        self._set_result_set(self._nextsets.popleft())
+        return True
 
     def setinputsizes(sizes):
         pass
@@ -312,6 +1294,135 @@ class BaseCursor(object):
     def close(self):
         self.connection = None
 
+    def _escape_args(self, args):
+        if isinstance(args, (tuple, list)):
+            return tuple([self.connection.escape_parameter(arg) for arg in args])
+        if isinstance(args, dict):
+            return {k: self.connection.escape_parameter(v) for (k, v) in args.items()}
+        return self.connection.escape_parameter(args)
+
+    def _escape_query(self, query, args):
+        "Return query with the escaped args embedded"
+        if args is None:
+            return query
+        return query % self._escape_args(args)
+
+    def _described(self):
+        "Called when the description of a result set is received"
+        if self._columns is not None:
+            self._new_columns()
+        self._make_row = self.row_factory(self.description) if self.row_factory else None
+        self._lazy_index = _record_index(self.description) if self.lazy else None
+
+    def _result_set(self):
+        return (
+            self.description, self._decoders, self._rows, self._rowcount,
+            self._columns, self._nulls, self._make_row, self._lazy_index,
+        )
+
+    def _set_result_set(self, result_set):
+        (
+            self.description, self._decoders, self._rows, self._rowcount,
+            self._columns, self._nulls, self._make_row, self._lazy_index,
+        ) = result_set
+
+    def _next_result_set(self):
+        "Keep the completed result set and start the next one"
+        self._nextsets.append(self._result_set())
+        self.description = []
+        self._decoders = ()
+        self._rows = collections.deque()
+        self._rowcount = 0
+        if self._columns is not None:
+            self._columns = []
+            self._nulls = []
+        self._completed = False
+
+    def _end_result_sets(self):
+        """Make the first result set with rows current after receiving all the result sets.
+        The statements without rows before it, such as SET, are skipped"""
+        self._completed = None
+        if self._nextsets:
+            sets = self._nextsets
+            sets.append(self._result_set())
+            if any([r[0] for r in sets]):
+                while not sets[0][0]:
+                    sets.popleft()
+            self._set_result_set(sets.popleft())
+
+    def _buffered(self):
+        "Number of rows received and not fetched yet"
+        if self._columns is None:
+            return len(self._rows)
+        return len(self._columns[0]) if self._columns else 0
+
+    def _new_columns(self):
+        "Start new columns for the result set, the DataRows are decoded into them"
+        self._columns = []
+        self._nulls = []
+        for d in self.description:
+            typecode = PG_COLUMN_TYPECODES.get(d[1])
+            self._columns.append(array.array(typecode) if typecode else [])
+            self._nulls.append([])
+
+    def _rows_to_columns(self):
+        "Move the rows received into the columns"
+        for row in self._rows:
+            for i, v in enumerate(row):
+                column = self._columns[i]
+                if v is None:
+                    self._nulls[i].append(len(column))
+                    column.append(None if type(column) is list else 0)
+                else:
+                    column.append(v)
+        self._rows.clear()
+
+    def _take_columns(self, numpy=False):
+        """Return the columns received and set their NULL masks to null_masks.
+        The columns are array.array for integer, float and bool types, or lists.
+        NULLs are 0 in array.array and None in lists, and marked by 1 in the bytearray masks.
+        With numpy=True, the columns and masks are numpy arrays."""
+        columns = self._columns or []
+        self.null_masks = []
+        for column, nulls in zip(columns, self._nulls):
+            if nulls:
+                mask = bytearray(len(column))
+                for i in nulls:
+                    mask[i] = 1
+                self.null_masks.append(mask)
+            else:
+                self.null_masks.append(None)
+        self._new_columns()
+        if numpy:
+            import numpy as np
+            columns = [
+                np.frombuffer(c, dtype=bool if c.typecode == 'B' else c.typecode)
+                if type(c) is array.array else np.array(c, dtype=object)
+                for c in columns
+            ]
+            self.null_masks = [
+                np.zeros(len(c), dtype=bool) if mask is None else np.frombuffer(mask, dtype=bool)
+                for c, mask in zip(columns, self.null_masks)
+            ]
+        return columns
+
+    def _columns_to_rows(self):
+        "Move the columns received into the rows"
+        columns = self._take_columns()
+        for i, column in enumerate(columns):
+            if type(column) is array.array and column.typecode == 'B':
+                column = [v == 1 for v in column]
+            if self.null_masks[i] is not None:
+                column = [None if m else v for v, m in zip(column, self.null_masks[i])]
+            columns[i] = column
+        if self._make_row:
+            self._rows.extend(map(self._make_row, zip(*columns)))
+        else:
+            self._rows.extend(zip(*columns))
+
+    def _columnar(self, columns):
+        return {d[0]: column for d, column in zip(self.description, columns)}
+
     @property
     def rowcount(self):
         return self._rowcount
@@ -334,49 +1445,294 @@ class Cursor(BaseCursor):
         self.description = []
         self._rows.clear()
         self.args = args
-        if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(
-                    [self.connection.escape_parameter(arg) for arg in args]
-                )
-            elif isinstance(args, dict):
-                escaped_args = {
-                    k: self.connection.escape_parameter(v) for (k, v) in args.items()
-                }
-            else:
-                escaped_args = self.connection.escape_parameter(args)
-            query = query % escaped_args
-        self.query = query
+        if self.connection._sends_parameters(args):
+            self.query = query
+            self.connection.execute(query, self, args)
+            return
+        self.query = self._escape_query(query, args)
         self.connection.execute(self.query, self)
 
     def callproc(self, proc_name, args=None):
-        escaped_args = []
-        if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(
-                    [self.connection.escape_parameter(arg) for arg in args]
-                )
-            elif isinstance(args, dict):
-                escaped_args = {
-                    k: self.connection.escape_parameter(v) for (k, v) in args.items()
-                }
-            else:
-                escaped_args = self.connection.escape_parameter(args)
+        escaped_args = [] if args is None else self._escape_args(args)
         self.query = 'select * from ' + proc_name + '(' + ','.join(escaped_args) + ')'
         self.connection.execute(self.query, self)
 
     def executemany(self, query, seq_of_params):
-        rowcount = 0
-        for params in seq_of_params:
-            self.execute(query, params)
-            rowcount += self._rowcount
-        self._rowcount = rowcount
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        if not self.connection.extended_query or self.connection.encoders:
+            # execute() for each parameters, which are escaped into the query
+            rowcount = 0
+            for params in seq_of_params:
+                self.execute(query, params)
+                rowcount += self._rowcount
+            self._rowcount = rowcount
+            return
+        self.description = []
+        self._rows.clear()
+        self.query = query
+        self.connection.executemany(query, seq_of_params, self)
+
+
+class StreamingCursor(Cursor):
+    """Cursor which receives a result set from the server by arraysize rows.
+    The rows are fetched from the unnamed portal on demand, so the memory usage
+    does not depend on the size of the result set.
+    While the rows are streaming, other queries on the connection discard the rest of them.
+    """
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.arraysize = 1000
+
+    def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        self.description = []
+        self._rows.clear()
+        self.args = args
+        if args is not None and not self.connection._sends_parameters(args):
+            query, args = self._escape_query(query, args), None
+        self.query = query
+        self.connection._execute_stream(query, self, args)
+
+    def callproc(self, proc_name, args=None):
+        raise NotSupportedError()
+
+    def executemany(self, query, seq_of_params):
+        raise NotSupportedError()
+
+    def _fetch(self):
+        self.connection._fetch_stream(self)
+
+    def fetchone(self):
+        if not len(self._rows) and self.connection and self.connection._stream is self:
+            self._fetch()
+        return super().fetchone()
+
+    def fetchmany(self, size=None):
+        return super().fetchmany(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        while self.connection and self.connection._stream is self:
+            self._fetch()
+        return super().fetchall()
+
+    def fetch_columns(self, numpy=False):
+        "Fetch all the rest rows as columns, see ColumnarCursor.fetch_columns()"
+        self._new_columns()
+        self._rows_to_columns()
+        while self.connection and self.connection._stream is self:
+            self._fetch()
+        columns = self._take_columns(numpy)
+        self._columns = None
+        return columns
+
+    def fetchall_columnar(self, numpy=False):
+        return self._columnar(self.fetch_columns(numpy))
+
+    def close(self):
+        if self.connection and self.connection._stream is self:
+            self.connection._end_stream()
+        super().close()
+
+
+class CopyOutCursor(StreamingCursor):
+    """StreamingCursor which receives the rows of a query by COPY TO STDOUT.
+    The rows are decoded by the decoders of the column types as SELECT,
+    from binary COPY format if format is 'binary' and all the column types have binary decoders,
+    otherwise from text format."""
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.format = 'binary'
+        self._copy_binary = False
+        self._copy_header = False   # the header of binary COPY format is not received yet
+
+    def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        self.description = []
+        self._rows.clear()
+        self.args = args
+        self.query = self._escape_query(query, args)
+        self.connection._execute_copy_out(self.query, self)
+
+    def _fetch(self, n=None):
+        self.connection._fetch_copy(self, n)
+
+    def iter_columns(self, size=None, numpy=False):
+        "Iterate the rest rows by batches of columns of size (arraysize by default) rows, see fetch_columns()"
+        size = size or self.arraysize
+        try:
+            while True:
+                self._new_columns()
+                self._rows_to_columns()
+                while self._buffered() < size and self.connection and self.connection._stream is self:
+                    self._fetch(size - self._buffered())
+                if not self._buffered():
+                    break
+                yield self._take_columns(numpy)
+                self._columns = None
+        finally:
+            self._columns = None
+
+
+class ColumnarCursor(Cursor):
+    """Cursor which decodes the rows into columns, without making a tuple for each row.
+    The columns are array.array for integer, float and bool types, or lists."""
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._columns = []
+
+    def execute(self, query, args=None):
+        self._columns = []
+        super().execute(query, args)
+
+    def fetch_columns(self, numpy=False):
+        """Fetch all the rest rows as a list of columns.
+        NULL masks of the columns are set to null_masks, None for a column without NULL.
+        With numpy=True, they are numpy arrays."""
+        return self._take_columns(numpy)
+
+    def fetchall_columnar(self, numpy=False):
+        "Fetch all the rest rows as a dict of column name: column"
+        return self._columnar(self._take_columns(numpy))
+
+    def fetchone(self):
+        if not len(self._rows) and self._buffered():
+            self._columns_to_rows()
+        return super().fetchone()
+
+    def fetchall(self):
+        self._columns_to_rows()
+        return super().fetchall()
+
+
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _declare_query(name, query, scrollable, withhold):
+    return 'DECLARE %s%s CURSOR%s FOR %s' % (
+        _quote_identifier(name),
+        {None: '', True: ' SCROLL', False: ' NO SCROLL'}[scrollable],
+        ' WITH HOLD' if withhold else '',
+        query.rstrip().rstrip(';'),
+    )
+
+
+def _fetch_query(name, n):
+    "FETCH next n rows, or all the rest if n is None"
+    return 'FETCH FORWARD %s FROM %s' % ('ALL' if n is None else n, _quote_identifier(name))
+
+
+def _scroll_query(name, value, mode, buffered):
+    "MOVE the cursor, which is ahead of the client by buffered rows"
+    if mode == 'relative':
+        return 'MOVE RELATIVE %d FROM %s' % (value - buffered, _quote_identifier(name))
+    elif mode == 'absolute':
+        return 'MOVE ABSOLUTE %d FROM %s' % (value, _quote_identifier(name))
+    raise ProgrammingError("Unknown scroll mode '%s'" % (mode, ))
+
+
+class ServerCursor(Cursor):
+    """Cursor on a named cursor which is DECLAREd on the server.
+    The rows are FETCHed by batches growing up to itersize rows,
+    so the client holds at most one batch of the result set.
+    """
+    def __init__(self, connection, name, scrollable=None, withhold=False):
+        super().__init__(connection)
+        self.name = name
+        self.scrollable = scrollable
+        self.withhold = withhold
+        self.itersize = 2000
+        self._fetch_size = 0
+        self._declared = None       # transaction in which the cursor is declared
+        self._done = True
+
+    def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        if self.connection.autocommit and not self.withhold:
+            raise InterfaceError("Server side cursor needs withhold=True in autocommit mode")
+        self._close_cursor()
+        self._rowcount = 0
+        self._fetch_size = min(100, self.itersize)
+        declare = _declare_query(self.name, query, self.scrollable, self.withhold)
+        if self.connection._sends_parameters(args):
+            super().execute(declare, args)
+            self._declared = self.connection._transaction_count
+            self._fetch(self._fetch_size)
+        else:
+            # DECLARE and the first FETCH in a round trip
+            # the result set of FETCH is current, DECLARE has no rows
+            super().execute(declare + '; ' + _fetch_query(self.name, self._fetch_size), args)
+            self._declared = self.connection._transaction_count
+            self._fetched(len(self._rows), self._fetch_size)
+
+    def callproc(self, proc_name, args=None):
+        raise NotSupportedError()
+
+    def executemany(self, query, seq_of_params):
+        raise NotSupportedError()
+
+    def _fetch(self, n):
+        count = len(self._rows)
+        self.connection.execute(_fetch_query(self.name, n), self)
+        self._fetched(len(self._rows) - count, n)
+
+    def _fetched(self, count, n):
+        self._rowcount += count
+        self._done = n is None or count < n
+        self._fetch_size = min(self._fetch_size * 2, self.itersize)
+
+    def fetchone(self):
+        if not len(self._rows) and not self._done:
+            self._fetch(self._fetch_size)
+        return super().fetchone()
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        if len(self._rows) < size and not self._done:
+            self._fetch(max(size - len(self._rows), self._fetch_size))
+        return super().fetchmany(size)
+
+    def fetchall(self):
+        if not self._done:
+            self._fetch(None)
+        return super().fetchall()
+
+    def scroll(self, value, mode='relative'):
+        if self._declared is None:
+            raise ProgrammingError("Cursor is not executed")
+        self.connection.execute(_scroll_query(self.name, value, mode, len(self._rows)))
+        self._rows.clear()
+        self._done = False
+
+    def _close_cursor(self):
+        conn = self.connection
+        if (
+            self._declared is not None and conn.is_connect() and conn._trans_status != b'E' and
+            (self.withhold or self._declared == conn._transaction_count)
+        ):
+            conn.execute('CLOSE ' + _quote_identifier(self.name))
+        self._declared = None
+        self._done = True
+        self._rows.clear()
+
+    def close(self):
+        if self.connection:
+            self._close_cursor()
+        super().close()
 
 
 class AsyncCursor(BaseCursor):
     async def __aenter__(self):
         return self
 
+    def __aiter__(self):
+        return self
+
     async def __anext__(self):
         ret = await self.fetchone()
         if ret is not None:
@@ -396,43 +1752,33 @@ class AsyncCursor(BaseCursor):
         self.description = []
         self._rows.clear()
         self.args = args
-        if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(
-                    [self.connection.escape_parameter(arg) for arg in args]
-                )
-            elif isinstance(args, dict):
-                escaped_args = {
-                    k: self.connection.escape_parameter(v) for (k, v) in args.items()
-                }
-            else:
-                escaped_args = self.connection.escape_parameter(args)
-            query = query % escaped_args
-        self.query = query
+        if self.connection._sends_parameters(args):
+            self.query = query
+            await self.connection.execute(query, self, args)
+            return
+        self.query = self._escape_query(query, args)
         await self.connection.execute(self.query, self)
 
     async def callproc(self, proc_name, args=None):
-        escaped_args = []
-        if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(
-                    [self.connection.escape_parameter(arg) for arg in args]
-                )
-            elif isinstance(args, dict):
-                escaped_args = {
-                    k: self.connection.escape_parameter(v) for (k, v) in args.items()
-                }
-            else:
-                escaped_args = self.connection.escape_parameter(args)
+        escaped_args = [] if args is None else self._escape_args(args)
         self.query = 'select * from ' + proc_name + '(' + ','.join(escaped_args) + ')'
         await self.connection.execute(self.query, self)
 
     async def executemany(self, query, seq_of_params):
-        rowcount = 0
-        for params in seq_of_params:
-            await self.execute(query, params)
-            rowcount += self._rowcount
-        self._rowcount = rowcount
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        if not self.connection.extended_query or self.connection.encoders:
+            # execute() for each parameters, which are escaped into the query
+            rowcount = 0
+            for params in seq_of_params:
+                await self.execute(query, params)
+                rowcount += self._rowcount
+            self._rowcount = rowcount
+            return
+        self.description = []
+        self._rows.clear()
+        self.query = query
+        await self.connection.executemany(query, seq_of_params, self)
 
     async def fetchone(self):
         return super().fetchone()
@@ -444,8 +1790,603 @@ class AsyncCursor(BaseCursor):
         return super().fetchall()
 
 
+class AsyncStreamingCursor(AsyncCursor):
+    "AsyncCursor which receives a result set from the server by arraysize rows"
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.arraysize = 1000
+
+    async def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        self.description = []
+        self._rows.clear()
+        self.args = args
+        if args is not None and not self.connection._sends_parameters(args):
+            query, args = self._escape_query(query, args), None
+        self.query = query
+        await self.connection._execute_stream(query, self, args)
+
+    async def callproc(self, proc_name, args=None):
+        raise NotSupportedError()
+
+    async def executemany(self, query, seq_of_params):
+        raise NotSupportedError()
+
+    async def _fetch(self):
+        await self.connection._fetch_stream(self)
+
+    async def fetchone(self):
+        if not len(self._rows) and self.connection and self.connection._stream is self:
+            await self._fetch()
+        return BaseCursor.fetchone(self)
+
+    async def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        rs = []
+        for i in range(size):
+            r = await self.fetchone()
+            if r is None:
+                break
+            rs.append(r)
+        return rs
+
+    async def fetchall(self):
+        while self.connection and self.connection._stream is self:
+            await self._fetch()
+        return BaseCursor.fetchall(self)
+
+    async def fetch_columns(self, numpy=False):
+        "Fetch all the rest rows as columns, see ColumnarCursor.fetch_columns()"
+        self._new_columns()
+        self._rows_to_columns()
+        while self.connection and self.connection._stream is self:
+            await self._fetch()
+        columns = self._take_columns(numpy)
+        self._columns = None
+        return columns
+
+    async def fetchall_columnar(self, numpy=False):
+        return self._columnar(await self.fetch_columns(numpy))
+
+    async def close(self):
+        if self.connection and self.connection._stream is self:
+            await self.connection._end_stream()
+        self.connection = None
+
+
+class AsyncCopyOutCursor(AsyncStreamingCursor):
+    "AsyncStreamingCursor which receives the rows of a query by COPY TO STDOUT, see CopyOutCursor"
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.format = 'binary'
+        self._copy_binary = False
+        self._copy_header = False
+
+    async def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        self.description = []
+        self._rows.clear()
+        self.args = args
+        self.query = self._escape_query(query, args)
+        await self.connection._execute_copy_out(self.query, self)
+
+    async def _fetch(self, n=None):
+        await self.connection._fetch_copy(self, n)
+
+    async def iter_columns(self, size=None, numpy=False):
+        "Iterate the rest rows by batches of columns of size (arraysize by default) rows"
+        size = size or self.arraysize
+        try:
+            while True:
+                self._new_columns()
+                self._rows_to_columns()
+                while self._buffered() < size and self.connection and self.connection._stream is self:
+                    await self._fetch(size - self._buffered())
+                if not self._buffered():
+                    break
+                yield self._take_columns(numpy)
+                self._columns = None
+        finally:
+            self._columns = None
+
+
+class AsyncColumnarCursor(AsyncCursor):
+    "AsyncCursor which decodes the rows into columns"
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._columns = []
+
+    async def execute(self, query, args=None):
+        self._columns = []
+        await super().execute(query, args)
+
+    async def fetch_columns(self, numpy=False):
+        return self._take_columns(numpy)
+
+    async def fetchall_columnar(self, numpy=False):
+        return self._columnar(self._take_columns(numpy))
+
+    async def fetchone(self):
+        if not len(self._rows) and self._buffered():
+            self._columns_to_rows()
+        return BaseCursor.fetchone(self)
+
+    async def fetchall(self):
+        self._columns_to_rows()
+        return BaseCursor.fetchall(self)
+
+
+class AsyncServerCursor(AsyncCursor):
+    "AsyncCursor on a named cursor which is DECLAREd on the server"
+    def __init__(self, connection, name, scrollable=None, withhold=False):
+        super().__init__(connection)
+        self.name = name
+        self.scrollable = scrollable
+        self.withhold = withhold
+        self.itersize = 2000
+        self._fetch_size = 0
+        self._declared = None       # transaction in which the cursor is declared
+        self._done = True
+
+    async def execute(self, query, args=None):
+        if not self.connection or not self.connection.is_connect():
+            raise InterfaceError("Lost connection", "08003")
+        if self.connection.autocommit and not self.withhold:
+            raise InterfaceError("Server side cursor needs withhold=True in autocommit mode")
+        await self._close_cursor()
+        self._rowcount = 0
+        self._fetch_size = min(100, self.itersize)
+        declare = _declare_query(self.name, query, self.scrollable, self.withhold)
+        if self.connection._sends_parameters(args):
+            await super().execute(declare, args)
+            self._declared = self.connection._transaction_count
+            await self._fetch(self._fetch_size)
+        else:
+            # DECLARE and the first FETCH in a round trip
+            # the result set of FETCH is current, DECLARE has no rows
+            await super().execute(declare + '; ' + _fetch_query(self.name, self._fetch_size), args)
+            self._declared = self.connection._transaction_count
+            self._fetched(len(self._rows), self._fetch_size)
+
+    async def callproc(self, proc_name, args=None):
+        raise NotSupportedError()
+
+    async def executemany(self, query, seq_of_params):
+        raise NotSupportedError()
+
+    async def _fetch(self, n):
+        count = len(self._rows)
+        await self.connection.execute(_fetch_query(self.name, n), self)
+        self._fetched(len(self._rows) - count, n)
+
+    def _fetched(self, count, n):
+        self._rowcount += count
+        self._done = n is None or count < n
+        self._fetch_size = min(self._fetch_size * 2, self.itersize)
+
+    async def fetchone(self):
+        if not len(self._rows) and not self._done:
+            await self._fetch(self._fetch_size)
+        return BaseCursor.fetchone(self)
+
+    async def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        if len(self._rows) < size and not self._done:
+            await self._fetch(max(size - len(self._rows), self._fetch_size))
+        rs = []
+        while len(rs) < size and len(self._rows):
+            rs.append(self._rows.popleft())
+        return rs
+
+    async def fetchall(self):
+        if not self._done:
+            await self._fetch(None)
+        return BaseCursor.fetchall(self)
+
+    async def scroll(self, value, mode='relative'):
+        if self._declared is None:
+            raise ProgrammingError("Cursor is not executed")
+        await self.connection.execute(_scroll_query(self.name, value, mode, len(self._rows)))
+        self._rows.clear()
+        self._done = False
+
+    async def _close_cursor(self):
+        conn = self.connection
+        if (
+            self._declared is not None and conn.is_connect() and conn._trans_status != b'E' and
+            (self.withhold or self._declared == conn._transaction_count)
+        ):
+            await conn.execute('CLOSE ' + _quote_identifier(self.name))
+        self._declared = None
+        self._done = True
+        self._rows.clear()
+
+    async def close(self):
+        if self.connection:
+            await self._close_cursor()
+        self.connection = None
+
+
+def _message(code, data):
+    return b''.join([code, _bint_to_bytes(len(data) + 4), data])
+
+
+_SYNC_MESSAGE = b'S\x00\x00\x00\x04'
+_EXECUTE_MESSAGE = b'E\x00\x00\x00\x09\x00\x00\x00\x00\x00'     # unnamed portal, all rows
+_FLUSH_MESSAGE = b'H\x00\x00\x00\x04'
+_CLOSE_PORTAL_MESSAGE = b'C\x00\x00\x00\x06P\x00'         # unnamed portal
+# BEGIN in the unnamed statement and portal, sent before the first statement of a transaction
+_BEGIN_MESSAGE = (
+    _message(b'P', b'\x00BEGIN\x00\x00\x00') + _message(b'B', b'\x00\x00\x00\x00\x00\x00\x00\x00') + _EXECUTE_MESSAGE
+)
+
+_PIPELINE_CHUNK_SIZE = 65536
+
+# COPY FROM STDIN
+_COPY_CHUNK_SIZE = 262144       # size of CopyData messages
+_COPY_DONE_MESSAGE = b'c\x00\x00\x00\x04'
+_COPY_RECORDS_BATCH_SIZE = 1000    # records of an async iterable encoded at once
+# signature, flags and length of header extension
+_COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+_COPY_BINARY_TRAILER = b'\xff\xff'
+_COPY_NULL_FIELD = b'\xff\xff\xff\xff'
+
+# struct formats of fixed size types in binary COPY
+_COPY_FIXED_FORMATS = {
+    PG_TYPE_BOOL: '?',
+    PG_TYPE_INT2: 'h',
+    PG_TYPE_INT4: 'i',
+    PG_TYPE_INT8: 'q',
+    PG_TYPE_OID: 'I',
+    PG_TYPE_FLOAT4: 'f',
+    PG_TYPE_FLOAT8: 'd',
+}
+
+# binary format is the same as text format
+_COPY_TEXT_BINARY_TYPES = (
+    PG_TYPE_CHAR, PG_TYPE_TEXT, PG_TYPE_BPCHAR, PG_TYPE_VARCHAR, PG_TYPE_NAME, PG_TYPE_XML,
+)
+
+_COPY_TEXT_ESCAPE_RE = re.compile(rb'[\\\n\r\t]')
+_COPY_TEXT_ESCAPES = {b'\\': b'\\\\', b'\n': b'\\n', b'\r': b'\\r', b'\t': b'\\t'}
+_COPY_TEXT_UNESCAPE_RE = re.compile(rb'\\(?:([0-7]{1,3})|x([0-9A-Fa-f]{1,2})|(.))', re.S)
+_COPY_TEXT_UNESCAPES = {b'b': b'\b', b'f': b'\f', b'n': b'\n', b'r': b'\r', b't': b'\t', b'v': b'\v'}
+
+
+def _escape_copy_text(b):
+    "Escape a value of text format COPY"
+    if _COPY_TEXT_ESCAPE_RE.search(b) is None:
+        return b
+    return _COPY_TEXT_ESCAPE_RE.sub(lambda m: _COPY_TEXT_ESCAPES[m.group(0)], b)
+
+
+def _unescape_copy_text(m):
+    if m.group(1):
+        return bytes([int(m.group(1), 8) & 0xff])
+    if m.group(2):
+        return bytes([int(m.group(2), 16)])
+    return _COPY_TEXT_UNESCAPES.get(m.group(3), m.group(3))
+
+
+def _copy_text_data_row(line):
+    "Convert a line of text format COPY to the data of DataRow"
+    fields = bytes(line[:-1]).split(b'\t')
+    parts = [struct.pack('!h', len(fields))]
+    for f in fields:
+        if f == b'\\N':
+            parts.append(_COPY_NULL_FIELD)
+            continue
+        if b'\\' in f:
+            f = _COPY_TEXT_UNESCAPE_RE.sub(_unescape_copy_text, f)
+        parts.append(_bint_to_bytes(len(f)))
+        parts.append(f)
+    return b''.join(parts)
+
+
+def _copy_field_encoder(encoder):
+    "Return a function to encode a field of binary COPY with its length"
+    def _encode(v):
+        b = encoder(v)
+        return _bint_to_bytes(len(b)) + b
+    return _encode
+
+
+def _copy_data_message(parts, size):
+    "CopyData message of the bytes in parts"
+    parts.insert(0, _bint_to_bytes(size + 4))
+    parts.insert(0, b'd')
+    return b''.join(parts)
+
+
+def _copy_fail_message(reason):
+    return _message(b'f', str(reason).encode('utf-8', 'replace') + b'\x00')
+
+
+_IOV_MAX = 1024     # max buffers of a writev() call
+
+
+def _write_views(fd, views):
+    "Write all the buffers in views to fd by vectored writes"
+    if not hasattr(os, 'writev'):
+        data = memoryview(b''.join(views))
+        while data:
+            data = data[os.write(fd, data):]
+        return
+    i = 0
+    while i < len(views):
+        n = os.writev(fd, views[i:i + _IOV_MAX])
+        while i < len(views) and n >= len(views[i]):
+            n -= len(views[i])
+            i += 1
+        if n:
+            views[i] = views[i][n:]
+
+
+class _CopyFile:
+    """A file path or a file descriptor to COPY from or to.
+    The file is opened when the server starts COPY, in the direction of COPY"""
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+
+    def open(self, mode):
+        # a file descriptor is not closed
+        self.file = io.FileIO(self.target, mode, closefd=not isinstance(self.target, int))
+        return self.file
+
+    def write(self, b):
+        _write_views(self.file.fileno(), [b])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _blocking_file(obj):
+    "Whether obj is a file object whose read() and write() may block, not an in-memory buffer"
+    return isinstance(obj, io.IOBase) and not isinstance(obj, (io.BytesIO, io.StringIO))
+
+
+_PARAMSTYLE_RE = re.compile(r'%%|%\((\w+)\)s|%s')
+
+
+def _convert_paramstyle(query):
+    "Convert 'format'/'pyformat' placeholders to $n. Return (query, parameter names)"
+    names = []
+    count = 0
+
+    def _placeholder(m):
+        nonlocal count
+        if m.group(0) == '%%':
+            return '%'
+        name = m.group(1)
+        if name is None:
+            count += 1
+            return '$%d' % (count, )
+        if name not in names:
+            names.append(name)
+        return '$%d' % (names.index(name) + 1, )
+
+    return _PARAMSTYLE_RE.sub(_placeholder, query), names
+
+
+def _execute_message(n):
+    "Execute message for the unnamed portal, which returns at most n rows"
+    return b'E\x00\x00\x00\x09\x00' + _bint_to_bytes(n)
+
+
+def _portal_query_message(query):
+    "Messages to execute query in the portal 'q' and close it, with Flush instead of Sync"
+    return b''.join([
+        _message(b'P', b'\x00' + query + b'\x00\x00\x00'),
+        _message(b'B', b'q\x00\x00\x00\x00\x00\x00\x00\x00'),
+        _message(b'D', b'Pq\x00'),
+        _message(b'E', b'q\x00\x00\x00\x00\x00'),
+        _message(b'C', b'Pq\x00'),
+        _FLUSH_MESSAGE,
+    ])
+
+
+class _Statement:
+    "Server side prepared statement"
+
+    __slots__ = ('name', 'query', 'names', 'param_oids', 'description', '_formats', '_decoders')
+
+    def __init__(self, name, query, names):
+        self.name = name
+        self.query = query
+        self.names = names
+        self.param_oids = None      # set by Describe
+        self.description = []
+        self._formats = None        # result format codes
+        self._decoders = ()
+
+    _completed = None
+
+    def _described(self):
+        pass
+
+
+_PIPELINE_SYNC = object()      # Sync in the queue of a pipeline
+
+
+class BasePipeline(object):
+    """Statements queued by execute() are sent back to back with the extended query protocol,
+    and Sync is sent at the end and at sync() boundaries.
+    The results are received to the cursors returned by execute().
+    An error skips the rest statements until the next Sync"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.error = None               # the first error
+        self._messages = []
+        self._size = 0
+        self._sent = False
+        self._skipping = False
+        self._queue = collections.deque()     # cursors waiting for results, None for BEGIN, or _PIPELINE_SYNC
+        self._cursors = []
+
+    def _append(self, obj, message):
+        self._queue.append(obj)
+        self._messages.append(message)
+        self._size += len(message)
+
+    def _send(self):
+        if self._messages:
+            self.connection._write(b''.join(self._messages))
+            self._messages = []
+            self._size = 0
+            self._sent = True
+
+    def _execute(self, query, args, cursor):
+        conn = self.connection
+        cur = conn.cursor(cursor)
+        cur.query = query
+        cur.args = args
+        begin = conn._begin_message()
+        if begin:
+            self._append(None, begin)
+        conn._check_types()
+        sends = conn._sends_parameters(args)
+        stmt = conn._statements.get(query) if sends else None
+        if stmt is not None:
+            cur.description = stmt.description
+            cur._decoders = stmt._decoders
+            cur._described()
+        elif not sends:
+            # the parameters are escaped into the query as execute() does
+            cur.query = cur._escape_query(query, args)
+            stmt, args = _Statement('', cur.query, []), ()
+        else:
+            stmt = _Statement('', *_convert_paramstyle(query))
+        self._append(cur, conn._first_bind_message(stmt, args))
+        self._cursors.append(cur)
+        return cur
+
+    def sync(self):
+        "Send Sync after the statements queued, an error before it does not skip the statements after it"
+        if self._queue and self._queue[-1] is not _PIPELINE_SYNC:
+            self._append(_PIPELINE_SYNC, _SYNC_MESSAGE)
+
+    def _discard(self):
+        "Forget the statements not sent"
+        if self._queue and self._queue[0] is None:
+            self.connection._begin_pending = True
+        self._queue.clear()
+        self._messages = []
+
+    def _process_message(self, code, data):
+        conn = self.connection
+        queue = self._queue
+        obj = queue[0]
+        if obj is _PIPELINE_SYNC or self._skipping:
+            obj = None
+        if code == 90:
+            conn._process_message(code, data, None)
+            while queue.popleft() is not _PIPELINE_SYNC:
+                pass
+            self._skipping = False
+        elif code == 69:
+            conn._errobj = None
+            if obj is not None:
+                conn.query = obj.query
+            conn._process_message(code, data, obj)
+            err = conn._errobj
+            if obj is not None:
+                conn._invalidate_statement(obj.query, err)
+            if self.error is None:
+                self.error = err
+            # the server skips the statements until Sync
+            self._skipping = True
+        else:
+            conn._process_message(code, data, obj)
+            if code in (67, 73):    # CommandComplete, EmptyQueryResponse
+                queue.popleft()
+
+    def _process_buffered_messages(self):
+        buf = self.connection._rbuf
+        m = buf.message()
+        while m is not None:
+            self._process_message(*m)
+            m = buf.message()
+
+
+class Pipeline(BasePipeline):
+    def __enter__(self):
+        self.connection._end_stream()
+        return self
+
+    def __exit__(self, exc, value, traceback):
+        if exc is not None and not self._sent:
+            self._discard()
+            return
+        self._finish(exc is None)
+
+    def execute(self, query, args=None, cursor=None):
+        "Queue query and return a cursor, which has the result after the pipeline is finished"
+        cur = self._execute(query, args, cursor)
+        if self._size >= _PIPELINE_CHUNK_SIZE:
+            self._send()
+            # receive the results not to block the server
+            self.connection._recv_available()
+            self._process_buffered_messages()
+        return cur
+
+    def _finish(self, raise_error=True):
+        conn = self.connection
+        self.sync()
+        self._send()
+        while self._queue:
+            self._process_message(*conn._read_message())
+        conn._errobj = None
+        if conn._unknown_oids:
+            conn._load_types(*self._cursors)
+        if self.error and raise_error:
+            raise self.error
+
+
+class AsyncPipeline(BasePipeline):
+    async def __aenter__(self):
+        await self.connection._end_stream()
+        return self
+
+    async def __aexit__(self, exc, value, traceback):
+        if exc is not None and not self._sent:
+            self._discard()
+            return
+        await self._finish(exc is None)
+
+    def execute(self, query, args=None, cursor=None):
+        "Queue query and return a cursor, which has the result after the pipeline is finished"
+        cur = self._execute(query, args, cursor)
+        if self._size >= _PIPELINE_CHUNK_SIZE:
+            self._send()
+            # process the results received by the protocol so far, which resumes its reading
+            self._process_buffered_messages()
+            self.connection._protocol.consumed()
+        return cur
+
+    async def _finish(self, raise_error=True):
+        conn = self.connection
+        self.sync()
+        self._send()
+        while self._queue:
+            self._process_message(*await conn._read_message())
+        conn._errobj = None
+        if conn._unknown_oids:
+            await conn._load_types(*self._cursors)
+        if self.error and raise_error:
+            raise self.error
+
+
 class BaseConnection(object):
-    def __init__(self, user=None, password=None, database=None, host=None, port=None, timeout=None, ssl_context=None):
+    def __init__(self, user=None, password=None, database=None, host=None, port=None, timeout=None, ssl_context=None,
+                 prepare=False, statement_cache_size=100, binary_parameters=False, binary_results=False,
+                 flat_arrays=False):
         self.user = user
         self.password = password
         self.database = database
@@ -454,166 +2395,975 @@ class BaseConnection(object):
         self.timeout = timeout
         self.ssl_context = ssl_context
         self.encoding = 'UTF8'
-        self.autocommit = False
+        self._autocommit = False
         self.server_version = ''
         self._trans_status = b'I'
+        self._transaction_count = 0     # incremented when a transaction is ended
+        self._begin_pending = False     # BEGIN is sent with the next statement
+        self._skip_begin_complete = False   # CommandComplete of BEGIN sent with a query is not received yet
+        self._extended_copy = False     # COPY is executed by an extended query, which needs Sync after CopyDone
         self.encoders = {}
         self.tz_name = None
         self.tzinfo = None
         self.sock = None
+        self.query = None
+        self._rbuf = None
+        self._errobj = None
+        self._client_nonce = None
+        self.prepare = prepare
+        self.statement_cache_size = statement_cache_size
+        self.binary_parameters = binary_parameters
+        self.binary_results = binary_results
+        self.flat_arrays = flat_arrays      # numeric arrays as array.array
+        self._stream = None         # cursor which is receiving rows from the unnamed portal
+        self._row_descriptions = {}     # RowDescription message: (description, decoders)
+        self._types = _TYPE_CACHES.setdefault((host, port, database), _TypeCache())
+        self._types_generation = self._types.generation
+        self._unknown_oids = set()      # types to look up in pg_type
+        self._statements = collections.OrderedDict()
+        self._statement_id = 0
+        self._closing_statements = []
 
     def _decode_column(self, data, oid):
-        def _trim_timezone_offset(data):
-            n = data.rfind('+')
-            if n == -1:
-                n = data.rfind('-')
-            return data[:n]
-
-        def _parse_point(data):
-            x, y = data[1:-1].split(',')
-            return (float(x), float(y))
-
         if data is None:
             return data
-        data = data.decode(self.encoding)
-        if oid in (PG_TYPE_BOOL,):
-            return data == 't'
-        elif oid in (PG_TYPE_INT2, PG_TYPE_INT4, PG_TYPE_INT8, PG_TYPE_OID,):
-            return int(data)
-        elif oid in (PG_TYPE_FLOAT4, PG_TYPE_FLOAT8):
-            return float(data)
-        elif oid in (PG_TYPE_NUMERIC, ):
-            return decimal.Decimal(data)
-        elif oid in (PG_TYPE_DATE, ):
-            dt = datetime.datetime.strptime(data, '%Y-%m-%d')
-            return datetime.date(dt.year, dt.month, dt.day)
-        elif oid in (PG_TYPE_TIME, ):
-            if len(data) == 8:
-                dt = datetime.datetime.strptime(data, '%H:%M:%S')
+        return self._column_decoder(oid, 0)(data)
+
+    def _column_decoder(self, oid, format_code):
+        "Return a function to decode a column value of oid in format_code"
+        if format_code:
+            return self._binary_decoder(oid)
+        info = self._types.types.get(oid)
+        if info is not None and info.decoder:
+            return info.decoder
+        elem_oid = PG_ARRAY_ELEMENT_TYPES.get(oid)
+        if elem_oid is not None:
+            return functools.partial(
+                _decode_text_array,
+                decoder=self._column_decoder(elem_oid, 0),
+                typecode=PG_ARRAY_TYPECODES.get(elem_oid) if self.flat_arrays else None,
+            )
+        decoder = _TEXT_DECODERS.get(oid)
+        if oid == PG_TYPE_JSON:
+            return functools.partial(decoder, encoding=self.encoding)
+        if decoder:
+            return decoder
+        if info is not None:
+            return self._type_decoder(info)
+        if oid not in _TEXT_TYPES:
+            # decoded as str until the type is looked up
+            DEBUG_OUTPUT('NO DECODE type:%d' % (oid, ))
+            self._unknown_oids.add(oid)
+        return functools.partial(str, encoding=self.encoding)
+
+    def _type_decoder(self, info):
+        "Return a function to decode a text format value of the type in pg_type"
+        if info.kind == 'd':
+            return self._column_decoder(info.base, 0)
+        if info.elem:
+            return functools.partial(
+                _decode_text_array,
+                decoder=self._column_decoder(info.elem, 0),
+                delimiter=info.delimiter,
+                typecode=PG_ARRAY_TYPECODES.get(info.elem) if self.flat_arrays else None,
+            )
+        if info.kind == 'c':
+            return functools.partial(
+                _decode_text_composite, decoders=tuple([self._column_decoder(oid, 0) for oid in info.attrs])
+            )
+        if info.kind == 'r':
+            return functools.partial(_decode_text_range, decoder=self._column_decoder(info.subtype, 0))
+        # enum, and base types which have no decoders
+        return functools.partial(str, encoding=self.encoding)
+
+    def _binary_decoder(self, oid):
+        "Return a function to decode a binary format value of oid, or None"
+        info = self._types.types.get(oid)
+        if info is not None:
+            if info.binary_decoder:
+                return info.binary_decoder
+            if info.kind == 'd':
+                return self._binary_decoder(info.base)
+        if self.flat_arrays and PG_ARRAY_ELEMENT_TYPES.get(oid) in PG_ARRAY_TYPECODES:
+            return functools.partial(_decode_array, flat=True)
+        return _BINARY_DECODERS.get(oid)
+
+    def _binary_encoder(self, oid):
+        "Return a function to encode a parameter of oid in binary format, or None"
+        info = self._types.types.get(oid)
+        if info is not None:
+            if info.binary_encoder:
+                return info.binary_encoder
+            if info.kind == 'd':
+                return self._binary_encoder(info.base)
+        return _BINARY_ENCODERS.get(oid)
+
+    def _check_types(self):
+        "Rebuild the decoders if codecs of the database are changed"
+        if self._types_generation != self._types.generation:
+            self._types_generation = self._types.generation
+            self._row_descriptions.clear()
+            for stmt in self._statements.values():
+                self._set_result_formats(stmt)
+
+    def _store_types(self, rows):
+        "Store the rows of _TYPES_QUERY. Return the oids they refer, which are not known yet"
+        types = self._types.types
+        refs = set()
+        for oid, kind, category, elem, base, subtype, delimiter, attrs in rows:
+            attrs = tuple([int(a) for a in attrs.split(',')]) if attrs else ()
+            info = types.get(oid)
+            if info is None:
+                info = types[oid] = _TypeInfo(oid)
+            info.kind = kind
+            info.elem = elem if category == 'A' else 0
+            info.base = base
+            info.delimiter = (delimiter or ',').encode('ascii')
+            info.subtype = subtype or 0
+            info.attrs = attrs
+            refs.update((info.elem, info.base, info.subtype) + attrs)
+        refs.discard(0)
+        return set([
+            oid for oid in refs
+            if oid not in types and oid not in _TEXT_DECODERS and oid not in _TEXT_TYPES
+            and oid not in PG_ARRAY_ELEMENT_TYPES
+        ])
+
+    def _types_loaded(self, obj, oids):
+        "Decode the columns of oids in obj again, which were decoded as str"
+        self._types.generation += 1
+        self._check_types()
+        if obj is None or not obj.description:
+            return
+        # columns decoded in text format as str, not the ones in binary format
+        columns = [
+            i for i, d in enumerate(obj.description)
+            if d[1] in oids and getattr(obj._decoders[i], 'func', None) is str
+        ]
+        if not columns:
+            return
+        decoders = list(obj._decoders)
+        for i in columns:
+            decoders[i] = self._column_decoder(obj.description[i][1], 0)
+        obj._decoders = tuple(decoders)
+        if obj._columns:
+            for i in columns:
+                obj._columns[i] = [
+                    v if v is None else decoders[i](v.encode(self.encoding)) for v in obj._columns[i]
+                ]
+        rows = list(obj._rows)
+        obj._rows.clear()
+        for row in rows:
+            if type(row) is LazyRecord:
+                # decoded by the new decoders when accessed
+                row._decoders = obj._decoders
+                row._values = None
+                obj._rows.append(row)
+                continue
+            row = list(row.values() if isinstance(row, dict) else row)
+            for i in columns:
+                if row[i] is not None:
+                    row[i] = decoders[i](row[i].encode(self.encoding))
+            row = tuple(row)
+            obj._rows.append(obj._make_row(row) if obj._make_row else row)
+
+    def _register_type(self, oid, array_oid, decoder, binary_decoder, binary_encoder):
+        types = self._types.types
+        info = types.get(oid)
+        if info is None:
+            info = types[oid] = _TypeInfo(oid, 'b')
+        info.decoder = decoder
+        info.binary_decoder = binary_decoder
+        info.binary_encoder = binary_encoder
+        if array_oid and array_oid not in types:
+            types[array_oid] = _TypeInfo(array_oid, 'b', elem=oid)
+        self._types.generation += 1
+
+    def _row_decoders(self, oids, formats=None):
+        "Return a tuple of the column decoders"
+        return tuple([
+            self._column_decoder(oid, formats[i] if formats else 0) for i, oid in enumerate(oids)
+        ])
+
+    def escape_parameter(self, v):
+        if isinstance(v, enum.Enum):
+            v = v.value
+        t = type(v)
+        func = self.encoders.get(t)
+        if func:
+            return func(self, v)
+        if v is None:
+            return 'NULL'
+        elif t == str:
+            return u"'" + v.replace(u"'", u"''") + u"'"
+        elif t == bytearray or t == bytes or t == memoryview:        # binary
+            return "'\\x" + v.hex() + "'::bytea"
+        elif t == bool:
+            return u"TRUE" if v else u"FALSE"
+        elif t == time.struct_time:
+            return u'%04d-%02d-%02d %02d:%02d:%02d' % (
+                v.tm_year, v.tm_mon, v.tm_mday, v.tm_hour, v.tm_min, v.tm_sec)
+        elif t == datetime.datetime:
+            if v.tzinfo:
+                return "timestamp with time zone '" + v.isoformat() + "'"
             else:
-                dt = datetime.datetime.strptime(data, '%H:%M:%S.%f')
-            dt = datetime.time(dt.hour, dt.minute, dt.second, dt.microsecond)
-            return dt
-        elif oid in (PG_TYPE_TIMESTAMP, ):
-            if len(data) == 19:
-                dt = datetime.datetime.strptime(data, '%Y-%m-%d %H:%M:%S')
+                return "timestamp '" + v.isoformat() + "'"
+        elif t == datetime.date:
+            return "date '" + str(v) + "'"
+        elif t == datetime.timedelta:
+            return u"interval '" + str(v) + "'"
+        elif t == int or t == float:
+            return str(v)
+        elif t == decimal.Decimal:
+            return "decimal '" + str(v) + "'"
+        elif t == list or t == tuple or t == array.array:
+            return u'ARRAY[' + u','.join([self.escape_parameter(e) for e in v]) + u']'
+        else:
+            return "'" + str(v) + "'"
+
+    def _send_data(self, message, data):
+        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
+        self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data]))
+
+    def _send_message(self, message, data):
+        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
+        self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data, b'H\x00\x00\x00\x04']))
+
+    def _process_message(self, code, data, obj):
+        if code != 68 and code != 100:
+            data = bytes(data)
+        if code == 90:
+            self._trans_status = data
+            # BEGIN sent with a query which failed before it is not completed
+            self._skip_begin_complete = False
+            if data == b'I':
+                # not in a transaction, BEGIN the next one with its first statement
+                # unless each statement is committed by the server in autocommit mode
+                self._transaction_count += 1
+                self._begin_pending = not self._autocommit
+            DEBUG_OUTPUT("-> ReadyForQuery('Z'):{}".format(data))
+        elif code == 82:
+            auth_method = _bytes_to_bint(data[:4])
+            DEBUG_OUTPUT("-> Authentication('R'):{}".format(auth_method))
+            if auth_method == 0:      # trust, or authentication accepted
+                pass
+            elif auth_method == 5:    # md5
+                salt = data[4:]
+                hash1 = hashlib.md5(self.password.encode('ascii') + self.user.encode("ascii")).hexdigest().encode("ascii")
+                hash2 = hashlib.md5(hash1+salt).hexdigest().encode("ascii")
+                self._send_data(b'p', b''.join([b'md5', hash2, b'\x00']))
+            elif auth_method == 10:   # SASL
+                assert b'SCRAM-SHA-256\x00' in data
+                printable = string.ascii_letters + string.digits + '+/'
+                client_nonce = ''.join(
+                    printable[random.randrange(0, len(printable))]
+                    for i in range(24)
+                )
+                self._client_nonce = client_nonce
+
+                # send client first message
+                client_first_message = 'n,,n=,r=' + client_nonce
+                self._send_data(b'p', b''.join([
+                    b'SCRAM-SHA-256\x00',
+                    _bint_to_bytes(len(client_first_message)),
+                    client_first_message.encode('utf-8')
+                ]))
+                DEBUG_OUTPUT(f"client_first:{client_first_message}")
+            elif auth_method == 11:   # SCRAM first
+                client_nonce = self._client_nonce
+
+                # recv server first message
+                server = {
+                    kv[0]: kv[2:]
+                    for kv in data[4:].decode('utf-8').split(',')
+                }
+                # r: server nonce
+                # s: servre salt
+                # i: iteration count
+                assert server['r'][:len(client_nonce)] == client_nonce
+                DEBUG_OUTPUT(f"servre_first:{server}")
+
+                # send client final message
+                salted_pass = hashlib.pbkdf2_hmac(
+                    'sha256',
+                    self.password.encode('utf-8'),
+                    base64.standard_b64decode(server['s']),
+                    int(server['i']),
+                )
+
+                client_key = hmac.HMAC(
+                    salted_pass, b"Client Key", hashlib.sha256
+                ).digest()
+
+                client_first_message_bare = "n=,r=" + client_nonce
+                server_first_message = "r=%s,s=%s,i=%s" % (server['r'], server['s'], server['i'])
+                client_final_message_without_proof = "c=biws,r=" + server['r']
+                auth_msg = ','.join([
+                    client_first_message_bare,
+                    server_first_message,
+                    client_final_message_without_proof
+                ])
+
+                client_sig = hmac.HMAC(
+                    hashlib.sha256(client_key).digest(),
+                    auth_msg.encode('utf-8'),
+                    hashlib.sha256
+                ).digest()
+
+                proof = base64.standard_b64encode(
+                    b"".join([bytes([x ^ y]) for x, y in zip(client_key, client_sig)])
+                ).decode('utf-8')
+                client_final_message = client_final_message_without_proof + ",p=" + proof
+                DEBUG_OUTPUT(f"client_final:{client_final_message}")
+                self._send_data(
+                    b'p',
+                    client_final_message.encode('utf-8')
+                )
+            elif auth_method == 12:   # SCRAM final
+                self._client_nonce = None
             else:
-                dt = datetime.datetime.strptime(data, '%Y-%m-%d %H:%M:%S.%f')
-            return dt
-        elif oid in (PG_TYPE_TIMETZ, ):
-            s = _trim_timezone_offset(data)
-            if len(s) == 8:
-                t = datetime.datetime.strptime(s, '%H:%M:%S')
+                self._errobj = InterfaceError("Authentication method %d not supported." % (auth_method,))
+        elif code == 83:
+            k, v, _ = data.split(b'\x00')
+            DEBUG_OUTPUT("-> ParameterStatus('S'):{}:{}".format(k, v))
+            if k == b'server_encoding':
+                self.encoding = v.decode('ascii')
+            elif k == b'server_version':
+                version = v.decode('ascii').split('(')[0].split('.')
+                self.server_version = int(version[0]) * 10000
+                if len(version) > 0:
+                    try:
+                        self.server_version += int(version[1]) * 100
+                    except Exception:
+                        pass
+                if len(version) > 1:
+                    try:
+                        self.server_version += int(version[2])
+                    except Exception:
+                        pass
+            elif k == b'TimeZone':
+                self.tz_name = v.decode('ascii')
+                self.tzinfo = None
+            self._row_descriptions.clear()
+        elif code == 75:
+            DEBUG_OUTPUT("-> BackendKeyData('K')")
+            pass
+        elif code == 67:
+            if self._skip_begin_complete:
+                # the deferred BEGIN is not a result set
+                self._skip_begin_complete = False
+                DEBUG_OUTPUT("-> CommandComplete('C'):BEGIN")
+                return
+            if not obj:
+                DEBUG_OUTPUT("-> CommandComplete('C')")
+                return
+            command = data[:-1].decode('ascii')
+            DEBUG_OUTPUT("-> CommandComplete('C'):{}".format(command))
+            completed = getattr(obj, '_completed', None)
+            if completed:
+                # a statement without result set after the previous one
+                obj._next_result_set()
+            if command == 'SHOW':
+                obj._rowcount = 1
             else:
-                t = datetime.datetime.strptime(s, '%H:%M:%S.%f')
-            t = t.replace(tzinfo=self.tzinfo)
-            return t
-        elif oid in (PG_TYPE_TIMESTAMPTZ, ):
-            s = _trim_timezone_offset(data)
-            if len(s) == 19:
-                dt = datetime.datetime.strptime(s, '%Y-%m-%d %H:%M:%S')
+                for k in ('SELECT', 'UPDATE', 'DELETE', 'INSERT'):
+                    if command[:len(k)] == k:
+                        obj._rowcount = int(command.split(' ')[-1])
+                        break
+            if completed is not None:
+                obj._completed = True
+        elif code == 84:
+            if not obj:
+                return
+            if obj._completed:
+                obj._next_result_set()
+            self._check_types()
+            cached = self._row_descriptions.get(data)
+            if cached:
+                obj.description, obj._decoders = cached
+                obj._described()
+                return
+            count = _bytes_to_bint(data[0:2])
+            obj.description = [None] * count
+            formats = [0] * count
+            n = 2
+            idx = 0
+            for i in range(count):
+                name = data[n:n+data[n:].find(b'\x00')]
+                n += len(name) + 1
+                try:
+                    name = name.decode(self.encoding)
+                except UnicodeDecodeError:
+                    pass
+                type_code = _bytes_to_bint(data[n+6:n+10])
+                if type_code == PG_TYPE_VARCHAR:
+                    size = _bytes_to_bint(data[n+12:n+16]) - 4
+                    precision = -1
+                    scale = -1
+                elif type_code == PG_TYPE_NUMERIC:
+                    size = _bytes_to_bint(data[n+10:n+12])
+                    precision = _bytes_to_bint(data[n+12:n+14])
+                    scale = precision - _bytes_to_bint(data[n+14:n+16])
+                else:
+                    size = _bytes_to_bint(data[n+10:n+12])
+                    precision = -1
+                    scale = -1
+#                        table_oid = _bytes_to_bint(data[n:n+4])
+#                        table_pos = _bytes_to_bint(data[n+4:n+6])
+#                        size = _bytes_to_bint(data[n+10:n+12])
+#                        modifier = _bytes_to_bint(data[n+12:n+16])
+#                        format = _bytes_to_bint(data[n+16:n+18]),
+                formats[i] = _bytes_to_bint(data[n+16:n+18])
+                field = Description(name, type_code, None, size, precision, scale, None)
+                n += 18
+                obj.description[idx] = field
+                idx += 1
+            obj._decoders = self._row_decoders([d[1] for d in obj.description], formats)
+            if len(self._row_descriptions) >= _ROW_DECODERS_CACHE_SIZE:
+                self._row_descriptions.clear()
+            self._row_descriptions[data] = (obj.description, obj._decoders)
+            obj._described()
+            DEBUG_OUTPUT("-> RowDescription('T'):{}".format(obj.description))
+        elif code == 68:
+            if not obj:
+                DEBUG_OUTPUT("-> DataRow('D')")
+                return
+            n = 2
+            columns = obj._columns
+            if columns is not None:
+                for i, decoder in enumerate(obj._decoders):
+                    ln = struct.unpack_from('!i', data, n)[0]
+                    n += 4
+                    column = columns[i]
+                    if ln == -1:
+                        obj._nulls[i].append(len(column))
+                        column.append(None if type(column) is list else 0)
+                    else:
+                        column.append(decoder(bytes(data[n:n+ln])))
+                        n += ln
+                DEBUG_OUTPUT("-> DataRow('D')")
+                return
+            if obj._lazy_index is not None:
+                obj._rows.append(LazyRecord(bytes(data), obj._decoders, obj._lazy_index))
+                DEBUG_OUTPUT("-> DataRow('D')")
+                return
+            row = []
+            for decoder in obj._decoders:
+                ln = struct.unpack_from('!i', data, n)[0]
+                n += 4
+                if ln == -1:
+                    row.append(None)
+                else:
+                    row.append(decoder(bytes(data[n:n+ln])))
+                    n += ln
+            row = tuple(row)
+            if obj._make_row is not None:
+                row = obj._make_row(row)
+            obj._rows.append(row)
+            DEBUG_OUTPUT("-> DataRow('D'):{}".format(row))
+        elif code == 78:
+            DEBUG_OUTPUT("-> NoticeResponse('N')")
+            pass
+        elif code == 69 and not self._errobj:
+            err = data.split(b'\x00')
+            # http://www.postgresql.org/docs/9.3/static/errcodes-appendix.html
+            errcode = err[2][1:].decode('utf-8')
+            message = "{}:{}".format(self.query, err[3][1:].decode(self.encoding))
+            DEBUG_OUTPUT("-> ErrorResponse('E'):{}:{}".format(errcode, message))
+
+            if errcode[:2] == '0A':
+                self._errobj = NotSupportedError(message, errcode)
+            elif errcode[:2] in ('20', '21'):
+                self._errobj = ProgrammingError(message, errcode)
+            elif errcode[:2] in ('22', ):
+                self._errobj = DataError(message, errcode)
+            elif errcode[:2] == '23':
+                self._errobj = IntegrityError(message, errcode)
+            elif errcode[:2] in ('24', '25'):
+                self._errobj = InternalError(message, errcode)
+            elif errcode[:2] in ('26', '27', '28'):
+                self._errobj = OperationalError(message, errcode)
+            elif errcode[:2] in ('2B', '2D', '2F'):
+                self._errobj = InternalError(message, errcode)
+            elif errcode[:2] == '34':
+                self._errobj = OperationalError(message, errcode)
+            elif errcode[:2] in ('38', '39', '3B'):
+                self._errobj = InternalError(message, errcode)
+            elif errcode[:2] in ('3D', '3F'):
+                self._errobj = ProgrammingError(message, errcode)
+            elif errcode[:2] in ('40', '42', '44'):
+                self._errobj = ProgrammingError(message, errcode)
+            elif errcode[:1] == '5':
+                self._errobj = OperationalError(message, errcode)
+            elif errcode[:1] in 'F':
+                self._errobj = InternalError(message, errcode)
+            elif errcode[:1] in 'H':
+                self._errobj = OperationalError(message, errcode)
+            elif errcode[:1] in ('P', 'X'):
+                self._errobj = InternalError(message, errcode)
             else:
-                dt = datetime.datetime.strptime(s, '%Y-%m-%d %H:%M:%S.%f')
-            dt = dt.replace(tzinfo=self.tzinfo)
-            return dt
-        elif oid in (PG_TYPE_INTERVAL, ):
-            dt = re.split('days?', data)
-            if len(dt) < 2:
-                days = 0
-                t = dt[0]
+                self._errobj = DatabaseError(message, errcode)
+        elif code == 72:    # CopyOutputResponse('H')
+            if type(obj) is _CopyFile:
+                self._copy_out(obj.open('w'))
+        elif code == 116:   # ParameterDescription('t')
+            count = _bytes_to_bint(data[:2])
+            obj.param_oids = struct.unpack('!%dI' % (count, ), data[2:])
+            DEBUG_OUTPUT("-> ParameterDescription('t'):{}".format(obj.param_oids))
+        elif code in (49, 50, 51, 110):
+            # ParseComplete('1'), BindComplete('2'), CloseComplete('3'), NoData('n')
+            pass
+        elif code == 100:   # CopyData('d')
+            if obj is not None:
+                obj.write(bytes(data))
+        elif code == 99:    # CopyDataDone('c')
+            pass
+        elif code == 71:    # CopyInResponse('G')
+            if type(obj) is _CopyFile:
+                obj = obj.open('r')
+            self._copy_in(obj)
+        else:
+            DEBUG_OUTPUT("-> Unknown({}):{}{}".format(code, len(data), binascii.b2a_hex(data)))
+            pass
+
+    def _copy_in(self, f):
+        "Send the data read from the file object f by CopyData messages"
+        while True:
+            buf = f.read(8192)
+            if not buf:
+                break
+            # send CopyData
+            self._write(b''.join([b'd', _bint_to_bytes(len(buf) + 4), buf]))
+        self._write(self._copy_done_message())
+
+    def _copy_done_message(self):
+        # Sync after CopyDone of a simple query would be answered by another ReadyForQuery
+        if self._extended_copy:
+            return _COPY_DONE_MESSAGE + _SYNC_MESSAGE
+        return _COPY_DONE_MESSAGE
+
+    def _copy_out(self, f):
+        "Start COPY TO STDOUT to the file f, the CopyData are written by the 'd' handler"
+        pass
+
+    def _encode_parameter(self, v):
+        "Encode a parameter value to text format for Bind message"
+        if isinstance(v, enum.Enum):
+            v = v.value
+        if v is None:
+            return None
+        t = type(v)
+        if t in (bytes, bytearray, memoryview):
+            return b'\\x' + binascii.b2a_hex(v)
+        if t == bool:
+            s = 't' if v else 'f'
+        elif t == time.struct_time:
+            s = u'%04d-%02d-%02d %02d:%02d:%02d' % (
+                v.tm_year, v.tm_mon, v.tm_mday, v.tm_hour, v.tm_min, v.tm_sec)
+        elif t in (datetime.datetime, datetime.date, datetime.time):
+            s = v.isoformat()
+        elif t == datetime.timedelta:
+            s = '%d days %d seconds %d microseconds' % (v.days, v.seconds, v.microseconds)
+        elif t == list or t == tuple or t == array.array:
+            s = self._encode_array(v)
+        else:
+            s = str(v)
+        return s.encode(self.encoding)
+
+    def _encode_array(self, v):
+        elements = []
+        for e in v:
+            if e is None:
+                elements.append('NULL')
+            elif isinstance(e, (list, tuple, array.array)):
+                elements.append(self._encode_array(e))
             else:
-                days = dt[0]
-                t = dt[1]
-            if t:
-                hours, minites, seconds = t.split(':')
-                if seconds.find('.') != -1:
-                    seconds, microseconds = seconds.split('.')
-                    microseconds += "0" * (6 - len(microseconds))
+                s = self._encode_parameter(e).decode(self.encoding)
+                elements.append('"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"')
+        return '{' + ','.join(elements) + '}'
+
+    def _copy_target(self, table, columns, schema_name):
+        "Return quoted table name and column names for COPY, or '*' for all columns"
+        if schema_name is not None:
+            table = _quote_identifier(schema_name) + '.' + _quote_identifier(table)
+        else:
+            table = _quote_identifier(table)
+        if columns is None:
+            return table, '*'
+        return table, ','.join([_quote_identifier(c) for c in columns])
+
+    def _describe_message(self, stmt):
+        "Return messages to describe stmt without executing it"
+        bname = stmt.name.encode('ascii') + b'\x00'
+        return b''.join([
+            _message(b'P', bname + stmt.query.encode(self.encoding) + b'\x00\x00\x00'),
+            _message(b'D', b'S' + bname),
+            _SYNC_MESSAGE,
+        ])
+
+    def _copy_text_encoder(self, oid):
+        "Return a function to encode a value of oid, whose binary format is the same as text format, or None"
+        info = self._types.types.get(oid)
+        if info is not None and info.kind == 'd':
+            return self._copy_text_encoder(info.base)
+        if oid in (PG_TYPE_JSON, PG_TYPE_JSONBOID):
+            version = b'\x01' if oid == PG_TYPE_JSONBOID else b''
+            return lambda v: version + (v if isinstance(v, str) else json.dumps(v)).encode(self.encoding)
+        if oid in _COPY_TEXT_BINARY_TYPES or (info is not None and info.kind == 'e'):
+            encoding = self.encoding
+            return lambda v: v.encode(encoding) if type(v) is str else self._encode_parameter(v)
+        return None
+
+    def _copy_row_encoder(self, description):
+        "Return a function to encode a row in binary COPY format, or None if a column can not be encoded"
+        count = len(description)
+        fields = []
+        formats = []
+        for d in description:
+            encoder = self._binary_encoder(d[1])
+            if encoder is _BINARY_ENCODERS.get(d[1]) and d[1] in _COPY_FIXED_FORMATS:
+                f = _COPY_FIXED_FORMATS[d[1]]
+                formats.append(f)
+                if f == '?':
+                    # struct packs any value as '?', _encode_bool takes only bool
+                    fields.append(_copy_field_encoder(encoder))
                 else:
-                    microseconds = 0
+                    fields.append(functools.partial(struct.Struct('!i' + f).pack, struct.calcsize(f)))
+                continue
+            if encoder is None:
+                encoder = self._copy_text_encoder(d[1])
+                if encoder is None:
+                    return None
+            fields.append(_copy_field_encoder(encoder))
+        header = struct.pack('!h', count)
+        row_struct = None
+        if len(formats) == count:
+            # rows of fixed size types without NULL are packed at once
+            row_struct = struct.Struct('!h' + ''.join(['i' + f for f in formats]))
+            bools = [i for i, f in enumerate(formats) if f == '?']
+            args = [count]
+            for f in formats:
+                args += [struct.calcsize(f), None]
+
+        def _encode_row(row):
+            if len(row) != count:
+                raise ProgrammingError("Record has %d values for %d columns" % (len(row), count))
+            if row_struct is not None and None not in row and all([type(row[i]) is bool for i in bools]):
+                args[2::2] = row
+                try:
+                    return row_struct.pack(*args)
+                except struct.error:
+                    pass
+            parts = [header]
+            try:
+                for v, encode in zip(row, fields):
+                    parts.append(_COPY_NULL_FIELD if v is None else encode(v))
+            except (TypeError, ValueError, struct.error) as e:
+                raise DataError("Can't encode %r: %s" % (v, e))
+            return b''.join(parts)
+        return _encode_row
+
+    def _copy_text_row(self, row):
+        "Encode a row in text COPY format"
+        values = []
+        for v in row:
+            t = type(v)
+            if t == int or t == float:
+                values.append(str(v).encode('ascii'))
+            elif t == str:
+                values.append(_escape_copy_text(v.encode(self.encoding)))
+            elif t == dict:
+                values.append(_escape_copy_text(json.dumps(v).encode(self.encoding)))
+            else:
+                b = self._encode_parameter(v)
+                values.append(b'\\N' if b is None else _escape_copy_text(b))
+        return b'\t'.join(values) + b'\n'
+
+    def _copy_data_messages(self, records, encode_row=None, first=True, last=True):
+        """Generate CopyData messages of the records, in binary format with encode_row or text format.
+        The header and the trailer of binary format are sent with the first and the last records"""
+        binary = encode_row is not None
+        if binary and first:
+            parts = [_COPY_BINARY_HEADER]
+            size = len(_COPY_BINARY_HEADER)
+        else:
+            parts = []
+            size = 0
+        if not binary:
+            encode_row = self._copy_text_row
+        for row in records:
+            b = encode_row(row)
+            parts.append(b)
+            size += len(b)
+            if size >= _COPY_CHUNK_SIZE:
+                yield _copy_data_message(parts, size)
+                parts = []
+                size = 0
+        if binary and last:
+            parts.append(_COPY_BINARY_TRAILER)
+            size += len(_COPY_BINARY_TRAILER)
+        if parts:
+            yield _copy_data_message(parts, size)
+
+    def _copy_text_decoder(self, oid):
+        "Return a function to decode a value of oid, whose binary format is the same as text format, or None"
+        info = self._types.types.get(oid)
+        if info is not None and info.kind == 'd':
+            return self._copy_text_decoder(info.base)
+        if oid == PG_TYPE_JSONBOID:
+            decoder = self._column_decoder(oid, 0)
+            return lambda b: decoder(b[1:])     # without the version byte
+        if oid == PG_TYPE_JSON or oid in _COPY_TEXT_BINARY_TYPES or (info is not None and info.kind == 'e'):
+            return self._column_decoder(oid, 0)
+        return None
+
+    def _copy_row_decoders(self, oids):
+        "Return a tuple of the column decoders of binary COPY format, or None if a column can not be decoded"
+        decoders = []
+        for oid in oids:
+            decoder = self._binary_decoder(oid) or self._copy_text_decoder(oid)
+            if decoder is None:
+                return None
+            decoders.append(decoder)
+        return tuple(decoders)
+
+    def _copy_out_described(self, obj, description):
+        "Set the description and the decoders of COPY TO STDOUT to obj, return the COPY query"
+        oids = [d[1] for d in description]
+        decoders = self._copy_row_decoders(oids) if obj.format == 'binary' else None
+        obj._copy_binary = obj._copy_header = decoders is not None
+        obj.description = description
+        obj._decoders = decoders or self._row_decoders(oids)
+        obj._described()
+        obj._rowcount = 0
+        if obj._copy_binary:
+            return 'COPY (%s) TO STDOUT (FORMAT binary)' % (obj.query, )
+        return 'COPY (%s) TO STDOUT' % (obj.query, )
+
+    def _copy_row(self, obj, data):
+        "Decode a CopyData of COPY TO STDOUT into obj, the server sends a row in a CopyData"
+        if obj._copy_binary:
+            if obj._copy_header:
+                # the header is sent with the first row
+                obj._copy_header = False
+                data = data[19 + struct.unpack_from('!i', data, 15)[0]:]
+                if not len(data):
+                    return
+            if data[0] == 255:      # trailer
+                return
+        else:
+            data = _copy_text_data_row(data)
+        self._process_message(68, data, obj)
+        obj._rowcount += 1
+
+    def _lookup_statement(self, query, named=True):
+        """Return a cached statement, or a new statement and the messages to prepare it.
+        The new statement is the unnamed one, which is not cached, if named is false"""
+        self._check_types()
+        stmt = self._statements.get(query)
+        if stmt is not None:
+            self._statements.move_to_end(query)
+            return stmt, None
+        sql, names = _convert_paramstyle(query)
+        if named and self.statement_cache_size > 0:
+            self._statement_id += 1
+            name = '_minipg_%d' % (self._statement_id, )
+        else:
+            name = ''
+        stmt = _Statement(name, sql, names)
+        if not name and not (self.binary_parameters or self.binary_results):
+            # unnamed statement is parsed and executed in a round trip
+            return stmt, None
+        bname = name.encode('ascii') + b'\x00'
+        return stmt, b''.join(self._pop_closing_statements() + [
+            _message(b'P', bname + sql.encode(self.encoding) + b'\x00\x00\x00'),
+            _message(b'D', b'S' + bname),
+            _SYNC_MESSAGE,
+        ])
+
+    def _set_result_formats(self, stmt):
+        "Set result format codes and column decoders of the described statement"
+        stmt._formats = None
+        if self.binary_results:
+            formats = [0 if self._binary_decoder(d[1]) is None else 1 for d in stmt.description]
+            if 1 in formats:
+                stmt._formats = tuple(formats)
+        stmt._decoders = self._row_decoders([d[1] for d in stmt.description], stmt._formats)
+
+    def _cache_statement(self, query, stmt):
+        self._set_result_formats(stmt)
+        if not stmt.name:
+            return
+        while len(self._statements) >= self.statement_cache_size:
+            _, old = self._statements.popitem(last=False)
+            self._closing_statements.append(old.name)
+        self._statements[query] = stmt
+
+    def _invalidate_statement(self, query, err):
+        "Forget the cached statement if err tells it can not be used anymore"
+        if query not in self._statements:
+            return False
+        if not (
+            (err.code == '0A000' and 'cached plan must not change result type' in err.message) or
+            err.code == '26000'     # invalid_sql_statement_name
+        ):
+            return False
+        stmt = self._statements.pop(query)
+        self._closing_statements.append(stmt.name)
+        return True
+
+    def _pop_closing_statements(self):
+        messages = [
+            _message(b'C', b'S' + name.encode('ascii') + b'\x00')
+            for name in self._closing_statements
+        ]
+        self._closing_statements = []
+        return messages
+
+    def _bind_parameters(self, stmt, args):
+        "Return parameter format codes and values part of Bind message"
+        if isinstance(args, dict):
+            args = [args[name] for name in stmt.names]
+        elif not isinstance(args, (tuple, list)):
+            args = (args, )
+        oids = stmt.param_oids
+        formats = []
+        params = [len(args).to_bytes(2, byteorder='big')]
+        for i, v in enumerate(args):
+            if isinstance(v, enum.Enum):
+                v = v.value
+            b = None
+            if oids and v is not None and (self.binary_parameters or oids[i] == PG_TYPE_BYTEA):
+                encoder = self._binary_encoder(oids[i])
+                if encoder:
+                    try:
+                        b = encoder(v)
+                    except (TypeError, ValueError, struct.error):
+                        pass
+            formats.append(0 if b is None else 1)
+            if b is None:
+                b = self._encode_parameter(v)
+            if b is None:
+                params.append(b'\xff\xff\xff\xff')
             else:
-                hours = minites = seconds = microseconds = 0
-            return datetime.timedelta(
-                microseconds=int(microseconds),
-                seconds=int(seconds),
-                minutes=int(minites),
-                hours=int(hours),
-                days=int(days),
-            )
-        elif oid in (PG_TYPE_BYTEA, ):
-            assert data[:2] == u'\\x'
-            hex_str = data[2:]
-            ia = [int(hex_str[i:i+2], 16) for i in range(0, len(hex_str), 2)]
-            return bytes(ia)
-        elif oid in (PG_TYPE_CHAR, PG_TYPE_TEXT, PG_TYPE_BPCHAR, PG_TYPE_VARCHAR, PG_TYPE_NAME, PG_TYPE_JSONBOID, PG_TYPE_XML):
-            return data
-        elif oid in (PG_TYPE_UUID, ):
-            return uuid.UUID(data)
-        elif oid in (PG_TYPE_UNKNOWN, PG_TYPE_PGNODETREE, PG_TYPE_TSVECTOR, PG_TYPE_INET):
-            DEBUG_OUTPUT('NO DECODE type:%d' % (oid, ))
-            return data
-        elif oid in (PG_TYPE_BOOLARRAY, ):
-            return [b == 't' for b in data[1:-1].split(',')]
-        elif oid in (PG_TYPE_INT2ARRAY, PG_TYPE_INT4ARRAY):
-            return [int(i) for i in data[1:-1].split(',')]
-        elif oid in (PG_TYPE_NAMEARRAY, PG_TYPE_TEXTARRAY, PG_TYPE_VARCHARARRAY):
-            return [s for s in data[1:-1].split(',')]
-        elif oid in (PG_TYPE_FLOAT4ARRAY, ):
-            return [float(f) for f in data[1:-1].split(',')]
-        elif oid in (PG_TYPE_INT2VECTOR, ):
-            return [int(i) for i in data.split(' ')]
-        elif oid in (PG_TYPE_POINT, ):
-            return _parse_point(data)
-        elif oid in (PG_TYPE_CIRCLE, ):
-            p = data[1:data.find(')')+1]
-            r = data[len(p)+2:-1]
-            return (_parse_point(p), float(r))
-        elif oid in (PG_TYPE_LSEG, PG_TYPE_PATH, PG_TYPE_BOX, PG_TYPE_POLYGON, PG_TYPE_LINE):
-            return eval(data)
-        elif oid in (PG_TYPE_JSON, ):
-            return json.loads(data)
-        elif oid in (PG_TYPE_VOID, ):
-            return None
+                params.append(_bint_to_bytes(len(b)))
+                params.append(b)
+        if 1 in formats:
+            formats = [struct.pack('!h%dh' % (len(formats), ), len(formats), *formats)]
         else:
-            if DEBUG:
-                raise ValueError('Unknown oid=' + str(oid) + ":" + data)
-        return data
+            formats = [b'\x00\x00']
+        return formats + params
 
-    def escape_parameter(self, v):
+    def _bind(self, stmt, args):
+        "Return Bind message as a list of bytes-like objects, not to copy large parameters"
+        if stmt._formats:
+            formats = struct.pack('!h%dh' % (len(stmt._formats), ), len(stmt._formats), *stmt._formats)
+        else:
+            formats = b'\x00\x00'
+        parts = [b'\x00', stmt.name.encode('ascii'), b'\x00'] + self._bind_parameters(stmt, args) + [formats]
+        return [b'B', _bint_to_bytes(sum([len(p) for p in parts]) + 4)] + parts
+
+    def _bind_message(self, stmt, args):
+        "Return Bind and Execute messages"
+        return b''.join(self._bind(stmt, args) + [_EXECUTE_MESSAGE])
+
+    def _begin_query(self):
+        "Return the deferred BEGIN to put before the next simple query"
+        if not self._begin_pending:
+            return b''
+        self._begin_pending = False
+        return b'BEGIN;'
+
+    def _begin_message(self):
+        "Return the deferred BEGIN messages to send before the next extended query messages"
+        if not self._begin_pending:
+            return b''
+        self._begin_pending = False
+        return _BEGIN_MESSAGE
+
+    def _first_bind_message(self, stmt, args, execute=_EXECUTE_MESSAGE):
+        "Return Bind and execute messages, with Parse and Describe for not described statement"
+        messages = self._pop_closing_statements()
+        if stmt.param_oids is None:
+            messages.append(_message(b'P', b''.join([
+                stmt.name.encode('ascii'), b'\x00', stmt.query.encode(self.encoding), b'\x00\x00\x00'
+            ])))
+            messages += self._bind(stmt, args)
+            # Describe portal between Bind and Execute
+            messages.append(_message(b'D', b'P\x00'))
+        else:
+            messages += self._bind(stmt, args)
+        messages.append(execute)
+        return b''.join(messages)
+
+    def _stream_message(self, stmt, args, n):
+        "Return messages to execute stmt in the unnamed portal, which is suspended after n rows"
+        return self._first_bind_message(stmt, args, _execute_message(n) + _FLUSH_MESSAGE)
+
+    def _process_buffered_messages(self, obj):
+        "Process the whole messages in the receive buffer. Return total rowcount of them"
+        buf = self._rbuf
+        rowcount = 0
+        m = buf.message()
+        while m is not None:
+            code, data = m
+            self._process_message(code, data, obj)
+            if code == 67 and obj:
+                rowcount += obj._rowcount
+                obj._rowcount = 0
+            m = buf.message()
+        return rowcount
+
+    def _copy_error_received(self):
+        """Process the messages received while CopyData are being sent.
+        Return True if an ErrorResponse is received, which is left in the receive buffer"""
+        buf = self._rbuf
+        while buf.peek() not in (None, 69):
+            m = buf.message()
+            if m is None:
+                break
+            self._process_message(m[0], m[1], None)
+        return buf.peek() == 69
+
+    @property
+    def extended_query(self):
+        "Whether queries with parameters are sent with the extended query protocol"
+        return self.prepare or self.binary_parameters or self.binary_results
+
+    def _sends_parameters(self, args):
+        """Whether args are sent separately from the query with the extended query protocol.
+        They are escaped into the query if a value has a type in self.encoders"""
+        if args is None or not self.extended_query:
+            return False
+        if self.encoders:
+            if isinstance(args, dict):
+                args = args.values()
+            elif not isinstance(args, (tuple, list)):
+                args = (args, )
+            return not any([self._encoded(v) for v in args])
+        return True
+
+    def _encoded(self, v):
+        "Whether v, or an element of it, is escaped by a function of self.encoders"
         if isinstance(v, enum.Enum):
             v = v.value
-        t = type(v)
-        func = self.encoders.get(t)
-        if func:
-            return func(self, v)
-        if v is None:
-            return 'NULL'
-        elif t == str:
-            return u"'" + v.replace(u"'", u"''") + u"'"
-        elif t == bytearray or t == bytes:        # binary
-            return "'" + ''.join(['\\%03o' % (c, ) for c in v]) + "'::bytea"
-        elif t == bool:
-            return u"TRUE" if v else u"FALSE"
-        elif t == time.struct_time:
-            return u'%04d-%02d-%02d %02d:%02d:%02d' % (
-                v.tm_year, v.tm_mon, v.tm_mday, v.tm_hour, v.tm_min, v.tm_sec)
-        elif t == datetime.datetime:
-            if v.tzinfo:
-                return "timestamp with time zone '" + v.isoformat() + "'"
-            else:
-                return "timestamp '" + v.isoformat() + "'"
-        elif t == datetime.date:
-            return "date '" + str(v) + "'"
-        elif t == datetime.timedelta:
-            return u"interval '" + str(v) + "'"
-        elif t == int or t == float:
-            return str(v)
-        elif t == decimal.Decimal:
-            return "decimal '" + str(v) + "'"
-        elif t == list or t == tuple:
-            return u'ARRAY[' + u','.join([self.escape_parameter(e) for e in v]) + u']'
-        else:
-            return "'" + str(v) + "'"
+        if type(v) in self.encoders:
+            return True
+        if isinstance(v, (list, tuple)):
+            return any([self._encoded(e) for e in v])
+        return False
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, autocommit):
+        """In autocommit mode, no transaction block is opened and the server commits each query.
+        A transaction opened already or by begin() continues until commit() or rollback()"""
+        self._autocommit = autocommit
+        if self._trans_status == b'I':
+            self._begin_pending = not autocommit
 
     def set_autocommit(self, autocommit):
         self.autocommit = autocommit
@@ -623,8 +3373,13 @@ class BaseConnection(object):
 
 
 class Connection(BaseConnection):
-    def __init__(self, user, password, database, host, port, timeout, ssl_context):
-        super().__init__(user, password, database, host, port, timeout, ssl_context)
+    def __init__(self, user, password, database, host, port, timeout, ssl_context,
+                 prepare=False, statement_cache_size=100, binary_parameters=False, binary_results=False,
+                 flat_arrays=False):
+        super().__init__(
+            user, password, database, host, port, timeout, ssl_context,
+            prepare, statement_cache_size, binary_parameters, binary_results, flat_arrays
+        )
 
     def __enter__(self):
         return self
@@ -632,311 +3387,60 @@ class Connection(BaseConnection):
     def __exit__(self, exc, value, traceback):
         self.close()
 
-    def _send_data(self, message, data):
-        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
-        self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data]))
-
-    def _send_message(self, message, data):
-        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
-        self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data, b'H\x00\x00\x00\x04']))
-
     def _process_messages(self, obj):
-        errobj = None
+        self._errobj = None
         while True:
             try:
-                code = ord(self._read(1))
+                code, data = self._read_message()
             except OperationalError:
                 # something error occured
                 break
-            ln = _bytes_to_bint(self._read(4)) - 4
-            data = self._read(ln)
+            self._process_message(code, data, obj)
             if code == 90:
-                self._trans_status = data
-                DEBUG_OUTPUT("-> ReadyForQuery('Z'):{}".format(data))
                 break
-            elif code == 82:
-                auth_method = _bytes_to_bint(data[:4])
-                DEBUG_OUTPUT("-> Authentication('R'):{}".format(auth_method))
-                if auth_method == 0:      # trust
-                    pass
-                elif auth_method == 5:    # md5
-                    salt = data[4:]
-                    hash1 = hashlib.md5(self.password.encode('ascii') + self.user.encode("ascii")).hexdigest().encode("ascii")
-                    hash2 = hashlib.md5(hash1+salt).hexdigest().encode("ascii")
-                    self._send_data(b'p', b''.join([b'md5', hash2, b'\x00']))
-
-                    # accept
-                    code = ord(self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(self._read(4)) - 4
-                    data = self._read(ln)
-                    assert _bytes_to_bint(data[:4]) == 0
-                elif auth_method == 10:   # SASL
-                    assert b'SCRAM-SHA-256\x00' in data
-                    printable = string.ascii_letters + string.digits + '+/'
-                    client_nonce = ''.join(
-                        printable[random.randrange(0, len(printable))]
-                        for i in range(24)
-                    )
-
-                    # send client first message
-                    client_first_message = 'n,,n=,r=' + client_nonce
-                    self._send_data(b'p', b''.join([
-                        b'SCRAM-SHA-256\x00',
-                        _bint_to_bytes(len(client_first_message)),
-                        client_first_message.encode('utf-8')
-                    ]))
-                    DEBUG_OUTPUT(f"client_first:{client_first_message}")
-
-                    code = ord(self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(self._read(4)) - 4
-                    data = self._read(ln)
-                    _bytes_to_bint(data[:4]) == 11      # SCRAM first
-
-                    # recv server first message
-                    server = {
-                        kv[0]: kv[2:]
-                        for kv in data[4:].decode('utf-8').split(',')
-                    }
-                    # r: server nonce
-                    # s: servre salt
-                    # i: iteration count
-                    assert server['r'][:len(client_nonce)] == client_nonce
-                    DEBUG_OUTPUT(f"servre_first:{server}")
-
-                    # send client final message
-                    salted_pass = hashlib.pbkdf2_hmac(
-                        'sha256',
-                        self.password.encode('utf-8'),
-                        base64.standard_b64decode(server['s']),
-                        int(server['i']),
-                    )
-
-                    client_key = hmac.HMAC(
-                        salted_pass, b"Client Key", hashlib.sha256
-                    ).digest()
-
-                    client_first_message_bare = "n=,r=" + client_nonce
-                    server_first_message = "r=%s,s=%s,i=%s" % (server['r'], server['s'], server['i'])
-                    client_final_message_without_proof = "c=biws,r=" + server['r']
-                    auth_msg = ','.join([
-                        client_first_message_bare,
-                        server_first_message,
-                        client_final_message_without_proof
-                    ])
-
-                    client_sig = hmac.HMAC(
-                        hashlib.sha256(client_key).digest(),
-                        auth_msg.encode('utf-8'),
-                        hashlib.sha256
-                    ).digest()
-
-                    proof = base64.standard_b64encode(
-                        b"".join([bytes([x ^ y]) for x, y in zip(client_key, client_sig)])
-                    ).decode('utf-8')
-                    client_final_message = client_final_message_without_proof + ",p=" + proof
-                    DEBUG_OUTPUT(f"client_final:{client_final_message}")
-                    self._send_data(
-                        b'p',
-                        client_final_message.encode('utf-8')
-                    )
-
-                    code = ord(self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(self._read(4)) - 4
-                    data = self._read(ln)
-                    _bytes_to_bint(data[:4]) == 12      # SCRAM final
-
-                    # accept
-                    code = ord(self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(self._read(4)) - 4
-                    data = self._read(ln)
-                    assert _bytes_to_bint(data[:4]) == 0
-                else:
-                    errobj = InterfaceError("Authentication method %d not supported." % (auth_method,))
-            elif code == 83:
-                k, v, _ = data.split(b'\x00')
-                DEBUG_OUTPUT("-> ParameterStatus('S'):{}:{}".format(k, v))
-                if k == b'server_encoding':
-                    self.encoding = v.decode('ascii')
-                elif k == b'server_version':
-                    version = v.decode('ascii').split('(')[0].split('.')
-                    self.server_version = int(version[0]) * 10000
-                    if len(version) > 0:
-                        try:
-                            self.server_version += int(version[1]) * 100
-                        except Exception:
-                            pass
-                    if len(version) > 1:
-                        try:
-                            self.server_version += int(version[2])
-                        except Exception:
-                            pass
-                elif k == b'TimeZone':
-                    self.tz_name = v.decode('ascii')
-                    self.tzinfo = None
-            elif code == 75:
-                DEBUG_OUTPUT("-> BackendKeyData('K')")
-                pass
-            elif code == 67:
-                if not obj:
-                    DEBUG_OUTPUT("-> CommandComplete('C')")
-                    continue
-                command = data[:-1].decode('ascii')
-                DEBUG_OUTPUT("-> CommandComplete('C'):{}".format(command))
-                if command == 'SHOW':
-                    obj._rowcount = 1
-                else:
-                    for k in ('SELECT', 'UPDATE', 'DELETE', 'INSERT'):
-                        if command[:len(k)] == k:
-                            obj._rowcount = int(command.split(' ')[-1])
-                            break
-            elif code == 84:
-                if not obj:
-                    continue
-                count = _bytes_to_bint(data[0:2])
-                obj.description = [None] * count
-                n = 2
-                idx = 0
-                for i in range(count):
-                    name = data[n:n+data[n:].find(b'\x00')]
-                    n += len(name) + 1
-                    try:
-                        name = name.decode(self.encoding)
-                    except UnicodeDecodeError:
-                        pass
-                    type_code = _bytes_to_bint(data[n+6:n+10])
-                    if type_code == PG_TYPE_VARCHAR:
-                        size = _bytes_to_bint(data[n+12:n+16]) - 4
-                        precision = -1
-                        scale = -1
-                    elif type_code == PG_TYPE_NUMERIC:
-                        size = _bytes_to_bint(data[n+10:n+12])
-                        precision = _bytes_to_bint(data[n+12:n+14])
-                        scale = precision - _bytes_to_bint(data[n+14:n+16])
-                    else:
-                        size = _bytes_to_bint(data[n+10:n+12])
-                        precision = -1
-                        scale = -1
-#                        table_oid = _bytes_to_bint(data[n:n+4])
-#                        table_pos = _bytes_to_bint(data[n+4:n+6])
-#                        size = _bytes_to_bint(data[n+10:n+12])
-#                        modifier = _bytes_to_bint(data[n+12:n+16])
-#                        format = _bytes_to_bint(data[n+16:n+18]),
-                    field = Description(name, type_code, None, size, precision, scale, None)
-                    n += 18
-                    obj.description[idx] = field
-                    idx += 1
-                DEBUG_OUTPUT("-> RowDescription('T'):{}".format(obj.description))
-            elif code == 68:
-                if not obj:
-                    DEBUG_OUTPUT("-> DataRow('D')")
-                    continue
-                n = 2
-                row = []
-                while n < len(data):
-                    if data[n:n+4] == b'\xff\xff\xff\xff':
-                        row.append(None)
-                        n += 4
-                    else:
-                        ln = _bytes_to_bint(data[n:n+4])
-                        n += 4
-                        row.append(data[n:n+ln])
-                        n += ln
-                for i in range(len(row)):
-                    row[i] = self._decode_column(row[i], obj.description[i][1])
-                obj._rows.append(tuple(row))
-                DEBUG_OUTPUT("-> DataRow('D'):{}".format(tuple(row)))
-            elif code == 78:
-                DEBUG_OUTPUT("-> NoticeResponse('N')")
-                pass
-            elif code == 69 and not errobj:
-                err = data.split(b'\x00')
-                # http://www.postgresql.org/docs/9.3/static/errcodes-appendix.html
-                errcode = err[2][1:].decode('utf-8')
-                message = "{}:{}".format(self.query, err[3][1:].decode(self.encoding))
-                DEBUG_OUTPUT("-> ErrorResponse('E'):{}:{}".format(errcode, message))
-
-                if errcode[:2] == '0A':
-                    errobj = NotSupportedError(message, errcode)
-                elif errcode[:2] in ('20', '21'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:2] in ('22', ):
-                    errobj = DataError(message, errcode)
-                elif errcode[:2] == '23':
-                    errobj = IntegrityError(message, errcode)
-                elif errcode[:2] in ('24', '25'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] in ('26', '27', '28'):
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:2] in ('2B', '2D', '2F'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] == '34':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:2] in ('38', '39', '3B'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] in ('3D', '3F'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:2] in ('40', '42', '44'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:1] == '5':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:1] in 'F':
-                    errobj = InternalError(message, errcode)
-                elif errcode[:1] in 'H':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:1] in ('P', 'X'):
-                    errobj = InternalError(message, errcode)
-                else:
-                    errobj = DatabaseError(message, errcode)
-            elif code == 72:    # CopyOutputResponse('H')
-                pass
-            elif code == 100:   # CopyData('d')
-                obj.write(data)
-            elif code == 99:    # CopyDataDone('c')
-                pass
-            elif code == 71:    # CopyInResponse('G')
-                while True:
-                    buf = obj.read(8192)
-                    if not buf:
-                        break
-                    # send CopyData
-                    self._write(b'd' + _bint_to_bytes(len(buf) + 4))
-                    self._write(buf)
-                # send CopyDone and Sync
-                self._write(b'c\x00\x00\x00\x04S\x00\x00\x00\x04')
-            else:
-                DEBUG_OUTPUT("-> Unknown({}):{}{}".format(code, ln, binascii.b2a_hex(data)))
-                pass
-        return errobj
+        return self._errobj
 
     def process_messages(self, obj):
         err = self._process_messages(obj)
         if err:
             raise err
 
+    def _recv(self, ln):
+        # receive until ln bytes are buffered
+        buf = self._rbuf
+        while len(buf) < ln:
+            n = self.sock.recv_into(buf.get_buffer(ln))
+            if not n:
+                raise InterfaceError("Can't recv packets", "08003")
+            buf.advance(n)
+
     def _read(self, ln):
         if not self.sock:
             raise InterfaceError("Lost connection", "08003")
-        r = b''
-        while len(r) < ln:
-            b = self.sock.recv(ln-len(r))
-            if not b:
-                raise InterfaceError("Can't recv packets", "08003")
-            r += b
-        return r
+        self._recv(ln)
+        return self._rbuf.read(ln)
+
+    def _read_message(self):
+        if not self.sock:
+            raise InterfaceError("Lost connection", "08003")
+        buf = self._rbuf
+        m = buf.message()
+        while m is None:
+            self._recv(buf.needed())
+            m = buf.message()
+        return m
 
     def _write(self, b):
         if not self.sock:
             raise InterfaceError("Lost connection", "08003")
-        n = 0
-        while (n < len(b)):
-            n += self.sock.send(b[n:])
+        self.sock.sendall(b)
 
     def _open(self):
         self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._rbuf = _ReadBuffer()
+        self._statements.clear()
+        self._stream = None
+        self._closing_statements = []
         DEBUG_OUTPUT("Connection._open() socket %s:%d" % (self.host, self.port))
         if self.ssl_context:
             self._write(_bint_to_bytes(8))
@@ -955,19 +3459,391 @@ class Connection(BaseConnection):
         self._write(_bint_to_bytes(len(v) + 4) + v)
         self.process_messages(None)
 
-        self._begin()
+    def cursor(self, cursor=None, name=None, scrollable=None, withhold=False, row_factory=None, lazy=False):
+        if name is not None:
+            cur = (cursor or ServerCursor)(self, name, scrollable, withhold)
+        else:
+            cur = (cursor or Cursor)(self)
+        cur.row_factory = row_factory
+        cur.lazy = lazy
+        return cur
+
+    def pipeline(self):
+        """Return a context manager to queue statements, which are sent at once.
+        The connection is not used for other queries until the end of the context"""
+        return Pipeline(self)
+
+    def _execute_prepared(self, query, args, obj, retry=True):
+        begins = self._begin_pending     # the transaction is begun by this statement
+        stmt, message = self._lookup_statement(query)
+        if message:
+            self._write(self._begin_message() + message)
+            self.process_messages(stmt)
+            self._cache_statement(query, stmt)
+        if obj and stmt.param_oids is not None:
+            obj.description = stmt.description
+            obj._decoders = stmt._decoders
+            obj._described()
+        self._write(self._begin_message() + self._first_bind_message(stmt, args, _EXECUTE_MESSAGE + _SYNC_MESSAGE))
+        err = self._process_messages(obj)
+        if err:
+            if retry and self._invalidate_statement(query, err) and (self._trans_status == b'I' or begins):
+                if self._trans_status != b'I':
+                    # nothing but this statement is rolled back
+                    self._rollback()
+                self._execute_prepared(query, args, obj, False)
+                return
+            raise err
+
+    def execute(self, query, obj=None, args=None):
+        if isinstance(obj, (str, bytes, int, os.PathLike)):
+            # COPY from or to the file of a path or a file descriptor
+            f = _CopyFile(obj)
+            try:
+                self.execute(query, f, args)
+            finally:
+                f.close()
+            return
+        self._end_stream()
+        self.query = query
+        self._extended_copy = args is not None
+        # obj is a cursor, or a file object for COPY
+        cursor = obj if isinstance(obj, BaseCursor) else None
+        if cursor:
+            cursor._nextsets.clear()
+        if args is None:
+            begin = self._begin_query()
+            if cursor:
+                # receive the result sets of the statements in the query separately
+                cursor._completed = False
+                self._skip_begin_complete = bool(begin)
+            self._send_message(b'Q', begin + query.encode(self.encoding) + b'\x00')
+            try:
+                self.process_messages(obj)
+            finally:
+                if cursor:
+                    cursor._end_result_sets()
+        else:
+            self._execute_prepared(query, args, obj)
+        if self._unknown_oids:
+            self._load_types(cursor)
+
+    def _load_types(self, *objs):
+        "Look up pg_type for the types seen first, and decode their columns in objs"
+        if self._trans_status == b'E':
+            return
+        oids = loaded = self._unknown_oids
+        self._unknown_oids = set()
+        while oids:
+            rows = self._query_types(oids)
+            for oid in oids:
+                self._types.types.setdefault(oid, _TypeInfo(oid))
+            oids = self._store_types(rows)
+            loaded |= oids
+        for obj in objs or (None, ):
+            self._types_loaded(obj, loaded)
+
+    def _query_types(self, oids):
+        "Return the rows of _TYPES_QUERY for oids"
+        cur = Cursor(self)
+        query = _TYPES_QUERY % (','.join([str(oid) for oid in oids]), )
+        if self._stream is None:
+            cur.execute(query)
+            return cur.fetchall()
+        # in another portal without Sync, the unnamed portal of the stream stays suspended
+        self._write(_portal_query_message(query.encode(self.encoding)))
+        self._errobj = None
+        code = None
+        while code not in (51, 69):     # CloseComplete, ErrorResponse
+            code, data = self._read_message()
+            self._process_message(code, data, cur)
+        err = self._errobj
+        if err:
+            # the rest of the stream is skipped until Sync
+            self._stream = None
+            self._write(_SYNC_MESSAGE)
+            self._process_messages(None)
+            raise err
+        return list(cur._rows)
+
+    def register_type(self, oid, decoder=None, binary_decoder=None, binary_encoder=None):
+        """Register codecs of a type, which is given by oid or name.
+        The decoders take bytes of a value in text or binary format.
+        The codecs are shared by connections to the same database."""
+        array_oid = None
+        if isinstance(oid, str):
+            cur = Cursor(self)
+            cur.execute("select oid, typarray from pg_type where oid = %s::regtype" % (self.escape_parameter(oid), ))
+            oid, array_oid = cur.fetchone()
+        self._register_type(oid, array_oid, decoder, binary_decoder, binary_encoder)
+
+    def _execute_stream(self, query, obj, args=None):
+        "Execute query in the unnamed portal and receive the first obj.arraysize rows"
+        self._end_stream()
+        self.query = query
+        if args is None:
+            stmt = _Statement('', query, [])
+            args = ()
+        else:
+            stmt, message = self._lookup_statement(query)
+            if message:
+                self._write(self._begin_message() + message)
+                self.process_messages(stmt)
+                self._cache_statement(query, stmt)
+            if stmt.param_oids is not None:
+                obj.description = stmt.description
+                obj._decoders = stmt._decoders
+                obj._described()
+        obj._rowcount = 0
+        self._stream = obj
+        begin = self._begin_message()
+        if begin:
+            # BEGIN with its own Sync, as the portal is suspended without Sync
+            begin += _SYNC_MESSAGE
+        self._write(begin + self._stream_message(stmt, args, obj.arraysize))
+        if begin:
+            self.process_messages(None)
+        self._process_stream_messages(obj)
+        if self._unknown_oids:
+            self._load_types(obj)
+
+    def _fetch_stream(self, obj):
+        "Receive the next obj.arraysize rows from the suspended portal"
+        self._write(_execute_message(obj.arraysize) + _FLUSH_MESSAGE)
+        self._process_stream_messages(obj)
+
+    def _process_stream_messages(self, obj):
+        "Process messages until the portal is suspended or completed"
+        self._errobj = None
+        rowcount = obj._rowcount
+        n = obj._buffered()
+        while True:
+            code, data = self._read_message()
+            self._process_message(code, data, obj)
+            if code == 115:     # PortalSuspended('s')
+                obj._rowcount = rowcount + obj._buffered() - n
+                return
+            if code in (67, 69, 73):    # CommandComplete, ErrorResponse, EmptyQueryResponse
+                break
+        if obj.description:
+            obj._rowcount = rowcount + obj._buffered() - n
+        self._stream = None
+        err = self._errobj
+        self._write(_SYNC_MESSAGE)
+        self._process_messages(None)
+        if err:
+            if self.query in self._statements:
+                self._invalidate_statement(self.query, err)
+            raise err
+
+    def _end_stream(self):
+        "Close the streaming portal and discard the rows not fetched yet"
+        if self._stream is None:
+            return
+        stream, self._stream = self._stream, None
+        # the rows received and not fetched yet are discarded too
+        stream._rows.clear()
+        if stream._columns:
+            stream._new_columns()
+        if isinstance(stream, CopyOutCursor):
+            # COPY TO STDOUT can not be stopped, the rest rows are received and discarded
+            self._process_messages(None)
+            return
+        self._write(_CLOSE_PORTAL_MESSAGE + _SYNC_MESSAGE)
+        self._process_messages(None)
 
-    def cursor(self, cursor=None):
-        if cursor is None:
-            cursor = Cursor
-        return cursor(self)
+    def _recv_available(self):
+        # receive data which has arrived already, without blocking
+        buf = self._rbuf
+        while select.select([self.sock], [], [], 0)[0] or (self.ssl_context and self.sock.pending()):
+            n = self.sock.recv_into(buf.get_buffer(len(buf) + 4096))
+            if not n:
+                raise InterfaceError("Can't recv packets", "08003")
+            buf.advance(n)
 
-    def execute(self, query, obj=None):
+    def executemany(self, query, seq_of_params, obj=None):
+        """Execute query with each parameters in a pipeline.
+        Bind and Execute messages for all parameters are sent with one Sync"""
+        self._end_stream()
+        self.query = query
+        stmt, message = self._lookup_statement(query, self.prepare)
+        if message:
+            self._write(self._begin_message() + message)
+            self.process_messages(stmt)
+            self._cache_statement(query, stmt)
+        if obj:
+            if stmt.param_oids is not None:
+                obj.description = stmt.description
+                obj._decoders = stmt._decoders
+                obj._described()
+            obj._rowcount = 0
+        self._errobj = None
+        rowcount = 0
+        messages = []
+        size = 0
+        for i, args in enumerate(seq_of_params):
+            if i == 0:
+                b = self._begin_message() + self._first_bind_message(stmt, args)
+            else:
+                b = self._bind_message(stmt, args)
+            messages.append(b)
+            size += len(b)
+            if size >= _PIPELINE_CHUNK_SIZE:
+                self._write(b''.join(messages))
+                messages = []
+                size = 0
+                self._recv_available()
+                rowcount += self._process_buffered_messages(obj)
+                if self._errobj:
+                    break
+        messages.append(_SYNC_MESSAGE)
+        self._write(b''.join(messages))
+        while True:
+            code, data = self._read_message()
+            self._process_message(code, data, obj)
+            if code == 90:
+                break
+            if code == 67 and obj:
+                rowcount += obj._rowcount
+                obj._rowcount = 0
+        if obj:
+            obj._rowcount = rowcount
+        if self._errobj:
+            raise self._errobj
+
+    def copy_from_query(self, query, args=None, format='binary', row_factory=None):
+        """Execute COPY (query) TO STDOUT and return a CopyOutCursor, which receives
+        and decodes the rows by arraysize rows while they are fetched"""
+        cur = self.cursor(CopyOutCursor, row_factory=row_factory)
+        cur.format = format
+        cur.execute(query, args)
+        return cur
+
+    def _execute_copy_out(self, query, obj):
+        "Describe query, execute COPY (query) TO STDOUT and receive the first obj.arraysize rows"
+        self._end_stream()
         self.query = query
-        self._send_message(b'Q', query.encode(self.encoding) + b'\x00')
-        self.process_messages(obj)
-        if self.autocommit:
-            self.commit()
+        stmt = _Statement('', query, [])
+        self._write(self._begin_message() + self._describe_message(stmt))
+        self.process_messages(stmt)
+        if self._unknown_oids:
+            self._load_types()
+        self.query = self._copy_out_described(obj, stmt.description)
+        self._send_message(b'Q', self._begin_query() + self.query.encode(self.encoding) + b'\x00')
+        self._errobj = None
+        self._stream = obj
+        self._fetch_copy(obj)
+
+    def _fetch_copy(self, obj, n=None):
+        "Receive the next n (obj.arraysize by default) rows of COPY TO STDOUT"
+        n = obj._buffered() + (n or obj.arraysize)
+        while obj._buffered() < n:
+            code, data = self._read_message()
+            if code == 100:     # CopyData('d')
+                self._copy_row(obj, data)
+                continue
+            self._process_message(code, data, None)
+            if code == 90:
+                self._stream = None
+                if self._errobj:
+                    raise self._errobj
+                return
+
+    def copy_records_to_table(self, table, records, columns=None, schema_name=None, format='binary'):
+        """COPY records, an iterable of tuples, to the table and return the number of rows copied.
+        The records are sent in binary format if format is 'binary' and all the column types
+        can be encoded in binary format, otherwise in text format"""
+        self._end_stream()
+        table, columns = self._copy_target(table, columns, schema_name)
+        encode_row = None
+        if format == 'binary':
+            stmt = _Statement('', 'SELECT %s FROM %s' % (columns, table), [])
+            self._write(self._begin_message() + self._describe_message(stmt))
+            self.process_messages(stmt)
+            if self._unknown_oids:
+                self._load_types()
+            encode_row = self._copy_row_encoder(stmt.description)
+        if columns == '*':
+            self.query = 'COPY %s FROM STDIN' % (table, )
+        else:
+            self.query = 'COPY %s (%s) FROM STDIN' % (table, columns)
+        if encode_row:
+            self.query += ' (FORMAT binary)'
+        self._send_message(b'Q', self._begin_query() + self.query.encode(self.encoding) + b'\x00')
+        self._errobj = None
+        while True:
+            code, data = self._read_message()
+            if code == 71:      # CopyInResponse('G')
+                break
+            self._process_message(code, data, None)
+            if code == 90:
+                raise self._errobj
+        try:
+            for message in self._copy_data_messages(records, encode_row):
+                self._write(message)
+                self._recv_available()
+                if self._copy_error_received():
+                    # the rest CopyData are discarded by the server
+                    break
+            self._write(_COPY_DONE_MESSAGE)
+        except BaseException as e:
+            self._write(_copy_fail_message(e))
+            self._process_messages(None)
+            raise
+        return self._copy_done()
+
+    def _copy_done(self):
+        "Receive the result of COPY FROM STDIN, return the number of rows"
+        rowcount = 0
+        while True:
+            code, data = self._read_message()
+            if code == 67:
+                rowcount = int(bytes(data[:-1]).split(b' ')[-1])
+            self._process_message(code, data, None)
+            if code == 90:
+                break
+        if self._errobj:
+            raise self._errobj
+        return rowcount
+
+    def _copy_in(self, f):
+        "Send the data read from the file object f by CopyData messages, read into a buffer with the header"
+        readinto = getattr(f, 'readinto', None)
+        if readinto is None:
+            return super()._copy_in(f)
+        buf = bytearray(5 + _COPY_CHUNK_SIZE)
+        view = memoryview(buf)
+        buf[0] = 100        # CopyData('d')
+        while True:
+            n = readinto(view[5:])
+            if not n:
+                break
+            view[1:5] = _bint_to_bytes(n + 4)
+            self._write(view[:n + 5])
+        self._write(self._copy_done_message())
+
+    def _copy_out(self, f):
+        "Write the data of CopyData messages to the file f straight from the receive buffer"
+        fd = f.fileno()
+        buf = self._rbuf
+        views = []
+        while True:
+            m = buf.message()
+            if m is None:
+                # write the received data before the buffer is reused
+                _write_views(fd, views)
+                views = []
+                self._recv(buf.needed())
+                continue
+            code, data = m
+            if code == 100:     # CopyData('d')
+                views.append(data)
+                continue
+            _write_views(fd, views)
+            views = []
+            self._process_message(code, data, None)
+            if code == 99 or code == 69:    # CopyDone('c'), ErrorResponse('E')
+                return
 
     def get_parameter_status(self, s):
         with self.cursor() as cur:
@@ -978,22 +3854,24 @@ class Connection(BaseConnection):
     def isolation_level(self):
         return self.get_parameter_status('TRANSACTION ISOLATION LEVEL')
 
-    def _begin(self):
-        self._send_message(b'Q', b"BEGIN\x00")
-        self._process_messages(None)
-
     def begin(self):
+        "BEGIN is deferred and sent with the next statement"
         if DEBUG:
             DEBUG_OUTPUT('BEGIN')
-        self._begin()
+        self._end_stream()
+        if self._trans_status == b'I':
+            self._begin_pending = True
 
     def commit(self):
         if DEBUG:
             DEBUG_OUTPUT('COMMIT')
         if self.sock:
+            self._end_stream()
+            if self._trans_status == b'I':
+                # no statement since BEGIN
+                return
             self._send_message(b'Q', b"COMMIT\x00")
             self.process_messages(None)
-            self._begin()
 
     def _rollback(self):
         self._send_message(b'Q', b"ROLLBACK\x00")
@@ -1003,8 +3881,9 @@ class Connection(BaseConnection):
         if DEBUG:
             DEBUG_OUTPUT('ROLLBACK')
         if self.sock:
-            self._rollback()
-            self._begin()
+            self._end_stream()
+            if self._trans_status != b'I':
+                self._rollback()
 
     def reopen(self):
         self.close()
@@ -1020,13 +3899,111 @@ class Connection(BaseConnection):
             self.sock = None
 
     @classmethod
-    def connect(cls, host, user, password='', database=None, port=None, timeout=None, ssl_context=None):
-        conn = cls(host, user, password, database, port if port else 5432, timeout, ssl_context)
+    def connect(cls, host, user, password='', database=None, port=None, timeout=None, ssl_context=None,
+                prepare=False, statement_cache_size=100, binary_parameters=False, binary_results=False,
+                flat_arrays=False):
+        conn = cls(
+            host, user, password, database, port if port else 5432, timeout, ssl_context,
+            prepare, statement_cache_size, binary_parameters, binary_results, flat_arrays
+        )
         conn._open()
 
         return conn
 
 
+class _Protocol(asyncio.BufferedProtocol):
+    """Receive data straight into a _ReadBuffer from the event loop.
+
+    Coroutines wait on a future that is completed only when a whole
+    message is buffered, and then handle all the buffered messages
+    without going back to the event loop.
+    """
+
+    HIGH_WATER = 4 * 1024 * 1024
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.buf = _ReadBuffer()
+        self.transport = None
+        self._exc = None
+        self._waiter = None
+        self._waiting = 0
+        self._reading_paused = False
+        self._drain_waiter = None
+        self._writing_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self.buf.get_buffer(max(self._waiting, len(self.buf) + 4096))
+
+    def buffer_updated(self, nbytes):
+        buf = self.buf
+        buf.advance(nbytes)
+        if self._waiter is not None:
+            if len(buf) >= self._waiting and not self._waiter.done():
+                self._waiter.set_result(None)
+        elif len(buf) > self.HIGH_WATER and not self._reading_paused and not self._writing_paused:
+            # nobody consumes the messages now
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self):
+        self._set_exception(InterfaceError("Can't recv packets", "08003"))
+
+    def connection_lost(self, exc):
+        self._set_exception(InterfaceError("Lost connection", "08003"))
+
+    def _set_exception(self, exc):
+        if self._exc is None:
+            self._exc = exc
+        for waiter in (self._waiter, self._drain_waiter):
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(exc)
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    def consumed(self):
+        "Called after messages are taken from the buffer without wait()"
+        if self._reading_paused and len(self.buf) <= self.HIGH_WATER:
+            self._reading_paused = False
+            self.transport.resume_reading()
+
+    async def wait(self, n):
+        "Wait until n bytes are buffered"
+        while len(self.buf) < n:
+            if self._exc is not None:
+                raise self._exc
+            if self._reading_paused:
+                self._reading_paused = False
+                self.transport.resume_reading()
+            self._waiting = n
+            self._waiter = self.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                self._waiting = 0
+
+    async def drain(self):
+        "Wait until the transport write buffer goes below its high water mark"
+        if self._exc is not None:
+            raise self._exc
+        if self._writing_paused:
+            self._drain_waiter = self.loop.create_future()
+            try:
+                await self._drain_waiter
+            finally:
+                self._drain_waiter = None
+
+
 class AsyncConnection(BaseConnection):
     def __init__(self, *args, **kwargs):
         if kwargs.get("ssl_context"):
@@ -1038,6 +4015,8 @@ class AsyncConnection(BaseConnection):
         del kwargs["loop"]
         super().__init__(*args, **kwargs)
         self.last_usage = self.loop.time()
+        self._transport = None
+        self._protocol = None
 
     async def __aenter__(self):
         return self
@@ -1045,333 +4024,541 @@ class AsyncConnection(BaseConnection):
     async def __aexit__(self, exc, value, traceback):
         await self.close()
 
-    async def _send_data(self, message, data):
-        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
-        await self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data]))
-
-    async def _send_message(self, message, data):
-        DEBUG_OUTPUT('<- {}:{}'.format(message, data))
-        await self._write(b''.join([message, _bint_to_bytes(len(data) + 4), data, b'H\x00\x00\x00\x04']))
-
     async def _process_messages(self, obj):
-        errobj = None
+        self._errobj = None
+        buf = self._rbuf
+        copy = obj is not None and not isinstance(obj, BaseCursor)
         while True:
-            try:
-                code = ord(await self._read(1))
-            except OperationalError:
-                # something error occured
+            m = buf.message()
+            if m is None:
+                try:
+                    m = await self._read_message()
+                except OperationalError:
+                    # something error occured
+                    break
+            code, data = m
+            if code == 71 and copy:     # CopyInResponse('G')
+                await self._copy_from(obj)
+                continue
+            self._process_message(code, data, obj)
+            if code == 72 and copy:     # CopyOutResponse('H')
+                await self._copy_to(obj)
+            elif code == 90:
                 break
-            ln = _bytes_to_bint(await self._read(4)) - 4
-            data = await self._read(ln)
-            if code == 90:
-                self._trans_status = data
-                DEBUG_OUTPUT("-> ReadyForQuery('Z'):{}".format(data))
-                break
-            elif code == 82:
-                auth_method = _bytes_to_bint(data[:4])
-                DEBUG_OUTPUT("-> Authentication('R'):{}".format(auth_method))
-                if auth_method == 0:      # trust
-                    pass
-                elif auth_method == 5:    # md5
-                    salt = data[4:]
-                    hash1 = hashlib.md5(self.password.encode('ascii') + self.user.encode("ascii")).hexdigest().encode("ascii")
-                    hash2 = hashlib.md5(hash1+salt).hexdigest().encode("ascii")
-                    await self._send_data(b'p', b''.join([b'md5', hash2, b'\x00']))
-
-                    # accept
-                    code = ord(await self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(self._read(4)) - 4
-                    data = await self._read(ln)
-                    assert _bytes_to_bint(data[:4]) == 0
-                elif auth_method == 10:   # SASL
-                    assert b'SCRAM-SHA-256\x00' in data
-                    printable = string.ascii_letters + string.digits + '+/'
-                    client_nonce = ''.join(
-                        printable[random.randrange(0, len(printable))]
-                        for i in range(24)
-                    )
-
-                    # send client first message
-                    client_first_message = 'n,,n=,r=' + client_nonce
-                    await self._send_data(b'p', b''.join([
-                        b'SCRAM-SHA-256\x00',
-                        _bint_to_bytes(len(client_first_message)),
-                        client_first_message.encode('utf-8')
-                    ]))
-                    DEBUG_OUTPUT(f"client_first:{client_first_message}")
-
-                    code = ord(await self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(await self._read(4)) - 4
-                    data = await self._read(ln)
-                    _bytes_to_bint(data[:4]) == 11      # SCRAM first
-
-                    # recv server first message
-                    server = {
-                        kv[0]: kv[2:]
-                        for kv in data[4:].decode('utf-8').split(',')
-                    }
-                    # r: server nonce
-                    # s: servre salt
-                    # i: iteration count
-                    assert server['r'][:len(client_nonce)] == client_nonce
-                    DEBUG_OUTPUT(f"servre_first:{server}")
-
-                    # send client final message
-                    salted_pass = hashlib.pbkdf2_hmac(
-                        'sha256',
-                        self.password.encode('utf-8'),
-                        base64.standard_b64decode(server['s']),
-                        int(server['i']),
-                    )
-
-                    client_key = hmac.HMAC(
-                        salted_pass, b"Client Key", hashlib.sha256
-                    ).digest()
-
-                    client_first_message_bare = "n=,r=" + client_nonce
-                    server_first_message = "r=%s,s=%s,i=%s" % (server['r'], server['s'], server['i'])
-                    client_final_message_without_proof = "c=biws,r=" + server['r']
-                    auth_msg = ','.join([
-                        client_first_message_bare,
-                        server_first_message,
-                        client_final_message_without_proof
-                    ])
-
-                    client_sig = hmac.HMAC(
-                        hashlib.sha256(client_key).digest(),
-                        auth_msg.encode('utf-8'),
-                        hashlib.sha256
-                    ).digest()
-
-                    proof = base64.standard_b64encode(
-                        b"".join([bytes([x ^ y]) for x, y in zip(client_key, client_sig)])
-                    ).decode('utf-8')
-                    client_final_message = client_final_message_without_proof + ",p=" + proof
-                    DEBUG_OUTPUT(f"client_final:{client_final_message}")
-                    await self._send_data(
-                        b'p',
-                        client_final_message.encode('utf-8')
-                    )
-
-                    code = ord(await self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(await self._read(4)) - 4
-                    data = await self._read(ln)
-                    _bytes_to_bint(data[:4]) == 12      # SCRAM final
-
-                    # accept
-                    code = ord(await self._read(1))
-                    assert code == 82
-                    ln = _bytes_to_bint(await self._read(4)) - 4
-                    data = await self._read(ln)
-                    assert _bytes_to_bint(data[:4]) == 0
-                else:
-                    errobj = InterfaceError("Authentication method %d not supported." % (auth_method,))
-            elif code == 83:
-                k, v, _ = data.split(b'\x00')
-                DEBUG_OUTPUT("-> ParameterStatus('S'):{}:{}".format(k, v))
-                if k == b'server_encoding':
-                    self.encoding = v.decode('ascii')
-                elif k == b'server_version':
-                    version = v.decode('ascii').split('(')[0].split('.')
-                    self.server_version = int(version[0]) * 10000
-                    if len(version) > 0:
-                        try:
-                            self.server_version += int(version[1]) * 100
-                        except Exception:
-                            pass
-                    if len(version) > 1:
-                        try:
-                            self.server_version += int(version[2])
-                        except Exception:
-                            pass
-                elif k == b'TimeZone':
-                    self.tz_name = v.decode('ascii')
-                    self.tzinfo = None
-            elif code == 75:
-                DEBUG_OUTPUT("-> BackendKeyData('K')")
-                pass
-            elif code == 67:
-                if not obj:
-                    DEBUG_OUTPUT("-> CommandComplete('C')")
-                    continue
-                command = data[:-1].decode('ascii')
-                DEBUG_OUTPUT("-> CommandComplete('C'):{}".format(command))
-                if command == 'SHOW':
-                    obj._rowcount = 1
-                else:
-                    for k in ('SELECT', 'UPDATE', 'DELETE', 'INSERT'):
-                        if command[:len(k)] == k:
-                            obj._rowcount = int(command.split(' ')[-1])
-                            break
-            elif code == 84:
-                if not obj:
-                    continue
-                count = _bytes_to_bint(data[0:2])
-                obj.description = [None] * count
-                n = 2
-                idx = 0
-                for i in range(count):
-                    name = data[n:n+data[n:].find(b'\x00')]
-                    n += len(name) + 1
-                    try:
-                        name = name.decode(self.encoding)
-                    except UnicodeDecodeError:
-                        pass
-                    type_code = _bytes_to_bint(data[n+6:n+10])
-                    if type_code == PG_TYPE_VARCHAR:
-                        size = _bytes_to_bint(data[n+12:n+16]) - 4
-                        precision = -1
-                        scale = -1
-                    elif type_code == PG_TYPE_NUMERIC:
-                        size = _bytes_to_bint(data[n+10:n+12])
-                        precision = _bytes_to_bint(data[n+12:n+14])
-                        scale = precision - _bytes_to_bint(data[n+14:n+16])
-                    else:
-                        size = _bytes_to_bint(data[n+10:n+12])
-                        precision = -1
-                        scale = -1
-#                        table_oid = _bytes_to_bint(data[n:n+4])
-#                        table_pos = _bytes_to_bint(data[n+4:n+6])
-#                        size = _bytes_to_bint(data[n+10:n+12])
-#                        modifier = _bytes_to_bint(data[n+12:n+16])
-#                        format = _bytes_to_bint(data[n+16:n+18]),
-                    field = Description(name, type_code, None, size, precision, scale, None)
-                    n += 18
-                    obj.description[idx] = field
-                    idx += 1
-                DEBUG_OUTPUT("-> RowDescription('T'):{}".format(obj.description))
-            elif code == 68:
-                if not obj:
-                    DEBUG_OUTPUT("-> DataRow('D')")
-                    continue
-                n = 2
-                row = []
-                while n < len(data):
-                    if data[n:n+4] == b'\xff\xff\xff\xff':
-                        row.append(None)
-                        n += 4
-                    else:
-                        ln = _bytes_to_bint(data[n:n+4])
-                        n += 4
-                        row.append(data[n:n+ln])
-                        n += ln
-                for i in range(len(row)):
-                    row[i] = self._decode_column(row[i], obj.description[i][1])
-                obj._rows.append(tuple(row))
-                DEBUG_OUTPUT("-> DataRow('D'):{}".format(tuple(row)))
-            elif code == 78:
-                DEBUG_OUTPUT("-> NoticeResponse('N')")
-                pass
-            elif code == 69 and not errobj:
-                err = data.split(b'\x00')
-                # http://www.postgresql.org/docs/9.3/static/errcodes-appendix.html
-                errcode = err[2][1:].decode('utf-8')
-                message = "{}:{}".format(self.query, err[3][1:].decode(self.encoding))
-                DEBUG_OUTPUT("-> ErrorResponse('E'):{}:{}".format(errcode, message))
-
-                if errcode[:2] == '0A':
-                    errobj = NotSupportedError(message, errcode)
-                elif errcode[:2] in ('20', '21'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:2] in ('22', ):
-                    errobj = DataError(message, errcode)
-                elif errcode[:2] == '23':
-                    errobj = IntegrityError(message, errcode)
-                elif errcode[:2] in ('24', '25'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] in ('26', '27', '28'):
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:2] in ('2B', '2D', '2F'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] == '34':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:2] in ('38', '39', '3B'):
-                    errobj = InternalError(message, errcode)
-                elif errcode[:2] in ('3D', '3F'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:2] in ('40', '42', '44'):
-                    errobj = ProgrammingError(message, errcode)
-                elif errcode[:1] == '5':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:1] in 'F':
-                    errobj = InternalError(message, errcode)
-                elif errcode[:1] in 'H':
-                    errobj = OperationalError(message, errcode)
-                elif errcode[:1] in ('P', 'X'):
-                    errobj = InternalError(message, errcode)
-                else:
-                    errobj = DatabaseError(message, errcode)
-            elif code == 72:    # CopyOutputResponse('H')
-                pass
-            elif code == 100:   # CopyData('d')
-                obj.write(data)
-            elif code == 99:    # CopyDataDone('c')
-                pass
-            elif code == 71:    # CopyInResponse('G')
-                while True:
-                    buf = obj.read(8192)
-                    if not buf:
-                        break
-                    # send CopyData
-                    await self._write(b'd' + _bint_to_bytes(len(buf) + 4))
-                    await self._write(buf)
-                # send CopyDone and Sync
-                await self._write(b'c\x00\x00\x00\x04S\x00\x00\x00\x04')
-            else:
-                DEBUG_OUTPUT("-> Unknown({}):{}{}".format(code, ln, binascii.b2a_hex(data)))
-                pass
-        return errobj
+        return self._errobj
 
     async def process_messages(self, obj):
         err = await self._process_messages(obj)
         if err:
             raise err
 
-    async def _read(self, ln):
+    async def _read_message(self):
         if not self.sock:
             raise InterfaceError("Lost connection", "08003")
-        r = b''
-        while len(r) < ln:
-            b = await self.loop.sock_recv(self.sock, ln-len(r))
-            if not b:
-                raise InterfaceError("Can't recv packets", "08003")
-            r += b
-        return r
+        buf = self._rbuf
+        m = buf.message()
+        while m is None:
+            await self._protocol.wait(buf.needed())
+            m = buf.message()
+        return m
 
-    async def _write(self, b):
+    def _write(self, b):
         if not self.sock:
             raise InterfaceError("Lost connection", "08003")
-        await self.loop.sock_sendall(self.sock, b)
+        self._transport.write(b)
 
     async def _open(self):
-        self.sock = socket.create_connection((self.host, self.port), self.timeout)
-        DEBUG_OUTPUT("Connection._open() socket %s:%d" % (self.host, self.port))
+        self._transport, self._protocol = await asyncio.wait_for(
+            self.loop.create_connection(lambda: _Protocol(self.loop), self.host, self.port),
+            self.timeout,
+        )
+        self.sock = self._transport.get_extra_info('socket')
+        self._rbuf = self._protocol.buf
+        self._statements.clear()
+        self._stream = None
+        self._closing_statements = []
+        DEBUG_OUTPUT("AsyncConnection._open() socket %s:%d" % (self.host, self.port))
         v = b'\x00\x03\x00\x00'
         v += b'user\x00' + self.user.encode('ascii') + b'\x00'
         if self.database:
             v += b'database\x00' + self.database.encode('ascii') + b'\x00'
         v += b'\x00'
 
-        await self._write(_bint_to_bytes(len(v) + 4) + v)
+        self._write(_bint_to_bytes(len(v) + 4) + v)
         await self.process_messages(None)
 
-        await self._begin()
-
-    def cursor(self, cursor=None):
+    def cursor(self, cursor=None, name=None, scrollable=None, withhold=False, row_factory=None, lazy=False):
         self.last_usage = self.loop.time()
-        if cursor is None:
-            cursor = AsyncCursor
-        return cursor(self)
+        if name is not None:
+            cur = (cursor or AsyncServerCursor)(self, name, scrollable, withhold)
+        else:
+            cur = (cursor or AsyncCursor)(self)
+        cur.row_factory = row_factory
+        cur.lazy = lazy
+        return cur
+
+    def pipeline(self):
+        """Return an async context manager to queue statements, which are sent at once.
+        The connection is not used for other queries until the end of the context"""
+        return AsyncPipeline(self)
+
+    async def _execute_prepared(self, query, args, obj, retry=True):
+        begins = self._begin_pending     # the transaction is begun by this statement
+        stmt, message = self._lookup_statement(query)
+        if message:
+            self._write(self._begin_message() + message)
+            await self.process_messages(stmt)
+            self._cache_statement(query, stmt)
+        if obj and stmt.param_oids is not None:
+            obj.description = stmt.description
+            obj._decoders = stmt._decoders
+            obj._described()
+        self._write(self._begin_message() + self._first_bind_message(stmt, args, _EXECUTE_MESSAGE + _SYNC_MESSAGE))
+        err = await self._process_messages(obj)
+        if err:
+            if retry and self._invalidate_statement(query, err) and (self._trans_status == b'I' or begins):
+                if self._trans_status != b'I':
+                    # nothing but this statement is rolled back
+                    await self._rollback()
+                await self._execute_prepared(query, args, obj, False)
+                return
+            raise err
+
+    async def execute(self, query, obj=None, args=None):
+        if isinstance(obj, (str, bytes, int, os.PathLike)):
+            # COPY from or to the file of a path or a file descriptor
+            f = _CopyFile(obj)
+            try:
+                await self.execute(query, f, args)
+            finally:
+                f.close()
+            return
+        await self._end_stream()
+        self.query = query
+        self._extended_copy = args is not None
+        # obj is a cursor, or a file object for COPY
+        cursor = obj if isinstance(obj, BaseCursor) else None
+        if cursor:
+            cursor._nextsets.clear()
+        if args is None:
+            begin = self._begin_query()
+            if cursor:
+                # receive the result sets of the statements in the query separately
+                cursor._completed = False
+                self._skip_begin_complete = bool(begin)
+            self._send_message(b'Q', begin + query.encode(self.encoding) + b'\x00')
+            try:
+                await self.process_messages(obj)
+            finally:
+                if cursor:
+                    cursor._end_result_sets()
+        else:
+            await self._execute_prepared(query, args, obj)
+        if self._unknown_oids:
+            await self._load_types(cursor)
+
+    async def _load_types(self, *objs):
+        "Look up pg_type for the types seen first, and decode their columns in objs"
+        if self._trans_status == b'E':
+            return
+        oids = loaded = self._unknown_oids
+        self._unknown_oids = set()
+        while oids:
+            rows = await self._query_types(oids)
+            for oid in oids:
+                self._types.types.setdefault(oid, _TypeInfo(oid))
+            oids = self._store_types(rows)
+            loaded |= oids
+        for obj in objs or (None, ):
+            self._types_loaded(obj, loaded)
+
+    async def _query_types(self, oids):
+        "Return the rows of _TYPES_QUERY for oids"
+        cur = AsyncCursor(self)
+        query = _TYPES_QUERY % (','.join([str(oid) for oid in oids]), )
+        if self._stream is None:
+            await cur.execute(query)
+            return await cur.fetchall()
+        # in another portal without Sync, the unnamed portal of the stream stays suspended
+        self._write(_portal_query_message(query.encode(self.encoding)))
+        self._errobj = None
+        buf = self._rbuf
+        code = None
+        while code not in (51, 69):     # CloseComplete, ErrorResponse
+            m = buf.message()
+            if m is None:
+                m = await self._read_message()
+            code, data = m
+            self._process_message(code, data, cur)
+        err = self._errobj
+        if err:
+            # the rest of the stream is skipped until Sync
+            self._stream = None
+            self._write(_SYNC_MESSAGE)
+            await self._process_messages(None)
+            raise err
+        return list(cur._rows)
+
+    async def register_type(self, oid, decoder=None, binary_decoder=None, binary_encoder=None):
+        """Register codecs of a type, which is given by oid or name.
+        The decoders take bytes of a value in text or binary format.
+        The codecs are shared by connections to the same database."""
+        array_oid = None
+        if isinstance(oid, str):
+            cur = AsyncCursor(self)
+            await cur.execute("select oid, typarray from pg_type where oid = %s::regtype" % (self.escape_parameter(oid), ))
+            oid, array_oid = await cur.fetchone()
+        self._register_type(oid, array_oid, decoder, binary_decoder, binary_encoder)
+
+    async def _execute_stream(self, query, obj, args=None):
+        "Execute query in the unnamed portal and receive the first obj.arraysize rows"
+        await self._end_stream()
+        self.query = query
+        if args is None:
+            stmt = _Statement('', query, [])
+            args = ()
+        else:
+            stmt, message = self._lookup_statement(query)
+            if message:
+                self._write(self._begin_message() + message)
+                await self.process_messages(stmt)
+                self._cache_statement(query, stmt)
+            if stmt.param_oids is not None:
+                obj.description = stmt.description
+                obj._decoders = stmt._decoders
+                obj._described()
+        obj._rowcount = 0
+        self._stream = obj
+        begin = self._begin_message()
+        if begin:
+            # BEGIN with its own Sync, as the portal is suspended without Sync
+            begin += _SYNC_MESSAGE
+        self._write(begin + self._stream_message(stmt, args, obj.arraysize))
+        if begin:
+            await self.process_messages(None)
+        await self._process_stream_messages(obj)
+        if self._unknown_oids:
+            await self._load_types(obj)
+
+    async def _fetch_stream(self, obj):
+        "Receive the next obj.arraysize rows from the suspended portal"
+        self._write(_execute_message(obj.arraysize) + _FLUSH_MESSAGE)
+        await self._process_stream_messages(obj)
+
+    async def _process_stream_messages(self, obj):
+        "Process messages until the portal is suspended or completed"
+        self._errobj = None
+        rowcount = obj._rowcount
+        n = obj._buffered()
+        buf = self._rbuf
+        while True:
+            m = buf.message()
+            if m is None:
+                m = await self._read_message()
+            code, data = m
+            self._process_message(code, data, obj)
+            if code == 115:     # PortalSuspended('s')
+                obj._rowcount = rowcount + obj._buffered() - n
+                return
+            if code in (67, 69, 73):    # CommandComplete, ErrorResponse, EmptyQueryResponse
+                break
+        if obj.description:
+            obj._rowcount = rowcount + obj._buffered() - n
+        self._stream = None
+        err = self._errobj
+        self._write(_SYNC_MESSAGE)
+        await self._process_messages(None)
+        if err:
+            if self.query in self._statements:
+                self._invalidate_statement(self.query, err)
+            raise err
+
+    async def _end_stream(self):
+        "Close the streaming portal and discard the rows not fetched yet"
+        if self._stream is None:
+            return
+        stream, self._stream = self._stream, None
+        # the rows received and not fetched yet are discarded too
+        stream._rows.clear()
+        if stream._columns:
+            stream._new_columns()
+        if isinstance(stream, AsyncCopyOutCursor):
+            # COPY TO STDOUT can not be stopped, the rest rows are received and discarded
+            await self._process_messages(None)
+            return
+        self._write(_CLOSE_PORTAL_MESSAGE + _SYNC_MESSAGE)
+        await self._process_messages(None)
 
-    async def execute(self, query, obj=None):
+    async def executemany(self, query, seq_of_params, obj=None):
+        """Execute query with each parameters in a pipeline.
+        Bind and Execute messages for all parameters are sent with one Sync"""
+        await self._end_stream()
+        self.query = query
+        stmt, message = self._lookup_statement(query, self.prepare)
+        if message:
+            self._write(self._begin_message() + message)
+            await self.process_messages(stmt)
+            self._cache_statement(query, stmt)
+        if obj:
+            if stmt.param_oids is not None:
+                obj.description = stmt.description
+                obj._decoders = stmt._decoders
+                obj._described()
+            obj._rowcount = 0
+        self._errobj = None
+        rowcount = 0
+        messages = []
+        size = 0
+        for i, args in enumerate(seq_of_params):
+            if i == 0:
+                b = self._begin_message() + self._first_bind_message(stmt, args)
+            else:
+                b = self._bind_message(stmt, args)
+            messages.append(b)
+            size += len(b)
+            if size >= _PIPELINE_CHUNK_SIZE:
+                self._write(b''.join(messages))
+                messages = []
+                size = 0
+                rowcount += self._process_buffered_messages(obj)
+                self._protocol.consumed()
+                if self._errobj:
+                    break
+                await self._protocol.drain()
+        messages.append(_SYNC_MESSAGE)
+        self._write(b''.join(messages))
+        buf = self._rbuf
+        while True:
+            m = buf.message()
+            if m is None:
+                m = await self._read_message()
+            code, data = m
+            self._process_message(code, data, obj)
+            if code == 90:
+                break
+            if code == 67 and obj:
+                rowcount += obj._rowcount
+                obj._rowcount = 0
+        if obj:
+            obj._rowcount = rowcount
+        if self._errobj:
+            raise self._errobj
+
+    async def copy_from_query(self, query, args=None, format='binary', row_factory=None):
+        "Execute COPY (query) TO STDOUT and return an AsyncCopyOutCursor, see Connection.copy_from_query()"
+        cur = self.cursor(AsyncCopyOutCursor, row_factory=row_factory)
+        cur.format = format
+        await cur.execute(query, args)
+        return cur
+
+    async def _execute_copy_out(self, query, obj):
+        "Describe query, execute COPY (query) TO STDOUT and receive the first obj.arraysize rows"
+        await self._end_stream()
         self.query = query
-        await self._send_message(b'Q', query.encode(self.encoding) + b'\x00')
-        await self.process_messages(obj)
-        if self.autocommit:
-            await self.commit()
+        stmt = _Statement('', query, [])
+        self._write(self._begin_message() + self._describe_message(stmt))
+        await self.process_messages(stmt)
+        if self._unknown_oids:
+            await self._load_types()
+        self.query = self._copy_out_described(obj, stmt.description)
+        self._send_message(b'Q', self._begin_query() + self.query.encode(self.encoding) + b'\x00')
+        self._errobj = None
+        self._stream = obj
+        await self._fetch_copy(obj)
+
+    async def _fetch_copy(self, obj, n=None):
+        "Receive the next n (obj.arraysize by default) rows of COPY TO STDOUT"
+        n = obj._buffered() + (n or obj.arraysize)
+        buf = self._rbuf
+        while obj._buffered() < n:
+            m = buf.message()
+            if m is None:
+                m = await self._read_message()
+            code, data = m
+            if code == 100:     # CopyData('d')
+                self._copy_row(obj, data)
+                continue
+            self._process_message(code, data, None)
+            if code == 90:
+                self._stream = None
+                if self._errobj:
+                    raise self._errobj
+                return
+        # reading is paused while the rows not fetched are buffered too much
+        self._protocol.consumed()
+
+    async def copy_records_to_table(self, table, records, columns=None, schema_name=None, format='binary'):
+        """COPY records, an iterable or an async iterable of tuples, to the table and return the number of rows copied.
+        The records are sent in binary format if format is 'binary' and all the column types
+        can be encoded in binary format, otherwise in text format"""
+        await self._end_stream()
+        table, columns = self._copy_target(table, columns, schema_name)
+        encode_row = None
+        if format == 'binary':
+            stmt = _Statement('', 'SELECT %s FROM %s' % (columns, table), [])
+            self._write(self._begin_message() + self._describe_message(stmt))
+            await self.process_messages(stmt)
+            if self._unknown_oids:
+                await self._load_types()
+            encode_row = self._copy_row_encoder(stmt.description)
+        if columns == '*':
+            self.query = 'COPY %s FROM STDIN' % (table, )
+        else:
+            self.query = 'COPY %s (%s) FROM STDIN' % (table, columns)
+        if encode_row:
+            self.query += ' (FORMAT binary)'
+        self._send_message(b'Q', self._begin_query() + self.query.encode(self.encoding) + b'\x00')
+        self._errobj = None
+        while True:
+            code, data = await self._read_message()
+            if code == 71:      # CopyInResponse('G')
+                break
+            self._process_message(code, data, None)
+            if code == 90:
+                raise self._errobj
+        try:
+            if hasattr(records, '__aiter__'):
+                # encoded by batches of the records
+                first = True
+                batch = []
+                async for row in records:
+                    batch.append(row)
+                    if len(batch) == _COPY_RECORDS_BATCH_SIZE:
+                        if not await self._send_copy_data(self._copy_data_messages(batch, encode_row, first, False)):
+                            break
+                        first = False
+                        batch = []
+                else:
+                    await self._send_copy_data(self._copy_data_messages(batch, encode_row, first, True))
+            else:
+                await self._send_copy_data(self._copy_data_messages(records, encode_row))
+            self._write(_COPY_DONE_MESSAGE)
+        except BaseException as e:
+            self._write(_copy_fail_message(e))
+            await self._process_messages(None)
+            raise
+        return await self._copy_done()
+
+    async def _copy_done(self):
+        "Receive the result of COPY FROM STDIN, return the number of rows"
+        rowcount = 0
+        while True:
+            code, data = await self._read_message()
+            if code == 67:
+                rowcount = int(bytes(data[:-1]).split(b' ')[-1])
+            self._process_message(code, data, None)
+            if code == 90:
+                break
+        if self._errobj:
+            raise self._errobj
+        return rowcount
+
+    def _copy_reader(self, obj):
+        "Return a coroutine function to read the next data of COPY FROM STDIN from obj, or None at the end"
+        if hasattr(obj, '__aiter__'):
+            it = obj.__aiter__()
+
+            async def _next():
+                try:
+                    return await it.__anext__()
+                except StopAsyncIteration:
+                    return None
+            return _next
+        if type(obj) is _CopyFile:
+            # the file is read in a thread not to block the event loop
+            read = functools.partial(self.loop.run_in_executor, None, obj.open('r').read)
+        elif _blocking_file(obj):
+            read = functools.partial(self.loop.run_in_executor, None, obj.read)
+        else:
+            read = obj.read
+
+        async def _read():
+            data = read(_COPY_CHUNK_SIZE)
+            if inspect.isawaitable(data):
+                data = await data
+            return data or None
+        return _read
+
+    def _copy_writer(self, obj):
+        "Return a coroutine function to write data of COPY TO STDOUT to obj"
+        if type(obj) is _CopyFile or _blocking_file(obj):
+            return functools.partial(self.loop.run_in_executor, None, obj.write)
+        write = getattr(obj, 'write', obj)      # a file object or a function
+        drain = getattr(obj, 'drain', None)     # asyncio.StreamWriter
+
+        async def _write(data):
+            r = write(data)
+            if inspect.isawaitable(r):
+                await r
+            if drain is not None:
+                await drain()
+        return _write
+
+    async def _send_copy_data(self, messages):
+        "Send CopyData messages with flow control, return False if an error is received"
+        for message in messages:
+            self._write(message)
+            if len(self._rbuf):
+                error = self._copy_error_received()
+                self._protocol.consumed()
+                if error:
+                    # the rest CopyData are discarded by the server
+                    return False
+            await self._protocol.drain()
+        return True
+
+    async def _copy_from(self, obj):
+        """Send the data of obj, an async iterable, a file object with read() or read() coroutine,
+        by CopyData messages. Sending waits while the socket buffer is full"""
+        read = self._copy_reader(obj)
+        try:
+            parts = []
+            size = 0
+            while True:
+                data = await read()
+                if data is None:
+                    break
+                if type(data) is str:
+                    data = data.encode(self.encoding)
+                parts.append(data)
+                size += len(data)
+                if size >= _COPY_CHUNK_SIZE:
+                    message = _copy_data_message(parts, size)
+                    parts = []
+                    size = 0
+                    if not await self._send_copy_data([message]):
+                        break
+            if parts:
+                self._write(_copy_data_message(parts, size))
+            self._write(self._copy_done_message())
+        except BaseException as e:
+            self._write(_copy_fail_message(e))
+            await self._process_messages(None)
+            raise
+
+    async def _copy_to(self, obj):
+        """Write the data of CopyData messages to obj, a file object with write() or write() coroutine,
+        or a function. The data received are written at once, and receiving waits while writing"""
+        write = self._copy_writer(obj)
+        buf = self._rbuf
+        parts = []
+        while True:
+            m = buf.message()
+            if m is None:
+                if parts:
+                    data = b''.join(parts)
+                    parts = []
+                    await write(data)
+                m = await self._read_message()
+            code, data = m
+            if code == 100:     # CopyData('d')
+                parts.append(data)
+                continue
+            self._process_message(code, data, obj)
+            if code == 99 or code == 69:    # CopyDone('c'), ErrorResponse('E')
+                break
+        if parts:
+            await write(b''.join(parts))
 
     async def get_parameter_status(self, s):
         with self.cursor() as cur:
@@ -1382,33 +4569,36 @@ class AsyncConnection(BaseConnection):
     async def isolation_level(self):
         return await self.get_parameter_status('TRANSACTION ISOLATION LEVEL')
 
-    async def _begin(self):
-        await self._send_message(b'Q', b"BEGIN\x00")
-        await self._process_messages(None)
-
     async def begin(self):
+        "BEGIN is deferred and sent with the next statement"
         if DEBUG:
             DEBUG_OUTPUT('BEGIN')
-        await self._begin()
+        await self._end_stream()
+        if self._trans_status == b'I':
+            self._begin_pending = True
 
     async def commit(self):
         if DEBUG:
             DEBUG_OUTPUT('COMMIT')
         if self.sock:
-            await self._send_message(b'Q', b"COMMIT\x00")
+            await self._end_stream()
+            if self._trans_status == b'I':
+                # no statement since BEGIN
+                return
+            self._send_message(b'Q', b"COMMIT\x00")
             await self.process_messages(None)
-            await self._begin()
 
     async def _rollback(self):
-        await self._send_message(b'Q', b"ROLLBACK\x00")
+        self._send_message(b'Q', b"ROLLBACK\x00")
         await self._process_messages(None)
 
     async def rollback(self):
         if DEBUG:
             DEBUG_OUTPUT('ROLLBACK')
         if self.sock:
-            await self._rollback()
-            await self._begin()
+            await self._end_stream()
+            if self._trans_status != b'I':
+                await self._rollback()
 
     async def reopen(self):
         await self.close()
@@ -1419,13 +4609,17 @@ class AsyncConnection(BaseConnection):
             DEBUG_OUTPUT('AsyncConnection::close()')
         if self.sock:
             # send Terminate
-            await self._write(b'X\x00\x00\x00\x04')
-            self.sock.close()
+            self._write(b'X\x00\x00\x00\x04')
+            self._transport.close()
             self.sock = None
 
     @classmethod
-    async def connect(cls, host=None, user=None, password='', database=None, port=None, timeout=None, loop=None):
-        conn = cls(host=host, user=user, password=password, database=database, port = port if port else 5432, timeout=timeout, loop=loop)
+    async def connect(cls, host=None, user=None, password='', database=None, port=None, timeout=None, loop=None,
+                      prepare=False, statement_cache_size=100, binary_parameters=False, binary_results=False,
+                      flat_arrays=False):
+        conn = cls(host=host, user=user, password=password, database=database, port = port if port else 5432, timeout=timeout, loop=loop,
+                   prepare=prepare, statement_cache_size=statement_cache_size,
+                   binary_parameters=binary_parameters, binary_results=binary_results, flat_arrays=flat_arrays)
         await conn._open()
 
         return conn
@@ -1560,12 +4754,13 @@ class _PoolConnectionContextManager:
 
 
 async def _create_pool(minsize=1, maxsize=10, pool_recycle=-1,
-                       loop=None, **kwargs):
+                       loop=None, connect_concurrency=10, **kwargs):
     if loop is None:
         loop = asyncio.get_event_loop()
 
     pool = Pool(minsize=minsize, maxsize=maxsize,
-                pool_recycle=pool_recycle, loop=loop, **kwargs)
+                pool_recycle=pool_recycle, loop=loop,
+                connect_concurrency=connect_concurrency, **kwargs)
     if minsize > 0:
         async with pool._cond:
             await pool._fill_free_pool(False)
@@ -1575,13 +4770,16 @@ async def _create_pool(minsize=1, maxsize=10, pool_recycle=-1,
 class Pool(asyncio.AbstractServer):
     """Connection pool"""
 
-    def __init__(self, minsize, maxsize, pool_recycle, loop, **kwargs):
+    def __init__(self, minsize, maxsize, pool_recycle, loop, connect_concurrency=10, **kwargs):
         if minsize < 0:
             raise ValueError("minsize should be zero or greater")
         if maxsize < minsize and maxsize != 0:
             raise ValueError("maxsize should be not less than minsize")
+        if connect_concurrency < 1:
+            raise ValueError("connect_concurrency should be greater than zero")
         self._minsize = minsize
         self._loop = loop
+        self._connect_concurrency = connect_concurrency
         self._conn_kwargs = kwargs
         self._acquiring = 0
         self._free = collections.deque(maxlen=maxsize or None)
@@ -1701,15 +4899,27 @@ class Pool(asyncio.AbstractServer):
                 self._free.rotate()
             n += 1
 
-        while self.size < self.minsize:
-            self._acquiring += 1
-            try:
-                conn = await AsyncConnection.connect(**(self._conn_kwargs | {"loop": self._loop}))
-                # raise exception if pool is closing
+        if self.size < self.minsize:
+            # open the missing connections at the same time
+            semaphore = asyncio.Semaphore(self._connect_concurrency)
+
+            async def _connect():
+                async with semaphore:
+                    try:
+                        conn = await AsyncConnection.connect(**(self._conn_kwargs | {"loop": self._loop}))
+                    finally:
+                        self._acquiring -= 1
                 self._free.append(conn)
                 self._cond.notify()
-            finally:
-                self._acquiring -= 1
+
+            n = self.minsize - self.size
+            self._acquiring += n
+            results = await asyncio.gather(
+                *[_connect() for _ in range(n)], return_exceptions=True
+            )
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
         if self._free:
             return
 
@@ -1717,7 +4927,6 @@ class Pool(asyncio.AbstractServer):
             self._acquiring += 1
             try:
                 conn = await AsyncConnection.connect(**(self._conn_kwargs | {"loop": self._loop}))
-                await conn._initialize()
                 # raise exception if pool is closing
                 self._free.append(conn)
                 self._cond.notify()
@@ -1794,12 +5003,18 @@ class Pool(asyncio.AbstractServer):
         await self.wait_closed()
 
 
-def connect(host, user, password='', database=None, port=None, timeout=None, ssl_context=None):
-    return Connection.connect(user, password, database, host, port, timeout, ssl_context)
+def connect(host, user, password='', database=None, port=None, timeout=None, ssl_context=None,
+            prepare=False, statement_cache_size=100, binary_parameters=False, binary_results=False,
+            flat_arrays=False):
+    return Connection.connect(
+        user, password, database, host, port, timeout, ssl_context,
+        prepare, statement_cache_size, binary_parameters, binary_results, flat_arrays
+    )
 
 
 def create_pool(minsize=1, maxsize=10, pool_recycle=-1,
-                loop=None, **kwargs):
+                loop=None, connect_concurrency=10, **kwargs):
     coro = _create_pool(minsize=minsize, maxsize=maxsize,
-                        pool_recycle=pool_recycle, loop=loop, **kwargs)
+                        pool_recycle=pool_recycle, loop=loop,
+                        connect_concurrency=connect_concurrency, **kwargs)
     return _PoolContextManager(coro)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Micro benchmark of text format date/time decoders.
+
+Compare the decoders of minipg with the strptime based decoding
+which minipg used before.
+
+    python3 misc/bench_text_decoders.py
+"""
+import os
+import sys
+import re
+import datetime
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import minipg   # noqa: E402
+
+
+def _trim_timezone_offset(data):
+    n = data.rfind('+')
+    if n == -1:
+        n = data.rfind('-')
+    return data[:n]
+
+
+def strptime_date(data):
+    dt = datetime.datetime.strptime(data.decode('ascii'), '%Y-%m-%d')
+    return datetime.date(dt.year, dt.month, dt.day)
+
+
+def strptime_time(data):
+    data = data.decode('ascii')
+    if len(data) == 8:
+        dt = datetime.datetime.strptime(data, '%H:%M:%S')
+    else:
+        dt = datetime.datetime.strptime(data, '%H:%M:%S.%f')
+    return datetime.time(dt.hour, dt.minute, dt.second, dt.microsecond)
+
+
+def strptime_timestamp(data):
+    data = data.decode('ascii')
+    if len(data) == 19:
+        return datetime.datetime.strptime(data, '%Y-%m-%d %H:%M:%S')
+    return datetime.datetime.strptime(data, '%Y-%m-%d %H:%M:%S.%f')
+
+
+def strptime_timestamptz(data):
+    s = _trim_timezone_offset(data.decode('ascii'))
+    if len(s) == 19:
+        return datetime.datetime.strptime(s, '%Y-%m-%d %H:%M:%S')
+    return datetime.datetime.strptime(s, '%Y-%m-%d %H:%M:%S.%f')
+
+
+def re_interval(data):
+    dt = re.split('days?', data.decode('ascii'))
+    if len(dt) < 2:
+        days = 0
+        t = dt[0]
+    else:
+        days = dt[0]
+        t = dt[1]
+    hours, minites, seconds = t.split(':')
+    seconds, microseconds = seconds.split('.')
+    microseconds += "0" * (6 - len(microseconds))
+    return datetime.timedelta(
+        microseconds=int(microseconds),
+        seconds=int(seconds),
+        minutes=int(minites),
+        hours=int(hours),
+        days=int(days),
+    )
+
+
+def values(fmt, repeat):
+    "10000 values, each of them repeated `repeat` times like a column of a fact table"
+    start = datetime.datetime(2020, 1, 1, 0, 0, 0, 123456)
+    return [
+        fmt(start + datetime.timedelta(days=i // repeat, seconds=i // repeat * 7, microseconds=i // repeat)).encode('ascii')
+        for i in range(10000)
+    ]
+
+
+BENCHMARKS = [
+    ('date', strptime_date, minipg._decode_text_date,
+        lambda d: d.strftime('%Y-%m-%d')),
+    ('time', strptime_time, minipg._decode_text_time,
+        lambda d: d.strftime('%H:%M:%S.%f')),
+    ('timestamp', strptime_timestamp, minipg._decode_text_timestamp,
+        lambda d: d.strftime('%Y-%m-%d %H:%M:%S.%f')),
+    ('timestamptz', strptime_timestamptz, minipg._decode_text_timestamptz,
+        lambda d: d.strftime('%Y-%m-%d %H:%M:%S.%f+09')),
+    ('interval', re_interval, minipg._decode_text_interval,
+        lambda d: '%d days %s.%06d' % (d.day, d.strftime('%H:%M:%S'), d.microsecond)),
+]
+
+
+def main():
+    for repeat in (1, 100):
+        print('each value repeated %d times' % (repeat, ))
+        for name, old, new, fmt in BENCHMARKS:
+            data = values(fmt, repeat)
+            t_old = min(timeit.repeat(lambda: [old(v) for v in data], number=1, repeat=5))
+            t_new = min(timeit.repeat(lambda: [new(v) for v in data], number=1, repeat=5))
+            print('  %-12s %8.1f ns/value -> %8.1f ns/value  (x%.1f)' % (
+                name, t_old / len(data) * 1e9, t_new / len(data) * 1e9, t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,7 +21,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 ##############################################################################
+import array
 import asyncio
+import tempfile
 import unittest
 import minipg
 
@@ -86,6 +88,197 @@ class AsyncTestCase(unittest.TestCase):
         loop.run_until_complete(_test_select())
         loop.close()
 
+    def test_aio_large_result(self):
+        async def _test_select():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor()
+            for i in range(100):
+                await cur.execute("SELECT %s", (i, ))
+                self.assertEqual(await cur.fetchall(), [(i, )])
+            await cur.execute("select i, repeat('x', i) from generate_series(1, 2000) as i")
+            result = await cur.fetchall()
+            self.assertEqual(len(result), 2000)
+            self.assertEqual(result[-1], (2000, 'x' * 2000))
+            await conn.close()
+        asyncio.run(_test_select())
+
+    def test_aio_executemany(self):
+        async def _test_executemany():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor()
+            await cur.execute("create temporary table test_executemany (i integer, s text)")
+            await cur.executemany(
+                "insert into test_executemany (i, s) values (%s, %s)",
+                ((i, 's%d' % i) for i in range(10000))
+            )
+            self.assertEqual(cur.rowcount, 10000)
+            await cur.execute("select count(*) from test_executemany")
+            self.assertEqual(await cur.fetchall(), [(10000, )])
+            await conn.close()
+        asyncio.run(_test_executemany())
+
+    def test_aio_pipeline(self):
+        async def _test_pipeline():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            async with conn.pipeline() as p:
+                curs = [p.execute("SELECT %s", (i, )) for i in range(10)]
+            self.assertEqual([(await cur.fetchone())[0] for cur in curs], list(range(10)))
+
+            # the results are received while the statements are being sent
+            async with conn.pipeline() as p:
+                curs = [p.execute("SELECT %s, repeat('x', 100)", (i, )) for i in range(10000)]
+            self.assertEqual([(await cur.fetchone())[0] for cur in curs], list(range(10000)))
+            await conn.close()
+        asyncio.run(_test_pipeline())
+
+    def test_aio_copy_records_to_table(self):
+        async def _test_copy():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor()
+            await cur.execute("create temporary table test_copy_records (i integer, s text)")
+            self.assertEqual(
+                await conn.copy_records_to_table('test_copy_records', ((i, 's%d' % i) for i in range(10000))),
+                10000
+            )
+            await cur.execute("select count(*), max(s) from test_copy_records")
+            self.assertEqual(await cur.fetchall(), [(10000, 's9999')])
+            await conn.close()
+        asyncio.run(_test_copy())
+
+    def test_aio_copy_async_iterable(self):
+        async def _test_copy():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor()
+            await cur.execute("create temporary table test_copy_async (i integer, s text)")
+
+            async def _lines():
+                for i in range(10000):
+                    yield '%d\ts%d\n' % (i, i)
+            await conn.execute("copy test_copy_async from stdin", _lines())
+
+            async def _records():
+                for i in range(10000):
+                    yield (i, 's%d' % i)
+            self.assertEqual(await conn.copy_records_to_table('test_copy_async', _records()), 10000)
+
+            data = []
+
+            async def _write(b):
+                data.append(b)
+            await conn.execute("copy test_copy_async to stdout", _write)
+            lines = b''.join(data).splitlines()
+            self.assertEqual(len(lines), 20000)
+            self.assertEqual(lines[-1], b'9999\ts9999')
+
+            # a file object is read and written in a thread
+            with tempfile.TemporaryFile() as f:
+                await conn.execute("copy test_copy_async to stdout", f)
+                f.seek(0)
+                await conn.execute("copy test_copy_async from stdin", f)
+            await cur.execute("select count(*) from test_copy_async")
+            self.assertEqual(await cur.fetchall(), [(40000, )])
+            await conn.close()
+        asyncio.run(_test_copy())
+
+    def test_aio_copy_from_query(self):
+        async def _test_copy():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = await conn.copy_from_query("select i, 's' || i from generate_series(1, %s) as i", (10000, ))
+            self.assertEqual(await cur.fetchone(), (1, 's1'))
+            self.assertEqual([r[0] async for r in cur], list(range(2, 10001)))
+            cur = await conn.copy_from_query("select i from generate_series(1, %s) as i", (10000, ))
+            self.assertEqual([len(columns[0]) async for columns in cur.iter_columns(4000)], [4000, 4000, 2000])
+            await conn.close()
+        asyncio.run(_test_copy())
+
+    def test_aio_streaming_cursor(self):
+        async def _test_streaming():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor(minipg.AsyncStreamingCursor)
+            cur.arraysize = 100
+            await cur.execute("select i from generate_series(1, %s) as i", (1000, ))
+            self.assertEqual(await cur.fetchone(), (1, ))
+            self.assertEqual([r[0] async for r in cur], list(range(2, 1001)))
+            self.assertEqual(cur.rowcount, 1000)
+
+            # another query discards the rows not fetched yet
+            await cur.execute("select i from generate_series(1, 1000) as i")
+            self.assertEqual(await cur.fetchone(), (1, ))
+            cur2 = conn.cursor()
+            await cur2.execute("select 1")
+            self.assertEqual(await cur2.fetchall(), [(1, )])
+            self.assertEqual(await cur.fetchall(), [])
+            await conn.close()
+        asyncio.run(_test_streaming())
+
+    def test_aio_columnar_cursor(self):
+        async def _test_columnar():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor(minipg.AsyncColumnarCursor)
+            await cur.execute("select i, nullif(i %% 3, 0)::float8 from generate_series(1, %s) as i", (1000, ))
+            columns = await cur.fetchall_columnar()
+            self.assertEqual(columns['i'], array.array('i', range(1, 1001)))
+            self.assertEqual(cur.null_masks[1][:3], bytearray([0, 0, 1]))
+            await conn.close()
+        asyncio.run(_test_columnar())
+
+    def test_aio_server_cursor(self):
+        async def _test_server_cursor():
+            conn = await minipg.AsyncConnection.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+            cur = conn.cursor(name='test_aio_server_cursor')
+            await cur.execute("select i from generate_series(1, 5000) as i")
+            self.assertEqual(await cur.fetchone(), (1, ))
+            self.assertEqual([r[0] async for r in cur], list(range(2, 5001)))
+            self.assertEqual(cur.rowcount, 5000)
+            await cur.close()
+            await conn.close()
+        asyncio.run(_test_server_cursor())
+
     def test_create_pool(self):
         async def _test_select(loop):
             pool = await minipg.create_pool(
@@ -109,6 +302,25 @@ class AsyncTestCase(unittest.TestCase):
         loop = asyncio.new_event_loop()
         loop.run_until_complete(_test_select(loop))
         loop.close()
+    def test_create_pool_minsize(self):
+        async def _test_fill():
+            pool = await minipg.create_pool(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+                minsize=5,
+                maxsize=5,
+                connect_concurrency=2,
+            )
+            self.assertEqual(pool.freesize, 5)
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT 42")
+                    self.assertEqual(await cur.fetchall(), [(42, )])
+            pool.close()
+            await pool.wait_closed()
+        asyncio.run(_test_fill())
 
 if __name__ == "__main__":
     unittest.main()
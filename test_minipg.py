@@ -24,10 +24,13 @@
 # SOFTWARE.
 ##############################################################################
 import os
+import tempfile
 import unittest
 import io
+import array
 import decimal
 import datetime
+import uuid
 import minipg
 import ssl
 
@@ -145,6 +148,19 @@ class TestMiniPG(unittest.TestCase):
         cur.execute("select count(*) from test_trans")
         self.assertEqual(cur.fetchone()[0], 1)
 
+    def test_lazy_begin(self):
+        # BEGIN is sent with the first statement of a transaction
+        self.connection.commit()
+        self.assertEqual(self.connection._trans_status, b'I')
+        self.connection.commit()
+        cur = self.connection.cursor()
+        cur.execute("create temporary table test_lazy_begin (i integer)")
+        self.assertEqual(self.connection._trans_status, b'T')
+        self.connection.rollback()
+        self.assertEqual(self.connection._trans_status, b'I')
+        cur.execute("select count(*) from pg_class where relname = %s", ('test_lazy_begin', ))
+        self.assertEqual(cur.fetchone()[0], 0)
+
     def test_autocommit(self):
         self.connection.set_autocommit(True)
         cur = self.connection.cursor()
@@ -161,6 +177,17 @@ class TestMiniPG(unittest.TestCase):
         self.connection.rollback()
         cur.execute("select count(*) from test_autocommit")
         self.assertEqual(cur.fetchone()[0], 1)
+        # no transaction block is opened
+        self.assertEqual(self.connection._trans_status, b'I')
+
+        # begin() opens a transaction in autocommit mode
+        self.connection.begin()
+        cur.execute("insert into test_autocommit (i2) values (2)")
+        self.assertEqual(self.connection._trans_status, b'T')
+        self.connection.rollback()
+        cur.execute("select count(*) from test_autocommit")
+        self.assertEqual(cur.fetchone()[0], 1)
+        self.connection.set_autocommit(False)
 
     def test_function(self):
         cur = self.connection.cursor()
@@ -255,6 +282,27 @@ class TestMiniPG(unittest.TestCase):
         self.assertEqual(text, f.getvalue())
         self.connection.commit()
 
+    def test_copy_file(self):
+        cur = self.connection.cursor()
+        cur.execute("create temporary table test_copy_file (i integer, s text)")
+        cur.execute("insert into test_copy_file select i, repeat('x', i %% 100) from generate_series(1, %s) as i", (100000, ))
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'test_copy_file.dat')
+            # COPY TO a file path, COPY FROM a file descriptor
+            self.connection.execute("copy test_copy_file to stdout (format binary)", path)
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                self.connection.execute("copy test_copy_file from stdin (format binary)", fd)
+            finally:
+                os.close(fd)
+            # COPY FROM a file path
+            self.connection.execute("copy test_copy_file to stdout", path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.readline(), b'1\tx\n')
+            self.connection.execute("copy test_copy_file from stdin", path)
+        cur.execute("select count(*), count(distinct (i, s)) from test_copy_file")
+        self.assertEqual(cur.fetchone(), (400000, 100000))
+
     def test_japanese(self):
         cur = self.connection.cursor()
         cur.execute(u"""
@@ -287,6 +335,562 @@ class TestMiniPG(unittest.TestCase):
         self.assertEqual(r[3], (1.1, 2.2))
         self.assertEqual(r[4], ((1.1, 2.2), 3.3))
 
+    def test_large_result(self):
+        cur = self.connection.cursor()
+        cur.execute("select i, repeat('x', i) from generate_series(1, 2000) as i")
+        rows = cur.fetchall()
+        self.assertEqual(len(rows), 2000)
+        self.assertEqual(rows[-1], (2000, 'x' * 2000))
+        cur.execute("select repeat('y', 1000000)")
+        self.assertEqual(len(cur.fetchone()[0]), 1000000)
+
+    def test_bytea(self):
+        cur = self.connection.cursor()
+        cur.execute("create temporary table test_bytea (b bytea)")
+        data = bytes(range(256)) * 40000
+        cur.execute("insert into test_bytea values (%s)", (data, ))
+        cur.execute("insert into test_bytea values (%s)", (memoryview(data)[:256], ))
+        cur.execute("select b from test_bytea")
+        self.assertEqual(cur.fetchall(), [(data, ), (data[:256], )])
+        cur.execute("set bytea_output = 'escape'")
+        cur.execute("select b from test_bytea where length(b) = 256")
+        self.assertEqual(cur.fetchone()[0], data[:256])
+        cur.execute("set bytea_output = 'hex'")
+
+    def test_temporal_types(self):
+        cur = self.connection.cursor()
+        cur.execute("""
+            select '2001-02-03'::date, '04:05:06.5'::time, '04:05:06+09:30'::timetz,
+                '2003-04-12 04:05:06.789'::timestamp, '2003-04-12 04:05:06.789+00'::timestamptz,
+                '1 year 2 mons 3 days 04:05:06.5'::interval, '-00:00:01'::interval,
+                'infinity'::date, '-infinity'::timestamp
+        """)
+        self.assertEqual(cur.fetchone(), (
+            datetime.date(2001, 2, 3),
+            datetime.time(4, 5, 6, 500000),
+            datetime.time(4, 5, 6, tzinfo=datetime.timezone(datetime.timedelta(hours=9, minutes=30))),
+            datetime.datetime(2003, 4, 12, 4, 5, 6, 789000),
+            datetime.datetime(2003, 4, 12, 4, 5, 6, 789000, tzinfo=datetime.timezone.utc),
+            datetime.timedelta(days=423, hours=4, minutes=5, seconds=6, microseconds=500000),
+            datetime.timedelta(seconds=-1),
+            datetime.date.max,
+            datetime.datetime.min,
+        ))
+
+    def test_user_types(self):
+        cur = self.connection.cursor()
+        cur.execute("create type test_mood as enum ('sad', 'ok', 'happy')")
+        cur.execute("create type test_pair as (i integer, s text, m test_mood)")
+        cur.execute("create domain test_posint as integer check (value > 0)")
+        cur.execute("""
+            select 'ok'::test_mood, row(1, 'a "b", c', null)::test_pair,
+                array[row(2, 'x', 'sad')::test_pair, null], 3::test_posint,
+                int4range(1, 10), 'empty'::int4range
+        """)
+        self.assertEqual(cur.fetchone(), (
+            'ok',
+            (1, 'a "b", c', None),
+            [(2, 'x', 'sad'), None],
+            3,
+            minipg.Range(1, 10, '[)'),
+            minipg.Range(empty=True),
+        ))
+
+        self.connection.register_type('test_mood', decoder=lambda data: data.decode('ascii').upper())
+        cur.execute("select 'happy'::test_mood, array['sad', 'ok']::test_mood[]")
+        self.assertEqual(cur.fetchone(), ('HAPPY', ['SAD', 'OK']))
+        self.connection.rollback()
+
+    def test_arrays(self):
+        cur = self.connection.cursor()
+        cur.execute("""
+            select ARRAY[[1, 2], [3, NULL]]::int8[], ARRAY[1.5, 'NaN']::numeric[],
+                ARRAY['a,b', 'c"d', NULL, 'NULL', '', 'e\\f']::text[],
+                ARRAY['2001-02-03 04:05:06.5'::timestamp, NULL],
+                ARRAY['5d9b2a2c-3c5e-4b1a-9d5b-2bbb5c0e1c31'::uuid],
+                '[0:1]={t,f}'::bool[], '{}'::int4[]
+        """)
+        r = cur.fetchone()
+        self.assertEqual(r[0], [[1, 2], [3, None]])
+        self.assertEqual(r[1][0], decimal.Decimal('1.5'))
+        self.assertTrue(r[1][1].is_nan())
+        self.assertEqual(r[2:], (
+            ['a,b', 'c"d', None, 'NULL', '', 'e\\f'],
+            [datetime.datetime(2001, 2, 3, 4, 5, 6, 500000), None],
+            [uuid.UUID('5d9b2a2c-3c5e-4b1a-9d5b-2bbb5c0e1c31')],
+            [True, False],
+            [],
+        ))
+
+        query = "select ARRAY[1.5, 2.5]::float8[], ARRAY[[1, 2], [3, 4]]::int4[], ARRAY[1, NULL]::int2[]"
+        for binary_results in (False, True):
+            conn = minipg.connect(
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+                binary_results=binary_results,
+                flat_arrays=True,
+            )
+            cur = conn.cursor()
+            cur.execute(query, ())
+            self.assertEqual(cur.fetchone(), (
+                array.array('d', [1.5, 2.5]),
+                [array.array('i', [1, 2]), array.array('i', [3, 4])],
+                [1, None],
+            ))
+            conn.close()
+
+    def test_streaming_cursor(self):
+        cur = self.connection.cursor(minipg.StreamingCursor)
+        cur.arraysize = 100
+        cur.execute("select i, repeat('x', i %% 10) from generate_series(1, %s) as i", (1000, ))
+        self.assertEqual(cur.description[0].name, 'i')
+        self.assertEqual(cur.fetchone(), (1, 'x'))
+        self.assertEqual(len(cur.fetchmany()), 100)
+        self.assertEqual([r[0] for r in cur], list(range(102, 1001)))
+        self.assertEqual(cur.rowcount, 1000)
+
+        # another query discards the rows not fetched yet
+        cur.execute("select i from generate_series(1, 1000) as i")
+        self.assertEqual(cur.fetchone(), (1, ))
+        cur2 = self.connection.cursor()
+        cur2.execute("select 1")
+        self.assertEqual(cur2.fetchall(), [(1, )])
+        self.assertEqual(cur.fetchall(), [])
+
+        # the type seen first is looked up while the portal is suspended
+        cur2.execute("create domain test_stream_int as integer")
+        cur.execute("select i::test_stream_int from generate_series(1, 1000) as i")
+        self.assertEqual(cur.fetchone(), (1, ))
+        self.assertEqual([r[0] for r in cur], list(range(2, 1001)))
+        f = io.BytesIO()
+        self.connection.execute("copy (select 1) to stdout", f)
+        self.assertEqual(f.getvalue(), b'1\n')
+
+        with self.assertRaises(minipg.DataError):
+            cur.execute("select 1 / (i - 500) from generate_series(1, 1000) as i")
+            cur.fetchall()
+        self.connection.rollback()
+        cur.close()
+
+    def test_columnar_cursor(self):
+        cur = self.connection.cursor(minipg.ColumnarCursor)
+        cur.execute("""
+            select i, i * 0.5::float8, i %% 2 = 0, nullif(i %% 3, 0)::bigint, 'x' || i
+            from generate_series(1, %s) as i
+        """, (1000, ))
+        i, d, b, n, s = cur.fetch_columns()
+        self.assertEqual(i, array.array('i', range(1, 1001)))
+        self.assertEqual(d[:2], array.array('d', [0.5, 1.0]))
+        self.assertEqual(b[:2], array.array('B', [0, 1]))
+        self.assertEqual(n[:3], array.array('q', [1, 2, 0]))
+        self.assertEqual(s[:2], ['x1', 'x2'])
+        self.assertEqual(cur.null_masks[:3], [None, None, None])
+        self.assertEqual(cur.null_masks[3][:3], bytearray([0, 0, 1]))
+        self.assertEqual(cur.rowcount, 1000)
+
+        cur.execute("select 1 as a, null::int as b")
+        self.assertEqual(cur.fetchall(), [(1, None)])
+
+        cur = self.connection.cursor(minipg.StreamingCursor)
+        cur.arraysize = 100
+        cur.execute("select i from generate_series(1, %s) as i", (1000, ))
+        self.assertEqual(cur.fetchone(), (1, ))
+        self.assertEqual(cur.fetchall_columnar(), {'i': array.array('i', range(2, 1001))})
+        self.assertEqual(cur.rowcount, 1000)
+
+    def test_row_factory(self):
+        query = "select i as a, 'x' || i as b from generate_series(1, 2) as i"
+        cur = self.connection.cursor(row_factory=minipg.record_row)
+        cur.execute(query)
+        r1, r2 = cur.fetchall()
+        self.assertEqual(r1, (1, 'x1'))
+        self.assertEqual((r1[0], r1['b'], r1.a, r1.get('c')), (1, 'x1', 1, None))
+        self.assertEqual(dict(r2.items()), {'a': 2, 'b': 'x2'})
+        self.assertIs(r1._index, r2._index)
+
+        cur = self.connection.cursor(row_factory=minipg.namedtuple_row)
+        cur.execute(query)
+        self.assertEqual(cur.fetchone().b, 'x1')
+
+        cur = self.connection.cursor(row_factory=minipg.dict_row)
+        cur.execute(query)
+        self.assertEqual(cur.fetchone(), {'a': 1, 'b': 'x1'})
+
+    def test_lazy_rows(self):
+        cur = self.connection.cursor(lazy=True)
+        cur.execute("""
+            select i as a, ('{"i": ' || i || '}')::json as j, i * 1.5 as n, null::text as t
+            from generate_series(1, 2) as i
+        """)
+        r1, r2 = cur.fetchall()
+        self.assertIsInstance(r1, minipg.LazyRecord)
+        self.assertEqual((r1.a, r1['n'], r1[3]), (1, decimal.Decimal('1.5'), None))
+        self.assertEqual(r1._values[1:3], [minipg._NOT_DECODED, decimal.Decimal('1.5')])
+        self.assertEqual(r2, (2, {'i': 2}, decimal.Decimal('3.0'), None))
+
+    def test_server_cursor(self):
+        cur = self.connection.cursor(name='test_server_cursor', scrollable=True)
+        cur.execute("select i from generate_series(1, %s) as i", (5000, ))
+        self.assertEqual(cur.description[0].name, 'i')
+        self.assertEqual(cur.fetchone(), (1, ))
+        self.assertEqual(len(cur.fetchmany(500)), 500)
+        self.assertEqual(cur.fetchone(), (502, ))
+        cur.scroll(0, mode='absolute')
+        self.assertEqual(cur.fetchone(), (1, ))
+        cur.scroll(10)
+        self.assertEqual(cur.fetchone(), (12, ))
+        self.assertEqual([r[0] for r in cur], list(range(13, 5001)))
+        cur.execute("select i from generate_series(1, 10) as i")
+        self.assertEqual(cur.fetchall(), [(i, ) for i in range(1, 11)])
+        cur.close()
+
+        cur = self.connection.cursor(name='test_server_cursor_hold', withhold=True)
+        cur.execute("select i from generate_series(1, 1000) as i")
+        self.assertEqual(cur.fetchone(), (1, ))
+        self.connection.commit()
+        self.assertEqual(len(cur.fetchall()), 999)
+        cur.close()
+
+    def test_executemany(self):
+        cur = self.connection.cursor()
+        cur.execute("create temporary table test_executemany (i integer not null, s text)")
+        cur.executemany(
+            "insert into test_executemany (i, s) values (%s, %s)",
+            ((i, 's%d' % i) for i in range(10000))
+        )
+        self.assertEqual(cur.rowcount, 10000)
+        cur.execute("select count(*), max(s) from test_executemany")
+        self.assertEqual(cur.fetchone(), (10000, 's9999'))
+        with self.assertRaises(minipg.IntegrityError):
+            cur.executemany(
+                "insert into test_executemany (i, s) values (%s, %s)",
+                [(1, 'a'), (None, 'b'), (3, 'c')]
+            )
+        self.connection.rollback()
+
+    def test_executemany_encoders(self):
+        class P:
+            def __init__(self, x):
+                self.x = x
+
+        conn = minipg.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            prepare=True,
+        )
+        for c in (self.connection, conn):
+            c.encoders[P] = lambda conn, v: "%d * 10" % (v.x, )
+            cur = c.cursor()
+            cur.execute("create temporary table test_executemany_encoders (i integer)")
+            cur.executemany("insert into test_executemany_encoders (i) values (%s)", [[P(1)], [P(2)]])
+            self.assertEqual(cur.rowcount, 2)
+            cur.execute("select i from test_executemany_encoders where i = %s", (P(2), ))
+            self.assertEqual(cur.fetchall(), [(20, )])
+            # the parameters are escaped into the queries, not prepared
+            self.assertEqual(len(c._statements), 0)
+            c.rollback()
+        conn.close()
+
+    def test_copy_records_to_table(self):
+        cur = self.connection.cursor()
+        cur.execute("""
+            create temporary table test_copy_records (
+                i integer, f float8, s text, b boolean, d date, j jsonb, p point
+            )
+        """)
+        records = [
+            (1, 1.5, 'a\tb\\c\n', True, datetime.date(2001, 2, 3), {'a': 1}, '(1,2)'),
+            (None, None, None, None, None, None, None),
+        ]
+        self.assertEqual(
+            self.connection.copy_records_to_table(
+                'test_copy_records', [r[:6] for r in records], columns=['i', 'f', 's', 'b', 'd', 'j']
+            ),
+            2
+        )
+        self.assertEqual(self.connection.copy_records_to_table('test_copy_records', records, format='text'), 2)
+        # point has no binary encoder and is sent in text format
+        self.assertEqual(self.connection.copy_records_to_table('test_copy_records', records), 2)
+        cur.execute("select i, f, s, b, d, j from test_copy_records")
+        rows = cur.fetchall()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], (1, 1.5, 'a\tb\\c\n', True, datetime.date(2001, 2, 3), '{"a": 1}'))
+        self.assertEqual(rows[1], (None, None, None, None, None, None))
+
+        self.assertEqual(
+            self.connection.copy_records_to_table(
+                'test_copy_records', ((i, i / 2) for i in range(100000)), columns=['i', 'f']
+            ),
+            100000
+        )
+        cur.execute("select count(*), sum(i), sum(f) from test_copy_records where s is null")
+        self.assertEqual(cur.fetchone(), (100000 + 3, 4999950000, 2499975000.0))
+        with self.assertRaises(minipg.DataError):
+            self.connection.copy_records_to_table('test_copy_records', [(2 ** 40, )], columns=['i'])
+        self.connection.rollback()
+
+        # a boolean column takes only bool, not a truthy value
+        encode_row = self.connection._copy_row_encoder([('i', minipg.PG_TYPE_INT4), ('b', minipg.PG_TYPE_BOOL)])
+        self.assertEqual(encode_row((1, False)), b'\x00\x02\x00\x00\x00\x04\x00\x00\x00\x01\x00\x00\x00\x01\x00')
+        with self.assertRaises(minipg.DataError):
+            encode_row((1, 'f'))
+
+    def test_copy_records_to_table_notice(self):
+        cur = self.connection.cursor()
+        cur.execute("create temporary table test_copy_records_notice (i integer)")
+        cur.execute("""
+            create function test_copy_records_notice() returns trigger as $$
+            begin
+                raise notice 'copy %', new.i;
+                return new;
+            end
+            $$ language plpgsql
+        """)
+        cur.execute("""
+            create trigger test_copy_records_notice before insert on test_copy_records_notice
+            for each row execute function test_copy_records_notice()
+        """)
+        # NoticeResponse received while copying does not stop sending the records
+        self.assertEqual(
+            self.connection.copy_records_to_table('test_copy_records_notice', ((i, ) for i in range(100000))),
+            100000
+        )
+        cur.execute("select count(*) from test_copy_records_notice")
+        self.assertEqual(cur.fetchone(), (100000, ))
+        self.connection.rollback()
+
+    def test_copy_from_query(self):
+        query = """select i, i / 2.0 :: float8 as f, 'a' || repeat(e'\\t', i %% 2) as s,
+            date '2001-02-03' + i as d, nullif(i %% 3, 0) as n
+            from generate_series(1, %s) as i"""
+        for format in ('binary', 'text'):
+            cur = self.connection.copy_from_query(query, (10000, ), format=format)
+            self.assertEqual([d[0] for d in cur.description], ['i', 'f', 's', 'd', 'n'])
+            self.assertEqual(cur.fetchone(), (1, 0.5, 'a\t', datetime.date(2001, 2, 4), 1))
+            self.assertEqual(cur.fetchone(), (2, 1.0, 'a', datetime.date(2001, 2, 5), 2))
+            self.assertEqual(cur.fetchone()[4], None)
+            self.assertEqual(len(cur.fetchall()), 10000 - 3)
+            self.assertEqual(cur.rowcount, 10000)
+
+        cur = self.connection.copy_from_query(query, (10000, ))
+        batches = list(cur.iter_columns(4000))
+        self.assertEqual([len(columns[0]) for columns in batches], [4000, 4000, 2000])
+        self.assertEqual(batches[0][0][:3], array.array('i', [1, 2, 3]))
+        self.assertEqual(cur.null_masks[4][:3], bytearray([1, 0, 0]))
+
+        # the rest rows are discarded by another query
+        cur = self.connection.copy_from_query(query, (10000, ))
+        cur.fetchone()
+        cur2 = self.connection.cursor()
+        cur2.execute("select 1")
+        self.assertEqual(cur2.fetchall(), [(1, )])
+
+    def test_nextset(self):
+        cur = self.connection.cursor()
+        cur.execute("""
+            create temporary table test_nextset (i integer);
+            insert into test_nextset values (1), (2);
+            select i from test_nextset order by i;
+            select count(*) as c from test_nextset
+        """)
+        # the statements without rows before the first select are skipped
+        self.assertEqual(cur.description[0][0], 'i')
+        self.assertEqual(cur.rowcount, 2)
+        self.assertEqual(cur.fetchall(), [(1, ), (2, )])
+        self.assertTrue(cur.nextset())
+        self.assertEqual(cur.description[0][0], 'c')
+        self.assertEqual(cur.fetchall(), [(2, )])
+        self.assertEqual(cur.nextset(), None)
+
+        cur.execute("set search_path to public; select 1")
+        self.assertEqual(cur.fetchall(), [(1, )])
+        cur.execute("insert into test_nextset values (3); delete from test_nextset where i = 1")
+        self.assertEqual(cur.rowcount, 1)
+        self.assertEqual(cur.description, [])
+        self.assertTrue(cur.nextset())
+        self.assertEqual(cur.rowcount, 1)
+        self.connection.rollback()
+
+        # BEGIN sent with a query which fails to parse is not completed
+        with self.assertRaises(minipg.ProgrammingError):
+            cur.execute("selec 1")
+        self.connection.rollback()
+        self.connection.autocommit = True
+        self.connection.autocommit = False
+        cur.execute("create temporary table test_nextset2 (i integer)")
+        cur.executemany("insert into test_nextset2 values (%s)", [(1, ), (2, ), (3, )])
+        self.assertEqual(cur.rowcount, 3)
+        self.connection.rollback()
+
+    def test_pipeline(self):
+        with self.connection.pipeline() as p:
+            cur1 = p.execute("select 1 as a")
+            cur2 = p.execute("select i from generate_series(1, %s) as i", (3, ))
+            cur3 = p.execute("select 'a%'")
+            cur4 = p.execute("select %s, %s", (0, 'a'))
+        self.assertEqual(cur1.fetchall(), [(1, )])
+        self.assertEqual(cur2.fetchall(), [(1, ), (2, ), (3, )])
+        self.assertEqual(cur2.rowcount, 3)
+        self.assertEqual(cur3.fetchall(), [('a%', )])
+        self.assertEqual(cur4.fetchall(), [(0, 'a')])
+        self.connection.commit()
+
+        self.connection.set_autocommit(True)
+        with self.assertRaises(minipg.ProgrammingError):
+            with self.connection.pipeline() as p:
+                cur1 = p.execute("select 1")
+                cur2 = p.execute("select * from test_pipeline_not_exists")
+                cur3 = p.execute("select 3")
+                p.sync()
+                cur4 = p.execute("select 4")
+        self.assertEqual(cur1.fetchall(), [(1, )])
+        self.assertEqual(cur3.fetchall(), [])
+        self.assertEqual(cur4.fetchall(), [(4, )])
+        self.connection.set_autocommit(False)
+
+    def test_prepare(self):
+        conn = minipg.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            prepare=True,
+            statement_cache_size=2,
+        )
+        cur = conn.cursor()
+        cur.execute("create temporary table test_prepare (i integer, s text)")
+        for i in range(5):
+            cur.execute("insert into test_prepare (i, s) values (%s, %s)", (i, 'a%d' % i))
+        cur.execute("select s from test_prepare where i = %(i)s", {'i': 3})
+        self.assertEqual(cur.fetchall(), [('a3', )])
+        cur.execute("select count(*) from test_prepare where i < %s", (3, ))
+        self.assertEqual(cur.fetchone()[0], 3)
+        cur.execute("select s from test_prepare where i = %(i)s", {'i': 4})
+        self.assertEqual(cur.fetchall(), [('a4', )])
+        cur.execute("select %s::text like 'a%%'", ('abc', ))
+        self.assertEqual(cur.fetchone()[0], True)
+        conn.commit()
+
+        # result type changed
+        cur.execute("select * from test_prepare where i = %s", (1, ))
+        self.assertEqual(cur.fetchall(), [(1, 'a1')])
+        cur.execute("alter table test_prepare add column d date")
+        conn.commit()
+        # prepared again as the first statement of the transaction
+        cur.execute("select * from test_prepare where i = %s", (1, ))
+        self.assertEqual(cur.fetchall(), [(1, 'a1', None)])
+        cur.execute("alter table test_prepare drop column d")
+        with self.assertRaises(minipg.NotSupportedError):
+            cur.execute("select * from test_prepare where i = %s", (1, ))
+        conn.rollback()
+
+        conn.set_autocommit(True)
+        cur.execute("select * from test_prepare where i = %s", (2, ))
+        self.assertEqual(cur.fetchall(), [(2, 'a2', None)])
+        cur.execute("alter table test_prepare drop column d")
+        cur.execute("select * from test_prepare where i = %s", (2, ))
+        self.assertEqual(cur.fetchall(), [(2, 'a2')])
+        conn.close()
+
+    def test_binary_parameters(self):
+        conn = minipg.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            prepare=True,
+            binary_parameters=True,
+        )
+        cur = conn.cursor()
+        cur.execute("""
+            create temporary table test_binary_parameters (
+              b1        boolean,
+              i2        smallint,
+              i4        integer,
+              i8        bigint,
+              dec       decimal(10, 3),
+              dbl       double precision,
+              s         varchar(255),
+              dt        date,
+              t1        time,
+              t3        timestamp,
+              t4        timestamp with time zone,
+              iv        interval,
+              u         uuid,
+              b         bytea,
+              a         integer[]
+            )
+        """)
+        u = uuid.uuid4()
+        data = bytes(range(256)) * 4096
+        params = (
+            True, 1, 2, 3, decimal.Decimal('-1234.567'), 2.5, 'あいうえお',
+            datetime.date(2001, 1, 2), datetime.time(4, 5, 6, 789000),
+            datetime.datetime(2003, 4, 12, 4, 5, 6, 789000),
+            datetime.datetime(2003, 4, 12, 4, 5, 6, tzinfo=datetime.timezone.utc),
+            datetime.timedelta(days=1, seconds=2, microseconds=3),
+            u, data, [1, None, 3],
+        )
+        cur.execute(
+            "insert into test_binary_parameters values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            params,
+        )
+        cur.execute("select b1, i2, i4, i8, dec, dbl, s, dt, t1, t3, iv, u, b, a::text from test_binary_parameters")
+        r = cur.fetchone()
+        self.assertEqual(r[:11], params[:10] + params[11:12])
+        self.assertEqual(r[11:], (u, data, '{1,NULL,3}'))
+        cur.execute("select count(*) from test_binary_parameters where t4 = %s", (params[10], ))
+        self.assertEqual(cur.fetchone()[0], 1)
+
+        cur.execute("select count(*) from generate_series(1, 20000) as i where i = any(%s)", (list(range(2, 20001, 2)), ))
+        self.assertEqual(cur.fetchone()[0], 10000)
+        conn.close()
+
+    def test_binary_results(self):
+        conn = minipg.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            prepare=True,
+            binary_results=True,
+        )
+        cur = conn.cursor()
+        query = """
+            select %s::integer, 1::smallint, 2::bigint, 1.5::real, 2.5::double precision,
+                true, 'abc'::text, -12.345::numeric(10, 3), 'NaN'::numeric,
+                '2001-02-03'::date, '04:05:06.789'::time,
+                '2003-04-12 04:05:06.789'::timestamp,
+                '2003-04-12 04:05:06.789+00'::timestamptz,
+                '1 day 00:00:02.000003'::interval,
+                '5d9b2a2c-3c5e-4b1a-9d5b-2bbb5c0e1c31'::uuid,
+                '\\x000102'::bytea,
+                ARRAY[1, NULL, 3]::integer[],
+                ARRAY[[1.5, 2.5], [3.5, 4.5]]::float8[]
+        """
+        cur.execute(query, (42, ))
+        r = cur.fetchone()
+        self.assertEqual(r[:9], (42, 1, 2, 1.5, 2.5, True, 'abc', decimal.Decimal('-12.345'), r[8]))
+        self.assertTrue(r[8].is_nan())
+        self.assertEqual(r[9:12], (
+            datetime.date(2001, 2, 3),
+            datetime.time(4, 5, 6, 789000),
+            datetime.datetime(2003, 4, 12, 4, 5, 6, 789000),
+        ))
+        self.assertEqual(r[12], datetime.datetime(2003, 4, 12, 4, 5, 6, 789000, tzinfo=datetime.timezone.utc))
+        self.assertEqual(r[13:], (
+            datetime.timedelta(days=1, seconds=2, microseconds=3),
+            uuid.UUID('5d9b2a2c-3c5e-4b1a-9d5b-2bbb5c0e1c31'),
+            b'\x00\x01\x02',
+            [1, None, 3],
+            [[1.5, 2.5], [3.5, 4.5]],
+        ))
+        conn.close()
+
     def test_isolation_level(self):
         self.assertEqual(self.connection.isolation_level, u'read committed')
 